@@ -1,37 +1,26 @@
 .class Fibonacci:Obj
 .method $constructor
-.local ten,twenty
+.local ten
     enter
-    load ten
-    const 10
     new Fib
-    call Fib:$constructor
-    load ten
     const 10
-    new Fib
-    call Fib:$constructor
+    call Fib:$constructor 1
     store ten
     load ten
-    const 0
-    roll 1
-    call Fib:Calculate
+    const 1
+    call Fib:Calculate 1
     call Int:print
     const "\n"
     call String:print
-    load twenty
-    const 20
     new Fib
-    call Fib:$constructor
-    load twenty
     const 20
-    new Fib
-    call Fib:$constructor
-    store twenty
-    load twenty
-    const 0
-    roll 1
-    call Fib:Calculate
+    call Fib:$constructor 1
+    store ten
+    load ten
+    const 1
+    call Fib:Calculate 1
     call Int:print
     const "\n"
     call String:print
+    load $
     return 0
@@ -3,9 +3,6 @@
 .method $constructor
 .args x
     enter
-    load $
-    load_field $:x
-    load x
     load x
     load $
     store_field $:x
@@ -14,9 +11,6 @@
 .method Number
 .args num
     enter
-    load $
-    load_field $:x
-    load num
     load num
     load $
     store_field $:x
@@ -1,21 +1,16 @@
 .class assign:Obj
-
 .method $constructor
 .local x
-load x
-const 1
-store x
-load x
-call Int:print
-load x
-load x
-const 1
-call Int:plus
-store x
-load x
-call Int:print
-pop
-pop
-pop
-pop
-return 0
\ No newline at end of file
+    enter
+    const 1
+    store x
+    load x
+    call Int:print
+    load x
+    const 1
+    int_add
+    store x
+    load x
+    call Int:print
+    load $
+    return 0
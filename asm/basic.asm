@@ -1,10 +1,7 @@
 .class basic:Obj
 .method $constructor
-.local x
     enter
-    load x
     const 1
-    load x
-    const 1
-    store x
+    pop
+    load $
     return 0
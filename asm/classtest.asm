@@ -1,40 +1,22 @@
 .class classtest:Obj
 .method $constructor
-.local test,seven,eight
+.local test,seven
     enter
-    load test
-    const 1
     new Test
-    call Test:$constructor
-    load test
     const 1
-    new Test
-    call Test:$constructor
+    call Test:$constructor 1
     store test
-    load seven
     load test
     const 7
-    roll 1
-    call Test:Number
-    load seven
-    load test
-    const 7
-    roll 1
-    call Test:Number
+    call Test:Number 1
     store seven
     load seven
     call Int:print
-    load eight
     load test
     const 8
-    roll 1
-    call Test:Number
-    load eight
+    call Test:Number 1
+    store test
     load test
-    const 8
-    roll 1
-    call Test:Number
-    store eight
-    load eight
     call Int:print
+    load $
     return 0
@@ -19,7 +19,7 @@ labelwhilebody1:
 load next
 load n1
 load n2
-call Int:plus
+call Int:plus 1
 store next
 load next
 call Int:print
@@ -36,12 +36,12 @@ store n2
 load x
 load x
 const 1
-call Int:plus
+call Int:plus 1
 store x
 labelwhilecmp0:
 load x
 const 100
-call Int:greater
+call Int:less 1
 jump_if labelwhilebody1
 endlabelwhilecmp0:
 load x
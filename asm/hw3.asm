@@ -1,22 +1,13 @@
 .class hw3:Obj
 .method $constructor
-.local x,y,temp,z,done
+.local x,y,temp
     enter
-    load x
-    const 5
-    load x
     const 5
     store x
-    load y
-    const "hello!"
-    load y
     const "hello!"
     store y
     jump labelwhilecmp0
 labelwhilebody1:
-    load temp
-    const 3
-    load temp
     const 3
     store temp
     jump labelwhilecmp2
@@ -30,50 +21,28 @@ labelwhilebody3:
     const "\n"
     call String:print
     load x
-    load x
-    const 1
-    roll 1
-    call Int:minus
-    load x
-    load x
     const 1
-    roll 1
-    call Int:minus
+    int_sub
     store x
     load temp
-    load temp
-    const 1
-    roll 1
-    call Int:plus
-    load temp
-    load temp
     const 1
-    roll 1
-    call Int:plus
+    int_add
     store temp
 labelwhilecmp2:
     load temp
     const 0
-    call Int:equals
-    call Bool:negate
-    jump_ifnot endlabelwhilecmp2
+    jump_int_eq endlabelwhilecmp2
     load x
     const 0
-    call Int:equals
-    call Bool:negate
-    jump_if labelwhilebody3
+    jump_int_ne labelwhilebody3
 endlabelwhilecmp2:
 labelwhilecmp0:
     load x
     const 1
-    call Int:less
-    jump_if labelwhilebody1
+    jump_int_gt labelwhilebody1
 endlabelwhilecmp0:
-    load z
-    const "what's up?"
-    load z
     const "what's up?"
-    store z
+    store temp
     jump labelifcmp4
 labelifbody5:
     const "Z is the same as y!"
@@ -82,9 +51,9 @@ labelifbody5:
     call String:print
     jump endlabelifcmp4
 labelifcmp4:
-    load z
+    load temp
     load y
-    call String:equals
+    call String:equals 1
     jump_if labelifbody5
 labelelse6:
     jump labelifcmp7
@@ -99,23 +68,20 @@ labelifbody8:
 labelifcmp7:
     load y
     const "no"
-    call String:equals
+    call String:equals 1
     jump_if labelifbody8
 labelelse9:
-    load done
-    const false
-    load done
     const false
-    store done
+    store y
     jump labelifcmp10
 labelifbody11:
-    load done
+    load y
     call Bool:print
     const "\n"
     call String:print
     jump endlabelifcmp10
 labelifcmp10:
-    load done
+    load y
     jump_ifnot labelifbody11
 labelelse12:
     const "done is somehow true!"
@@ -127,7 +93,7 @@ endlabelifcmp7:
 endlabelifcmp4:
     jump labelifcmp13
 labelifbody14:
-    load z
+    load temp
     call String:print
     const "\n"
     call String:print
@@ -135,11 +101,10 @@ labelifbody14:
 labelifcmp13:
     load x
     const 5
-    call Int:greater
-    jump_if labelifbody14
+    jump_int_lt labelifbody14
     load x
     const 10
-    call Int:less
-    jump_if labelifbody14
+    jump_int_gt labelifbody14
 endlabelifcmp13:
+    load $
     return 0
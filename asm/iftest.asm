@@ -20,7 +20,7 @@ jump endlabelifcmp0
 labelifcmp0:
 load x
 const 5
-call Int:less
+call Int:greater 1
 jump_if labelifbody1
 labelelse2:
 jump labelifcmp3
@@ -35,7 +35,7 @@ jump endlabelifcmp3
 labelifcmp3:
 load x
 const 3
-call Int:greater
+call Int:less 1
 jump_if labelifbody4
 labelelse5:
 load x
@@ -1,23 +1,14 @@
 .class simpleint:Obj
 .method $constructor
-.local x,y
+.local x
     enter
-    load x
-    const 1
-    load x
     const 1
     store x
-    load y
     load x
     load x
-    roll 1
-    call Int:plus
-    load y
-    load x
+    int_add
+    store x
     load x
-    roll 1
-    call Int:plus
-    store y
-    load y
     call Int:print
+    load $
     return 0
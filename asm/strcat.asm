@@ -1,10 +1,7 @@
 .class strcat:Obj
 .method $constructor
-.local 
     enter
-    const "This is first\n"
-    const "This is second\n"
-    roll 1
-    call String:plus
+    const "This is first\nThis is second\n"
     call String:print
+    load $
     return 0
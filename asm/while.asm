@@ -2,56 +2,35 @@
 .method $constructor
 .local x,y
     enter
-    load x
-    const 10
-    load x
     const 10
     store x
     jump labelwhilecmp0
 labelwhilebody1:
-    load y
-    const 0
-    load y
     const 0
     store y
     jump labelwhilecmp2
 labelwhilebody3:
-    load y
     load y
     const 1
-    roll 1
-    call Int:plus
-    load y
-    load y
-    const 1
-    roll 1
-    call Int:plus
+    int_add
     store y
     load y
     call Int:print
 labelwhilecmp2:
     load y
     const 3
-    call Int:greater
-    jump_if labelwhilebody3
+    jump_int_lt labelwhilebody3
 endlabelwhilecmp2:
-    load x
-    load x
-    const 1
-    roll 1
-    call Int:minus
-    load x
     load x
     const 1
-    roll 1
-    call Int:minus
+    int_sub
     store x
     load x
     call Int:print
 labelwhilecmp0:
     load x
     const 1
-    call Int:less_eq
-    jump_if labelwhilebody1
+    jump_int_ge labelwhilebody1
 endlabelwhilecmp0:
+    load $
     return 0
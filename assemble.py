@@ -15,8 +15,9 @@ import re
 import sys
 import json
 from pathlib import Path
-import argparse
 import configparser
+from functools import lru_cache
+from struct import calcsize, pack, unpack_from
 from typing import Dict, List,  Optional, Tuple
 
 import logging
@@ -40,6 +41,8 @@ CONFIG = Configuration()  # Visible from any code
 
 
 def cli() -> object:
+    # argparse is only needed when run from the command line
+    import argparse
     parser = argparse.ArgumentParser(
         description="Assemble tiny virtual machine module"
                     "into JSON-formatted object code"
@@ -47,9 +50,27 @@ def cli() -> object:
     parser.add_argument("source", type=argparse.FileType("r"))
     parser.add_argument("target", type=argparse.FileType("w"),
                         nargs="?", default=sys.stdout)
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Report the size of the constant pool and "
+                             "the words removed from each method")
+    parser.add_argument("--no-peephole", action="store_true",
+                        help="Do not optimize the instruction stream")
+    parser.add_argument("-b", "--binary", action="store_true",
+                        help="Write a binary object file (.tvm) instead of JSON")
     return parser.parse_args()
 
 
+def slot_table(names: List[str]) -> Dict[str, int]:
+    """Position of each name in the list, for lookups that
+    do not scan it; the first position if a name repeats,
+    as list.index would give.
+    """
+    slots: Dict[str, int] = {}
+    for position, name in enumerate(names):
+        slots.setdefault(name, position)
+    return slots
+
+
 # ----------------
 #  Imported modules:  What we need to know is
 #    - Slot numbers for methods, e.g., "print" is
@@ -60,17 +81,25 @@ class ImportedModule:
     """Imported module uses information from
     json file
     """
-    def __init__(self, path: Path):
-        with open(path, "r") as source:
-            self.json = json.load(source)
-        # Dict from name to position would be faster, but
-        # number of lookups is very small
+    def __init__(self, path: Optional[Path] = None,
+                 struct: Optional[dict] = None):
+        if struct is None and path.suffix == BINARY_SUFFIX:
+            with open(path, "rb") as source:
+                struct = read_binary_object(source.read())
+        elif struct is None:
+            with open(path, "r") as source:
+                struct = json.load(source)
+        self.json = struct
         self.methods: List[str] = self.json["methods"]
         self.fields:  List[str] = self.json["fields"]
+        # name -> position, since a class with hundreds of
+        # methods is looked up once per call instruction
+        self.method_slots = slot_table(self.methods)
+        self.field_slots = slot_table(self.fields)
 
     def method_slot(self, name: str) -> int:
-        if name in self.methods:
-            return self.methods.index(name)
+        if name in self.method_slots:
+            return self.method_slots[name]
         log.error(f"Method {name} not defined")
         return 0
 
@@ -78,7 +107,7 @@ class ImportedModule:
         return len(self.methods)
 
     def field_slot(self, name: str) -> int:
-        return self.fields.index(name)
+        return self.field_slots[name]
 
 
 IMPORTS: Dict[str, Optional[ImportedModule]] = { "$": None }
@@ -88,10 +117,28 @@ IMPORTS: Dict[str, Optional[ImportedModule]] = { "$": None }
 def import_module(module: str) -> ImportedModule:
     if module not in IMPORTS:
         path = CONFIG.tvmlib.joinpath(module).with_suffix(".json")
+        if not path.exists():
+            # a library may hold only the binary object file
+            binary_path = path.with_suffix(BINARY_SUFFIX)
+            if binary_path.exists():
+                path = binary_path
         IMPORTS[module] = ImportedModule(path)
     return IMPORTS[module]
 
 
+def register_module(module: str, struct: dict) -> ImportedModule:
+    """Make object code assembled in this process importable
+    without writing it to the library directory first.
+    """
+    IMPORTS[module] = ImportedModule(struct=struct)
+    return IMPORTS[module]
+
+
+def forget_module(module: str):
+    """Drop a cached module, e.g., after its source has changed"""
+    IMPORTS.pop(module, None)
+
+
 # The named literals MUST match the definitions
 # in vm_loader.h for CODE_NOTHING, etc
 # #define CODE_NOTHING  (-1)
@@ -116,12 +163,20 @@ NAMED_LITERALS = {
 #  constant offsets in the run-time constant pool depend on
 #  all loaded modules (non-local information).
 #
+#  Superinstructions (generated by tools/superinstructions.py)
+#  list the operations they stand for in a fourth column.  They
+#  never appear in assembly source; the assembler substitutes them
+#  for runs of their parts (see fuse, below).
+#
 
 class InstructionDef:
-    def __init__(self, name: str, code: int, ops: int):
+    def __init__(self, name: str, code: int, ops: int,
+                 parts: List["InstructionDef"] = None):
         self.name = name
         self.code = code
         self.ops = ops
+        # A superinstruction's operations, else empty
+        self.parts = parts or []
 
     def size(self) -> int:
         """An instruction without an operand
@@ -144,6 +199,8 @@ class InstructionSet:
     def __init__(self, path: str):
         self.ops: Dict[str, InstructionDef] = {}
         """Instruction set initialized from text table"""
+        # names of the parts -> superinstruction
+        self.fused: Dict[Tuple[str, ...], InstructionDef] = {}
         opcode = 0
         with open(path, "r") as f:
             for line in f:
@@ -153,9 +210,15 @@ class InstructionSet:
                     continue
                 # What remains should be an instruction definition
                 parts = line.split(",")
-                name, code, ops = parts
-                instr = InstructionDef(name, opcode, ops)
+                name, code, ops = parts[:3]
+                fused = []
+                if len(parts) == 4:
+                    # Superinstructions come after the operations they use
+                    fused = [self.ops[part] for part in parts[3].split()]
+                instr = InstructionDef(name, opcode, ops, fused)
                 self.ops[name] = instr
+                if fused:
+                    self.fused[tuple(part.name for part in fused)] = instr
                 opcode += 1
 
     def __getitem__(self, name: str):
@@ -174,8 +237,16 @@ class InstructionSet:
 # after all).  Create stub symbol files for built-ins.
 # So assembler does a lot of the symbolic -> numeric resolution. 
 
+@lru_cache(maxsize=None)
+def load_instruction_set(path: str) -> InstructionSet:
+    """Each instruction table is read once per process, however
+    many modules are assembled.
+    """
+    return InstructionSet(path)
+
+
 # Instruction set is a global
-INSTRS = InstructionSet("opdefs.txt")
+INSTRS = load_instruction_set("opdefs.txt")
 
 
 class Instruction:
@@ -218,8 +289,20 @@ class ObjectCode:
         self.super_name: str = ""
         self.method_list: List[str] = []
         self.field_list: List[str] = []
-        # Constant pool
+        # Classes referenced by index in new and is_instance,
+        # in order of first use; "$" is this class
+        self.imports: List[str] = ["$"]
+        # Each list above has a name -> position table that is
+        # kept in step with it, so resolving a symbol does not
+        # scan the list
+        self.method_slots: Dict[str, int] = {}
+        self.field_slots: Dict[str, int] = {}
+        self.import_slots: Dict[str, int] = {"$": 0}
+        # Constant pool, with each literal interned by (kind, value)
+        # so that it is loaded once however often it is used
         self.constants: List[Tuple[str, int]] = []
+        self.constant_slots: Dict[Tuple[str, str], int] = {}
+        self.const_operands = 0
         # Method code (instructions)
         self.code = []  # Will expand to code per method
         # For each method defined here, we want its
@@ -228,6 +311,9 @@ class ObjectCode:
         self.method_code: List[dict] = []
         self.method_locals: List[str] = []
         self.method_args: List[str] = []
+        # and likewise for the variables of the current method
+        self.local_slots: Dict[str, int] = {}
+        self.arg_slots: Dict[str, int] = {}
         # Things to be resolved
         # Labels resolve to addresses within the code
         # of a method.
@@ -235,24 +321,48 @@ class ObjectCode:
         self.labels: Dict[str, int] = {}
         # address -> unresolved label
         self.label_patch: Dict[int, str] = {}
+        # Instructions of the current method, as (label, operation,
+        # operand) items with symbols resolved but jumps still
+        # naming their labels, so that the peephole optimizer can
+        # rearrange them before they become code words
+        self.pending: List[Tuple] = []
+        self.optimize = True
+        # method name -> (words before, words after) optimization
+        self.peephole_counts: Dict[str, Tuple[int, int]] = {}
+        # method name -> superinstructions substituted
+        self.fused_counts: Dict[str, int] = {}
 
     def declare_class(self, name: str, super_name: str):
         self.class_name = name
         self.super_name = super_name
-        super_module = import_module(super_name)
+        super_module = self.use_module(super_name)
         # Methods and field list are initially those
         # we inherit, but may be extended elsewhere
-        # in the assembly code
-        self.method_list = super_module.methods
+        # in the assembly code.  Copied, so that extending
+        # them does not change the cached superclass.
+        self.method_list = list(super_module.methods)
+        self.method_slots = dict(super_module.method_slots)
         self.n_inherited = len(super_module.methods)
-        self.field_list = super_module.fields
+        self.field_list = list(super_module.fields)
+        self.field_slots = dict(super_module.field_slots)
         # AND we need to be able to refer to this class in NEW
 
+    def use_module(self, module: str) -> ImportedModule:
+        """Import a module and record it in this object file's
+        import list.
+        """
+        record = import_module(module)
+        if module not in self.import_slots:
+            self.import_slots[module] = len(self.imports)
+            self.imports.append(module)
+        return record
+
     def declare_field(self, name: str):
         """Add a field to objects of this class;
         do this before methods.
         """
-        assert name not in self.field_list, "Field already exists"
+        assert name not in self.field_slots, "Field already exists"
+        self.field_slots[name] = len(self.field_list)
         self.field_list.append(name)
 
     def declare_method(self, method_name: str):
@@ -262,54 +372,66 @@ class ObjectCode:
         we define before (or without) calling from within
         the same class.
         """
-        if method_name not in self.method_list:
-            self.method_list.append(method_name)
+        self.add_method_slot(method_name)
         # That's all!  We're just reserving a spot
         # in the vtable.  Bad things will happen if
         # it's not filled in later in the code.
 
     def begin_method(self, method_name: str):
-        self.resolve_jumps()  # Of preceding method!
+        self.end_method()  # Of preceding method!
         # And then re-initialize tables
         # label -> address
         self.labels: Dict[str, int] = {}
         # address -> unresolved label
         self.label_patch: Dict[int, str] = {}
         ###
-        if method_name not in self.method_list:
-            self.method_list.append(method_name)
-        method_slot = self.method_list.index(method_name)
+        method_slot = self.add_method_slot(method_name)
         # Initialize code block
         self.method_locals = []
+        self.local_slots = {}
+        self.method_args = []
+        self.arg_slots = {}
         self.code = []  # We will append instructions to this list
         self.method_code.append({"name": method_name, "slot": method_slot,
                                  "code": self.code})
 
+    def add_method_slot(self, method_name: str) -> int:
+        """Slot of the method in the vtable, reserving
+        a new one if it is not inherited or declared.
+        """
+        if method_name not in self.method_slots:
+            self.method_slots[method_name] = len(self.method_list)
+            self.method_list.append(method_name)
+        return self.method_slots[method_name]
+
     def declare_locals(self, method_locals: List[str]):
         """Map local variable names to position in activation record"""
         self.method_locals = method_locals
+        self.local_slots = slot_table(method_locals)
 
     def declare_args(self, args: List[str]):
-        """Map argument names to offsets *before* the frame pointer"""
+        """Map argument names to offsets just after the receiver"""
         self.method_args = args
+        self.arg_slots = slot_table(args)
 
     def resolve_local(self, var: str) -> int:
         """Map local variable to position in activation record.
-        At entry, fp+0 is receiver object,
-        fp+1 is return address
-        fp+2 is saved frame pointer;
-        local variables start at fp+3
-        arguments start at fp-1
+        At entry, with n arguments,
+        fp+0 is receiver object,
+        arguments are fp+1 to fp+n,
+        fp+n+1 is return address
+        fp+n+2 is saved frame pointer;
+        local variables start at fp+n+3
         """
         if var == "$":
             # Special case for the "this" variable
             return 0
-        if var in self.method_args:
-            arg_num = self.method_args.index(var)
-            return arg_num - len(self.method_args)
-        if var in self.method_locals:
-            local_num = self.method_locals.index(var)
-            return 3 + local_num
+        if var in self.arg_slots:
+            arg_num = self.arg_slots[var]
+            return 1 + arg_num
+        if var in self.local_slots:
+            local_num = self.local_slots[var]
+            return 3 + len(self.method_args) + local_num
         log.error(f"Local variable {var} not declared in this method")
         return 88   # Just a placeholder; this code should not be used!
 
@@ -319,10 +441,10 @@ class ObjectCode:
         try:
             if class_name == "$":
                 # This class
-                method_slot = self.method_list.index(method_name)
+                method_slot = self.method_slots[method_name]
             else:
                 # Imported class
-                module_record = import_module(class_name)
+                module_record = self.use_module(class_name)
                 method_slot = module_record.method_slot(method_name)
         except LookupError:
             log.error(f"No such method '{full_name}'")
@@ -335,10 +457,10 @@ class ObjectCode:
         try:
             if class_name == "$":
                 # This class
-                field_slot = self.field_list.index(field_name)
+                field_slot = self.field_slots[field_name]
             else:
                 # Imported class (is that legal in Quack?)
-                module_record = import_module(class_name)
+                module_record = self.use_module(class_name)
                 field_slot = module_record.field_slot(field_name)
         except LookupError:
             log.error(f"No such field '{full_name}'")
@@ -346,9 +468,8 @@ class ObjectCode:
         return field_slot
 
     def resolve_class(self, class_name: str) -> int:
-        import_module(class_name)  # In case we need to
-        index = list(IMPORTS).index(class_name)
-        return index
+        self.use_module(class_name)  # In case we need to
+        return self.import_slots[class_name]
 
     def resolve_jumps(self):
         """Patch up references to code labels"""
@@ -376,18 +497,56 @@ class ObjectCode:
 
     def add_label(self, label: str):
         """On a line by itself"""
-        self.labels[label] = len(self.code)
+        self.pending.append((label, None, None))
 
     def add_instruction(self, instr: Instruction):
         if instr.label:
             # Address of next instruction
-            self.labels[instr.label] = len(self.code)
-        self.code.append(instr.operation.code)
+            self.pending.append((instr.label, None, None))
+        op_value = None
         if instr.operand:
-            # Many operands require interpretation
-            # that depends on the operation
-            op_value = self.encode_operand(instr)
-            self.code.append(op_value)
+            if instr.operation.name in JUMPS:
+                # Resolved when the method is laid out
+                op_value = instr.operand
+            else:
+                # Many operands require interpretation
+                # that depends on the operation
+                op_value = self.encode_operand(instr)
+        self.pending.append((None, instr.operation, op_value))
+
+    def end_method(self):
+        """Optimize the pending instructions of the method,
+        then lay them out as code words and patch the jumps.
+        """
+        items = self.pending
+        self.pending = []
+        if self.optimize and self.method_code:
+            name = self.method_code[-1]["name"]
+            before = code_words(items)
+            items = peephole(items)
+            items, self.fused_counts[name] = fuse(items, INSTRS.fused)
+            self.peephole_counts[name] = (before, code_words(items))
+        for label, operation, operand in items:
+            if operation is None:
+                self.labels[label] = len(self.code)
+                continue
+            self.code.append(operation.code)
+            for part, operand in operand_parts(operation, operand):
+                if part.name in JUMPS:
+                    operand = self.encode_operand(
+                        Instruction(None, part, operand))
+                self.code.append(operand)
+        self.resolve_jumps()
+
+    def peephole_report(self) -> str:
+        """Words removed from each method by the peephole optimizer"""
+        lines = []
+        for name, (before, after) in self.peephole_counts.items():
+            fused = self.fused_counts.get(name)
+            suffix = f", {fused} superinstructions" if fused else ""
+            lines.append(f"{self.class_name}.{name}: {before} -> {after} "
+                         f"words ({before - after} removed{suffix})")
+        return "\n".join(lines)
 
     def encode_operand(self, instr: Instruction):
         """Each operand type is idiosyncratic"""
@@ -403,20 +562,33 @@ class ObjectCode:
             # in the loader.
             if operand in NAMED_LITERALS:
                 return NAMED_LITERALS[operand]
-            if re.match("[0-9]+", operand):
+            if operand[0] in DIGITS:
                 kind = "i"
-            elif re.match('["][^"]*["]', operand):
+            elif operand[0] == '"' and '"' in operand[1:]:
                 kind = "s"
                 operand = operand.strip("\"").\
                     encode("utf-8").decode("unicode_escape")
             else:
                 log.error(f"Could not type operand '{operand}'")
                 kind = "BOGUS CONSTANT"
-            self.constants.append({"kind": kind, "value": operand})
-            return len(self.constants) - 1
+            self.const_operands += 1
+            key = (kind, operand)
+            if key not in self.constant_slots:
+                self.constant_slots[key] = len(self.constants)
+                self.constants.append({"kind": kind, "value": operand})
+            return self.constant_slots[key]
         if op == "call":
-            slot = self.resolve_call(operand)
-            return slot
+            # "call Class:method n" passes n arguments (none if
+            # omitted), which the vm needs to find the receiver
+            method, _, n_args = operand.partition(" ")
+            slot = self.resolve_call(method)
+            return slot, int(n_args or 0)
+        if op == "tail_call":
+            # The same, and the vm also needs the arity of this
+            # method to find its return address and saved fp
+            method, _, n_args = operand.partition(" ")
+            slot = self.resolve_call(method)
+            return slot, int(n_args or 0), len(self.method_args)
         if op in ["load_field", "store_field"]:
             # These operations use indexes into the fields of an object
             slot = self.resolve_field(operand)
@@ -431,7 +603,7 @@ class ObjectCode:
             # These operations have integer operands that should be
             # resolved by the compiler
             return int(operand)
-        if op in ["jump", "jump_if", "jump_ifnot"]:
+        if op in JUMPS:
             # Operand is a label, which we may not have seen yet.
             # Leave it to be patched in the final label resolution step
             self.label_patch[len(self.code)] = operand
@@ -439,11 +611,11 @@ class ObjectCode:
         # Match should be exhaustive
         log.error(f"Unhandled operand type for {instr}")
 
-    def json(self) -> str:
-        struct = {
+    def struct(self) -> dict:
+        return {
             "class_name": self.class_name,
             "super": self.super_name,
-            "imports": [self.class_name] + list(IMPORTS)[1:],
+            "imports": [self.class_name] + self.imports[1:],
             "methods": self.method_list,
             "fields": self.field_list,
             # It's just simpler to count fields and methods
@@ -455,16 +627,412 @@ class ObjectCode:
             "constants": self.constants,
             "code": self.method_code
         }
-        return json.dumps(struct, indent=4)
+
+    def constant_report(self) -> str:
+        """How much interning shrank the constant pool"""
+        saved = self.const_operands - len(self.constants)
+        return (f"{self.class_name}: {len(self.constants)} constants "
+                f"for {self.const_operands} const operands ({saved} saved)")
+
+    def json(self) -> str:
+        return json.dumps(self.struct(), indent=4)
+
+    def binary(self) -> bytes:
+        return binary_object(self.struct())
 
     def __str__(self) -> str:
         return self.json()
 
 
 # ----------------
-#  Assembly code is line-oriented and can be parsed
-#  with regular expressions.  We strip away comments
-#  and then scan for label, operation, and operand fields.
+#  Peephole optimization.  The code generator lays out each if
+#  and while as a jump to the test, then the body, then the test
+#  and a conditional jump back to the body, and it starts each
+#  method with an "enter" that does nothing.  Before a method's
+#  instructions become code words we split them into basic blocks,
+#  and then
+#    - drop "enter",
+#    - thread jumps to blocks that only jump (or fall) onward,
+#    - drop blocks that cannot be reached, such as code after return,
+#    - lay the blocks out again, so that a jump's target follows it
+#      unless another block falls into the target (as a loop body
+#      falls into its test), and so that the test of an if falls
+#      into its body,
+#    - and drop jumps to the next instruction.
+#  Methods that jump to an undefined label or run off their end are
+#  left alone, so the assembler reports them as before.
+#
+INVERTED = {"jump_if": "jump_ifnot", "jump_ifnot": "jump_if",
+            "jump_int_eq": "jump_int_ne", "jump_int_ne": "jump_int_eq",
+            "jump_int_lt": "jump_int_ge", "jump_int_ge": "jump_int_lt",
+            "jump_int_gt": "jump_int_le", "jump_int_le": "jump_int_gt",
+            "jump_eq": "jump_ne", "jump_ne": "jump_eq"}
+JUMPS = ["jump"] + list(INVERTED)
+# Values each conditional jump takes off the stack
+BRANCH_OPERANDS = {kind: 1 if kind in ("jump_if", "jump_ifnot") else 2
+                   for kind in INVERTED}
+STOPS = ["return", "tail_call", "halt"]
+
+
+class Block:
+    """A run of instructions entered only at the top.  It ends with
+    a jump or conditional jump (branch) to another block, with return
+    or halt, or by falling into the next block.
+    """
+    def __init__(self, labels: List[str]):
+        self.labels = labels
+        self.code: List[Tuple] = []
+        self.branch: Optional[Tuple[str, str]] = None
+        self.falls = True
+
+
+def code_words(items: List[Tuple]) -> int:
+    return sum(1 + len(operand_parts(operation, operand))
+               for _, operation, operand in items if operation is not None)
+
+
+def operand_parts(operation: InstructionDef, operand) -> List[Tuple]:
+    """(operation, operand) for each operand word of an instruction.
+    A superinstruction has a tuple of operands, which belong to
+    those of its parts that take one.  An operation that takes
+    more than one operand word (call) has a tuple of its own.
+    """
+    if operation.parts:
+        takers = [part for part in operation.parts if part.ops != '0']
+        return [word for part, value in zip(takers, operand)
+                for word in operand_parts(part, value)]
+    if operand is None:
+        return []
+    if isinstance(operand, tuple):
+        return [(operation, value) for value in operand]
+    return [(operation, operand)]
+
+
+def basic_blocks(items: List[Tuple]) -> List[Block]:
+    blocks = [Block([])]
+    for label, operation, operand in items:
+        block = blocks[-1]
+        if operation is None:
+            if block.code or block.branch or not block.falls:
+                blocks.append(Block([]))
+            blocks[-1].labels.append(label)
+            continue
+        if block.branch or not block.falls:
+            block = Block([])
+            blocks.append(block)
+        if operation.name == "enter":
+            continue
+        if operation.name in JUMPS:
+            block.branch = (operation.name, operand)
+            block.falls = operation.name != "jump"
+        else:
+            block.code.append((None, operation, operand))
+            block.falls = operation.name not in STOPS
+    return blocks
+
+
+def peephole(items: List[Tuple]) -> List[Tuple]:
+    blocks = basic_blocks(items)
+    at_label = {}
+    for i, block in enumerate(blocks):
+        for label in block.labels:
+            at_label[label] = i
+    if blocks[-1].falls or any(block.branch[1] not in at_label
+                               for block in blocks if block.branch):
+        return [item for item in items
+                if item[1] is None or item[1].name != "enter"]
+
+    def onward(i: int) -> int:
+        # Thread through blocks that do nothing but jump or fall onward
+        seen = set()
+        while i not in seen and not blocks[i].code:
+            seen.add(i)
+            block = blocks[i]
+            if block.branch and block.branch[0] == "jump":
+                i = at_label[block.branch[1]]
+            elif not block.branch and block.falls:
+                i = i + 1
+            else:
+                break
+        return i
+
+    # Successors of each block after threading
+    target = {}
+    fall = {}
+    for i, block in enumerate(blocks):
+        if block.branch:
+            target[i] = onward(at_label[block.branch[1]])
+        if block.falls:
+            fall[i] = onward(i + 1)
+
+    reachable = set()
+    work = [0]
+    while work:
+        i = work.pop()
+        if i in reachable:
+            continue
+        reachable.add(i)
+        work += [j for j in (target.get(i), fall.get(i)) if j is not None]
+    # The entry block is kept even if it only jumps onward
+    falls_into = {i: [] for i in reachable}
+    preds = {i: [] for i in reachable}
+    for j in reachable:
+        if j in fall:
+            falls_into[fall[j]].append(j)
+            preds[fall[j]].append(j)
+        if j in target:
+            preds[target[j]].append(j)
+
+    order = []
+    placed = set()
+    # Successors passed over for another, to be placed next
+    # when the block just placed has no successor to follow it
+    deferred = []
+    # and otherwise, the first block not yet placed
+    in_order = sorted(reachable)
+    first = 0
+
+    def place(i: int):
+        order.append(i)
+        placed.add(i)
+
+    place(0)
+    while len(order) < len(reachable):
+        i = order[-1]
+        block = blocks[i]
+        after = None
+        if i in target and target[i] not in placed:
+            t = target[i]
+            if block.branch[0] == "jump":
+                others = [j for j in falls_into[t]
+                          if j != i and j not in placed]
+                if not others:
+                    after = t
+            elif fall[i] in placed:
+                after = t
+            elif t < i and all(j == i or j in placed for j in preds[t]):
+                # An if body, emitted before its test: the test
+                # (the last one, for "or") falls into it
+                after = t
+                deferred.append(fall[i])
+        if after is None and i in fall and fall[i] not in placed:
+            after = fall[i]
+        while after is None and deferred:
+            j = deferred.pop()
+            if j not in placed:
+                after = j
+        while after is None:
+            if in_order[first] not in placed:
+                after = in_order[first]
+            first += 1
+        place(after)
+
+    def name(i: int) -> str:
+        if not blocks[i].labels:
+            blocks[i].labels.append(f"$block{i}")
+        return blocks[i].labels[0]
+
+    optimized = []
+    for position, i in enumerate(order):
+        block = blocks[i]
+        following = order[position + 1] if position + 1 < len(order) else None
+        optimized += [(label, None, None) for label in block.labels]
+        optimized += block.code
+        if block.branch and block.branch[0] == "jump":
+            if target[i] != following:
+                optimized.append((None, INSTRS["jump"], name(target[i])))
+        elif block.branch:
+            kind = block.branch[0]
+            if target[i] == fall[i]:
+                # Both ways lead to the same place
+                optimized += [(None, INSTRS["pop"], None)] * BRANCH_OPERANDS[kind]
+            elif target[i] == following:
+                optimized.append((None, INSTRS[INVERTED[kind]],
+                                  name(fall[i])))
+            else:
+                optimized.append((None, INSTRS[kind], name(target[i])))
+            if fall[i] != following and target[i] != following:
+                optimized.append((None, INSTRS["jump"], name(fall[i])))
+        elif block.falls and fall[i] != following:
+            optimized.append((None, INSTRS["jump"], name(fall[i])))
+    return optimized
+
+
+# ----------------
+#  Superinstructions.  Each dispatch of the VM costs a fetch and an
+#  indirect call, whatever the operation does, and most of what
+#  compiled Quack executes is short runs like "load; load_field;
+#  call".  tools/superinstructions.py counts the most frequent runs
+#  in traces of real programs and adds an operation for each to
+#  opdefs.txt.  After the peephole pass we replace runs of their
+#  parts, longest first.  A run may not contain a label, since a
+#  jump could not enter a superinstruction in the middle; the miner
+#  only makes superinstructions whose jump, call or return is last.
+#
+def fuse(items: List[Tuple],
+         superinstructions: Dict[Tuple[str, ...], InstructionDef]) -> Tuple[List[Tuple], int]:
+    """Items with runs replaced by superinstructions,
+    and the number of superinstructions substituted.
+    """
+    if not superinstructions:
+        return items, 0
+    longest = max(len(parts) for parts in superinstructions)
+    fused = []
+    substituted = 0
+    i = 0
+    while i < len(items):
+        for n in range(min(longest, len(items) - i), 1, -1):
+            run = items[i:i + n]
+            # a label (operation None) matches no superinstruction
+            names = tuple(op.name if op else None for _, op, _ in run)
+            if names in superinstructions:
+                operands = tuple(operand for _, _, operand in run
+                                 if operand is not None)
+                fused.append((None, superinstructions[names], operands))
+                substituted += 1
+                i += n
+                break
+        else:
+            fused.append(items[i])
+            i += 1
+    return fused, substituted
+
+
+# ----------------
+#  Binary object files (.tvm) hold the same information as the
+#  JSON object code, packed for the loader to use in place rather
+#  than parse.  Every field is a little-endian 32-bit word:
+#
+#    header        BINARY_HEADER fields, see below
+#    string table  n_strings byte offsets into the string data,
+#                  then the NUL-terminated UTF-8 strings, padded
+#                  to a whole number of words
+#    imports       n_imports string indexes; the first is this class
+#    constants     n_constants pairs (kind, value) of string indexes
+#    methods       n_methods string indexes, the vtable names
+#    fields        n_fields string indexes
+#    code table    n_code method descriptors
+#                  (name, slot, first code word, number of words)
+#    code          n_code_words opcode and operand words
+#
+#  The loader (vm_loader.c) must agree with this layout; change
+#  BINARY_VERSION when it changes.  JSON remains the format to read.
+#
+BINARY_SUFFIX = ".tvm"
+BINARY_MAGIC = 0x4F4D5654   # "TVMO" as a little-endian word
+BINARY_VERSION = 1
+BINARY_HEADER = ["magic", "version", "class_name", "super",
+                 "n_fields", "n_methods", "n_inherited",
+                 "n_strings", "string_bytes", "n_imports",
+                 "n_constants", "n_code", "n_code_words"]
+
+
+def words(values: List[int]) -> bytes:
+    return pack(f"<{len(values)}i", *values)
+
+
+def binary_object(obj: dict) -> bytes:
+    """Pack an object code structure (ObjectCode.struct) into
+    the binary object file format.
+    """
+    strings: Dict[str, int] = {}
+
+    def string(text: str) -> int:
+        if text not in strings:
+            strings[text] = len(strings)
+        return strings[text]
+
+    imports = [string(name) for name in obj["imports"]]
+    constants = []
+    for constant in obj["constants"]:
+        constants += [string(constant["kind"]), string(constant["value"])]
+    methods = [string(name) for name in obj["methods"]]
+    fields = [string(name) for name in obj["fields"]]
+    code_table = []
+    code = []
+    for method in obj["code"]:
+        code_table += [string(method["name"]), method["slot"],
+                       len(code), len(method["code"])]
+        code += method["code"]
+    class_name, super_name = string(obj["class_name"]), string(obj["super"])
+
+    offsets = []
+    data = bytearray()
+    for text in strings:
+        offsets.append(len(data))
+        data += text.encode("utf-8") + b"\0"
+    data += bytes(-len(data) % 4)
+
+    header = {"magic": BINARY_MAGIC, "version": BINARY_VERSION,
+              "class_name": class_name, "super": super_name,
+              "n_fields": obj["n_fields"], "n_methods": obj["n_methods"],
+              "n_inherited": obj["n_inherited"],
+              "n_strings": len(offsets), "string_bytes": len(data),
+              "n_imports": len(imports),
+              "n_constants": len(obj["constants"]),
+              "n_code": len(obj["code"]), "n_code_words": len(code)}
+    return b"".join([words([header[field] for field in BINARY_HEADER]),
+                     words(offsets), bytes(data), words(imports),
+                     words(constants), words(methods), words(fields),
+                     words(code_table), words(code)])
+
+
+def read_binary_object(data: bytes) -> dict:
+    """Unpack a binary object file into an object code structure"""
+    position = 0
+
+    def take(n: int) -> Tuple[int, ...]:
+        nonlocal position
+        values = unpack_from(f"<{n}i", data, position)
+        position += calcsize(f"<{n}i")
+        return values
+
+    header = dict(zip(BINARY_HEADER, take(len(BINARY_HEADER))))
+    if header["magic"] != BINARY_MAGIC:
+        raise ValueError("Not a tiny vm binary object file")
+    if header["version"] != BINARY_VERSION:
+        raise ValueError(f"Binary object file version {header['version']}, "
+                         f"expected {BINARY_VERSION}")
+    offsets = take(header["n_strings"])
+    string_data = data[position:position + header["string_bytes"]]
+    position += header["string_bytes"]
+    strings = [string_data[offset:string_data.index(b"\0", offset)]
+               .decode("utf-8") for offset in offsets]
+
+    imports = [strings[i] for i in take(header["n_imports"])]
+    pairs = take(2 * header["n_constants"])
+    constants = [{"kind": strings[kind], "value": strings[value]}
+                 for kind, value in zip(pairs[0::2], pairs[1::2])]
+    methods = [strings[i] for i in take(header["n_methods"])]
+    fields = [strings[i] for i in take(header["n_fields"])]
+    descriptors = take(4 * header["n_code"])
+    code = take(header["n_code_words"])
+    method_code = []
+    for i in range(0, len(descriptors), 4):
+        name, slot, first, length = descriptors[i:i + 4]
+        method_code.append({"name": strings[name], "slot": slot,
+                            "code": list(code[first:first + length])})
+    return {
+        "class_name": strings[header["class_name"]],
+        "super": strings[header["super"]],
+        "imports": imports,
+        "methods": methods,
+        "fields": fields,
+        "n_fields": header["n_fields"],
+        "n_methods": header["n_methods"],
+        "n_inherited": header["n_inherited"],
+        "constants": constants,
+        "code": method_code
+    }
+
+
+# ----------------
+#  Assembly code is line-oriented.  We strip away comments and
+#  then look at the first word of the line: a directive (.class,
+#  .method, ...) is matched against the one pattern for that
+#  directive, and anything else is split into label, operation,
+#  and operand fields with string methods.  That way each line is
+#  scanned once, rather than tried against every pattern in turn.
 #
 
 def strip_comments(line: str) -> str:
@@ -473,30 +1041,74 @@ def strip_comments(line: str) -> str:
     # as will blank lines.
 
 
-# Instruction pattern (single operation of vm)
-INSTR_PAT = re.compile(r"""
-    ((?P<label> \w+) [:] )?   # Optional label
-    \s*
-    (?P<opname> [a-zA-Z_]+)      # Operation name is required
-    (\s+ (?P<operand>     # Operands are integers, quoted strings, or names
-             [0-9]+           # Integers are strings of digits
-           |
-             ["](             # String begins and ends with quote 
-               ([\\].)  |           # Anything escaped
-               [^"\\]               # Anything but a quote or escape
-             )*["]
-           |
-             (\w|[:$])+         # name, which may be part:part or $:part
-             )
-    )?                # Operand is optional
-   \s*
+# Characters of labels (\w) and of names used as operands (\w, :, $).
+# Lines that are not plain ASCII are checked with the patterns below
+# instead, since \w also matches non-ASCII letters and digits.
+WORD_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz"
+                       "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+                       "0123456789_")
+NAME_CHARS = WORD_CHARS | frozenset(":$")
+OPNAME_CHARS = WORD_CHARS - frozenset("0123456789")
+DIGITS = "0123456789"
+
+WORD_PAT = re.compile(r"\w+")
+NAME_PAT = re.compile(r"(\w|[:$])+")
+
+# Operands are integers, quoted strings, or names;
+# a string begins and ends with a quote
+STRING_PAT = re.compile(r"""
+    ["](
+         ([\\].)  |           # Anything escaped
+         [^"\\]               # Anything but a quote or escape
+       )*["]
     """, re.VERBOSE)
 
-# Bare labels
-LABEL_PAT = re.compile(r"""
-    ((?P<label> \w+):)   # Nothing but the label
-   \s*
-    """, re.VERBOSE)
+
+def is_word(text: str) -> bool:
+    if text.isascii():
+        return bool(text) and WORD_CHARS.issuperset(text)
+    return WORD_PAT.fullmatch(text) is not None
+
+
+def is_name(text: str) -> bool:
+    if text.isascii():
+        return bool(text) and NAME_CHARS.issuperset(text)
+    return NAME_PAT.fullmatch(text) is not None
+
+
+def split_instruction(line: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Split 'label: operation operand' into its fields; the label
+    and operand are optional.  The operation is None if the line is
+    not an instruction, e.g., a label with nothing after it.
+    """
+    label = None
+    colon = line.find(":")
+    if colon > 0 and is_word(line[:colon]):
+        label = line[:colon]
+        line = line[colon + 1:]
+    parts = line.split(None, 1)
+    if not parts:
+        return label, None, None
+    opname = parts[0]
+    if not OPNAME_CHARS.issuperset(opname):
+        return label, None, None
+    if len(parts) == 1:
+        return label, opname, None
+    operand = parts[1]
+    if operand[0] == '"':
+        if not STRING_PAT.fullmatch(operand):
+            return label, None, None
+    elif opname in ("call", "tail_call"):
+        # Class:method, then the number of arguments if any
+        words = operand.split()
+        if not is_name(words[0]) or len(words) > 2 \
+                or len(words) == 2 and not words[1].isdigit():
+            return label, None, None
+        operand = " ".join(words)
+    elif not is_name(operand):
+        return label, None, None
+    return label, opname, operand
+
 
 # Directive:  Name this class
 CLASS_DECL_PAT = re.compile(r"""
@@ -541,8 +1153,8 @@ LOCALS_DECL_PAT = re.compile(r"""
 """, re.VERBOSE)
 
 # Method argument:
-#    These will have addresses that are at a negative
-#    offset from the frame pointer
+#    These will have addresses just after the receiver,
+#    at fp+1, fp+2, ...
 ARGS_DECL_PAT = re.compile(r"""
 [.]args \s+
 (?P<arg_var_name> (\w+)(,\w+)*)
@@ -550,103 +1162,152 @@ ARGS_DECL_PAT = re.compile(r"""
 """, re.VERBOSE)
 
 
-def translate(lines: List[str]) -> ObjectCode:
-    code = ObjectCode()
-    for line in lines:
-        line = strip_comments(line)
-        if not line:
-            continue
-
-        # Kinds of assembly language line:
-        # Class declaration (.class)
+def parse_directive(directive: str, line: str) -> Optional[Tuple]:
+    """The line starting with a directive, as a tuple (see below);
+    None if it is not a well-formed directive.
+    """
+    # Class declaration (.class)
+    if directive == ".class":
         match = CLASS_DECL_PAT.match(line)
         if match:
-            class_name = match.groupdict()["class_name"]
-            superclass_name = match.groupdict()["super_name"]
-            code.declare_class(class_name, superclass_name)
-            continue
+            return ".class", match["class_name"], match["super_name"]
 
+    elif directive == ".method":
         # Method (.method f forward) to be filled in later
         match = METHOD_DECL_PAT.match(line)
         if match:
-            method_name = match.groupdict()["method_name"]
-            code.declare_method(method_name)
-            continue
-
+            return ".method", match["method_name"], "forward"
         # Method (.method) followed immediately by body
         match = METHOD_DEF_PAT.match(line)
         if match:
-            method_name = match.groupdict()["method_name"]
-            code.begin_method(method_name)
-            continue
+            return ".method", match["method_name"]
 
-        # Field declaration, ".field name"
+    # Field declaration, ".field name"
+    elif directive == ".field":
         match = FIELD_DECL_PAT.match(line)
         if match:
-            field_name = match.groupdict()["field_name"]
-            code.declare_field(field_name)
-            continue
+            return ".field", match["field_name"]
 
-        # Local variable declaration, ".local name,name,name"
+    # Local variable declaration, ".local name,name,name"
+    elif directive == ".local":
         match = LOCALS_DECL_PAT.match(line)
         if match:
-            locals_name_list = match.groupdict()["local_var_name"]
-            method_locals = locals_name_list.split(",")
-            n_locals = len(method_locals)
-            # Allocate space on stack for local variables
-            code.add_instruction(Instruction(
-                label=None,
-                operation=INSTRS["alloc"],
-                operand=n_locals))
-            # Now set up locals symbol table information
-            code.declare_locals(method_locals)
-            continue
+            return ".local", match["local_var_name"].split(",")
 
-        # Local variable declaration, ".local name,name,name"
+    # Argument declaration, ".args name,name,name"
+    elif directive == ".args":
         match = ARGS_DECL_PAT.match(line)
         if match:
-            locals_name_list = match.groupdict()["arg_var_name"]
-            args = locals_name_list.split(",")
-            # No space allocation needed, unlike local variables,
-            # because these are *before* (at negative offsets from)
-            # the frame pointer.
-            # Set up locals symbol table information
-            code.declare_args(args)
-            continue
+            return ".args", match["arg_var_name"].split(",")
+
+    return None
 
-        # An operation (label: operation operand)
-        match = INSTR_PAT.fullmatch(line)
-        if match:
-            parts = match.groupdict()
-            label = parts["label"]
-            opname = parts["opname"]
-            operand = parts["operand"]
-            instruction = Instruction(label, INSTRS[opname], operand)
-            code.add_instruction(instruction)
-            continue
 
-        # A label with no instruction
-        # An operation (label: operation operand)
-        match = LABEL_PAT.match(line)
-        if not match:
+def parse_line(line: str) -> Optional[Tuple]:
+    """A line of assembly text as a tuple (see below), or None
+    if it is blank, a comment, or (logged) not well-formed.
+    """
+    line = strip_comments(line)
+    if not line:
+        return None
+
+    # Kinds of assembly language line:
+    # Directives (.class, .method, .field, .local, .args)
+    if line[0] == ".":
+        directive = line.split(None, 1)[0]
+        parsed = parse_directive(directive, line)
+        if parsed is None:
             log.error(f"NO MATCH on '{line}'")
-            continue
-        parts = match.groupdict()
-        label = parts["label"]
-        code.add_label(label)
+        return parsed
+
+    # An operation (label: operation operand), or a label
+    # with no instruction
+    label, opname, operand = split_instruction(line)
+    if opname is None and label is None:
+        log.error(f"NO MATCH on '{line}'")
+        return None
+    return label, opname, operand
 
 
+# ----------------
+#  Assembly lines as data.  translate_lines assembles a class from
+#  lines already split into their fields, which is what parse_line
+#  makes of assembly text and what the Quack compiler generates
+#  directly (compiler/quack_codegen.py), so a class compiled and
+#  assembled in one process is never written out and parsed back.
+#  Each line is a tuple (or a list, after a trip through JSON):
+#
+#    (".class", class_name, super_name)
+#    (".method", method_name)  or  (".method", method_name, "forward")
+#    (".field", field_name)
+#    (".args", [name, ...])  and  (".local", [name, ...])
+#    (label, operation, operand)
+#
+#  The label of an operation may be None, as may its operand; a
+#  label on a line by itself has operation None.  Operands are
+#  the text they would be in assembly source.
+#
 
-    code.resolve_jumps()  # Of the last method entered
+def declare(code: ObjectCode, line):
+    """Apply a directive line to the object code"""
+    directive = line[0]
+    if directive == ".class":
+        code.declare_class(line[1], line[2])
+    elif directive == ".method" and len(line) > 2:
+        code.declare_method(line[1])
+    elif directive == ".method":
+        code.begin_method(line[1])
+    elif directive == ".field":
+        code.declare_field(line[1])
+    elif directive == ".local":
+        # Allocate space on stack for local variables
+        code.add_instruction(Instruction(
+            label=None,
+            operation=INSTRS["alloc"],
+            operand=len(line[1])))
+        # Now set up locals symbol table information
+        code.declare_locals(list(line[1]))
+    elif directive == ".args":
+        # No space allocation needed, unlike local variables,
+        # because the caller pushed them after the receiver.
+        # Set up locals symbol table information
+        code.declare_args(list(line[1]))
+
+
+def translate_lines(lines, optimize: bool = True) -> ObjectCode:
+    code = ObjectCode()
+    code.optimize = optimize
+    for line in lines:
+        first = line[0]
+        if first is not None and first[0] == ".":
+            declare(code, line)
+        elif line[1] is None:
+            code.add_label(first)
+        else:
+            code.add_instruction(Instruction(first, INSTRS[line[1]], line[2]))
+    code.end_method()  # Of the last method entered
     return code
 
 
+def translate(lines: List[str], optimize: bool = True) -> ObjectCode:
+    parsed = (parse_line(line) for line in lines)
+    return translate_lines([line for line in parsed if line is not None],
+                           optimize)
+
+
 def main():
     """Assemble one file into object code in json format"""
     args = cli()
     source = [line for line in args.source]
-    objcode = translate(source)
-    print(objcode.json(), file=args.target)
+    objcode = translate(source, optimize=not args.no_peephole)
+    if args.binary:
+        args.target.buffer.write(objcode.binary())
+    else:
+        print(objcode.json(), file=args.target)
+    if args.verbose:
+        print(objcode.constant_report(), file=sys.stderr)
+        if objcode.peephole_counts:
+            print(objcode.peephole_report(), file=sys.stderr)
 
 
 if __name__ == "__main__":
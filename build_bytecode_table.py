@@ -1,6 +1,8 @@
 """Build table mapping integer byte codes to function pointers.
 Machine operations, their names, and the number of operands
-for each are given in opdefs.txt.
+for each are given in opdefs.txt.  Superinstructions have a
+fourth column, the operations they combine (see
+tools/superinstructions.py, which writes them).
 """
 import argparse
 import datetime
@@ -31,7 +33,7 @@ op_tbl_entry vm_op_bytecodes[] = {LB}
 
 # Fixed code at end of generated file
 CODA = """
-    { 0, 0, 0}  // SENTRY
+    { 0, 0, 0, 0}  // SENTRY
 };
 """
 
@@ -66,9 +68,10 @@ def main():
         if len(line) == 0:
             continue
         parts = line.split(",")
-        assert len(parts) == 3, f"Couldn't parse {line}"
-        name, func, inlines = parts
-        print(f'\t {LB} "{name}", {func}, {inlines} {RB}, //{next_byte_code} {comment}',
+        assert len(parts) in (3, 4), f"Couldn't parse {line}"
+        name, func, inlines = parts[:3]
+        fused = f'"{parts[3].strip()}"' if len(parts) == 4 else "0"
+        print(f'\t {LB} "{name}", {func}, {inlines}, {fused} {RB}, //{next_byte_code} {comment}',
               file=args.outfile)
         next_byte_code += 1
     print(CODA, file=args.outfile)
@@ -149,8 +149,10 @@ vm_Word method_Obj_print[] = {
         {.intval = 0},
         {.instr = vm_op_methodcall},
         {.intval = 1},  // string method
+        {.intval = 0},  // no arguments
         {.instr = vm_op_methodcall},
         {.intval = 2},  // print method of class string
+        {.intval = 0},
         {.instr = vm_op_return},
         {.intval = 0}
 };
@@ -160,7 +162,7 @@ obj_ref native_Obj_equals() {
     obj_ref this = vm_fp->obj;
     /* Checked downcast */
     assert_is_type(this, the_class_Obj);
-    obj_ref other = (vm_fp - 1)->obj;
+    obj_ref other = (vm_fp + 1)->obj;
     assert_is_type(other, the_class_Obj);
     if (this == other) {
         return lit_true;
@@ -174,7 +176,7 @@ vm_Word method_Obj_equals[] = {
         {.instr = vm_op_load},
         {.intval = 0},   // this
         {.instr = vm_op_load},
-        {.intval = -1},  // other
+        {.intval = 1},   // other
         {.instr = vm_op_call_native},
         {.native = native_Obj_equals},
         {.instr = vm_op_return},
@@ -292,7 +294,7 @@ obj_ref native_String_equals(void ) {
     obj_ref this = vm_fp->obj;
     assert_is_type(this, the_class_String);
     obj_String this_str = (obj_String) this;
-    obj_ref other = (vm_fp - 1)->obj;
+    obj_ref other = (vm_fp + 1)->obj;
     assert_is_type(other, the_class_String);
     obj_String other_str = (obj_String) other;
     if (strcmp(this_str->text, other_str->text) == 0) {
@@ -307,7 +309,7 @@ vm_Word method_String_equals[] = {
         {.instr = vm_op_load},
         {.intval = 0},   // this
         {.instr = vm_op_load},
-        {.intval = -1},  // other
+        {.intval = 1},   // other
         {.instr = vm_op_call_native},
         {.native = native_String_equals},
         {.instr = vm_op_return},
@@ -318,7 +320,7 @@ obj_ref native_String_less(void ) {
   obj_ref this = vm_fp->obj;
   assert_is_type(this, the_class_String);
   obj_String this_string = (obj_String) this;
-  obj_ref other = (vm_fp - 1)->obj;
+  obj_ref other = (vm_fp + 1)->obj;
   assert_is_type(other, the_class_String);
   obj_String other_string = (obj_String) other;
   log_debug("Comparing string values for order: %s < %s",
@@ -342,7 +344,7 @@ obj_ref native_String_plus(void ) {
   obj_ref this = vm_fp->obj;
   assert_is_type(this, the_class_String);
   obj_String this_string = (obj_String) this;
-  obj_ref other = (vm_fp - 1)->obj;
+  obj_ref other = (vm_fp + 1)->obj;
   assert_is_type(other, the_class_String);
   obj_String other_string = (obj_String) other;
   log_debug("Adding string values: %s + %s",
@@ -637,7 +639,7 @@ obj_ref native_Int_equals(void ) {
     obj_ref this = vm_fp->obj;
     assert_is_type(this, the_class_Int);
     obj_Int this_int = (obj_Int) this;
-    obj_ref other = (vm_fp - 1)->obj;
+    obj_ref other = (vm_fp + 1)->obj;
     assert_is_type(other, the_class_Int);
     obj_Int other_int = (obj_Int) other;
     log_debug("Comparing integer values for equality: %d == %d",
@@ -665,7 +667,7 @@ obj_ref native_Int_less(void ) {
     obj_ref this = vm_fp->obj;
     assert_is_type(this, the_class_Int);
     obj_Int this_int = (obj_Int) this;
-    obj_ref other = (vm_fp - 1)->obj;
+    obj_ref other = (vm_fp + 1)->obj;
     assert_is_type(other, the_class_Int);
     obj_Int other_int = (obj_Int) other;
     log_debug("Comparing integer values for order: %d < %d",
@@ -690,7 +692,7 @@ obj_ref native_Int_greater(void ) {
     obj_ref this = vm_fp->obj;
     assert_is_type(this, the_class_Int);
     obj_Int this_int = (obj_Int) this;
-    obj_ref other = (vm_fp - 1)->obj;
+    obj_ref other = (vm_fp + 1)->obj;
     assert_is_type(other, the_class_Int);
     obj_Int other_int = (obj_Int) other;
     log_debug("Comparing integer values for order: %d > %d",
@@ -715,7 +717,7 @@ obj_ref native_Int_less_eq(void ) {
     obj_ref this = vm_fp->obj;
     assert_is_type(this, the_class_Int);
     obj_Int this_int = (obj_Int) this;
-    obj_ref other = (vm_fp - 1)->obj;
+    obj_ref other = (vm_fp + 1)->obj;
     assert_is_type(other, the_class_Int);
     obj_Int other_int = (obj_Int) other;
     log_debug("Comparing integer values for order: %d <= %d",
@@ -740,7 +742,7 @@ obj_ref native_Int_greater_eq(void ) {
     obj_ref this = vm_fp->obj;
     assert_is_type(this, the_class_Int);
     obj_Int this_int = (obj_Int) this;
-    obj_ref other = (vm_fp - 1)->obj;
+    obj_ref other = (vm_fp + 1)->obj;
     assert_is_type(other, the_class_Int);
     obj_Int other_int = (obj_Int) other;
     log_debug("Comparing integer values for order: %d >= %d",
@@ -784,7 +786,7 @@ obj_ref native_Int_plus(void ) {
     obj_ref this = vm_fp->obj;
     assert_is_type(this, the_class_Int);
     obj_Int this_int = (obj_Int) this;
-    obj_ref other = (vm_fp - 1)->obj;
+    obj_ref other = (vm_fp + 1)->obj;
     assert_is_type(other, the_class_Int);
     obj_Int other_int = (obj_Int) other;
     log_debug("Adding integer values: %d + %d",
@@ -805,7 +807,7 @@ obj_ref native_Int_minus(void ) {
   obj_ref this = vm_fp->obj;
   assert_is_type(this, the_class_Int);
   obj_Int this_int = (obj_Int) this;
-  obj_ref other = (vm_fp - 1)->obj;
+  obj_ref other = (vm_fp + 1)->obj;
   assert_is_type(other, the_class_Int);
   obj_Int other_int = (obj_Int) other;
   log_debug("Subtracting integer values: %d - %d",
@@ -826,7 +828,7 @@ obj_ref native_Int_times(void ) {
   obj_ref this = vm_fp->obj;
   assert_is_type(this, the_class_Int);
   obj_Int this_int = (obj_Int) this;
-  obj_ref other = (vm_fp - 1)->obj;
+  obj_ref other = (vm_fp + 1)->obj;
   assert_is_type(other, the_class_Int);
   obj_Int other_int = (obj_Int) other;
   log_debug("Multiplying integer values: %d * %d",
@@ -847,7 +849,7 @@ obj_ref native_Int_divide(void ) {
   obj_ref this = vm_fp->obj;
   assert_is_type(this, the_class_Int);
   obj_Int this_int = (obj_Int) this;
-  obj_ref other = (vm_fp - 1)->obj;
+  obj_ref other = (vm_fp + 1)->obj;
   assert_is_type(other, the_class_Int);
   obj_Int other_int = (obj_Int) other;
   log_debug("Dividing integer values: %d / %d",
@@ -881,7 +883,7 @@ struct  class_struct  the_class_Int_struct = {
                 method_Int_less, // LESS
 		method_Int_greater,
 		method_Int_less_eq,
-		method_Int_less_eq,
+		method_Int_greater_eq,
 		method_Int_negate, // NEGATE
                 method_Int_plus, // PLUS
 		method_Int_minus, // MINUS
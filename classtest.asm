@@ -9,7 +9,7 @@
     load seven
     load test
     const 7
-    call Test:Seven
+    call Test:Seven 1
     store seven
     load seven
     call Int:print
@@ -0,0 +1,533 @@
+"""Build driver for Quack programs.
+
+Compiles, assembles and writes object code for a whole program, or a
+whole directory of programs, in one process.  The parser, the
+instruction set and the assembler's cache of imported modules are
+shared by every class built, and classes are handed from the compiler
+to the assembler in memory, as lines already split into their fields
+(see assemble.translate_lines), so the assembly is never written out as
+text and parsed back.  With --asm, the assembly of each class is also
+written to asm/<class>.asm, for reading.
+
+    python3 compiler/quack_build.py src/fib_20.qk [--run]
+    python3 compiler/quack_build.py src/
+    python3 compiler/quack_build.py --incremental src/
+
+With --incremental, content hashes from the previous build are kept in
+a cache file.  A program whose source is unchanged is not recompiled,
+and a class is not reassembled while its assembly and the method and
+field layout of every module it imports are unchanged.  When a class
+layout does change, the classes that import it are reassembled after it.
+The cache also keeps a hash of the compiler, the assembler and the
+instruction set, and a change to any of them makes a full build.
+
+With --jobs N, classes are assembled in a pool of N processes.  A class
+must be assembled after the classes of the same program that it extends
+or refers to (through new, is_instance, call and field operands), so
+the classes are grouped into dependency levels and each level is
+assembled in parallel.  The object code is the same as a serial build.
+
+With --binary, each class is also written as a binary object file
+(OBJ/<class>.tvm), which the tiny_vm loads in preference to the JSON;
+the JSON is still written, for debugging and for the assembler to
+import.  Without --binary, a binary object file left from an earlier
+build is removed when its class is rebuilt.
+
+With -O, method bodies are compiled through the SSA optimizer
+(compiler/quack_opt.py); --passes picks which of its passes run, and
+--opt-report prints what each pass did to each method.  --type-report
+prints how many statements type inference checked, and in how many rounds.
+
+--time-passes prints the wall time, peak memory, AST nodes and
+instructions emitted of each compiler pass (see compiler/quack_passes.py)
+for each program, and --stats FILE writes them for every program built
+to a JSON file.  --skip-passes leaves compiler passes out, to profile
+the rest of a large compile.
+
+Run it from the repository root, like ./quack.
+"""
+import argparse
+import hashlib
+import json
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import assemble
+from concurrent.futures import ProcessPoolExecutor
+from quack_frontend import Compilation, optimizer_passes, skip_passes
+from quack_passes import write_stats
+from quack_codegen import assembly_text
+
+STAGES = ["compile", "assemble", "write"]
+CACHE_FILE = ".quack_build_cache.json"
+
+
+def digest(text) -> str:
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+    return hashlib.sha256(text).hexdigest()
+
+
+def toolchain_digest() -> str:
+    """The compiler, the assembler and the instruction set: object
+    code built by any other version may not match the vm's
+    """
+    paths = sorted(Path(__file__).resolve().parent.glob("*.py"))
+    paths += [Path(assemble.__file__).resolve(), Path("opdefs.txt")]
+    return digest(b"".join(path.read_bytes() for path in paths))
+
+
+def lines_digest(lines: list) -> str:
+    # the assembly lines of a class, as they would be cached
+    return digest(json.dumps(lines))
+
+
+def layout_digest(module: assemble.ImportedModule) -> str:
+    # code that uses a class depends only on its method and field slots
+    return digest(json.dumps([module.methods, module.fields]))
+
+
+def asm_path(name: str) -> Path:
+    return Path("asm").joinpath(name).with_suffix(".asm")
+
+
+def obj_path(name: str) -> Path:
+    return assemble.CONFIG.tvmlib.joinpath(name).with_suffix(".json")
+
+
+def binary_path(name: str) -> Path:
+    return obj_path(name).with_suffix(assemble.BINARY_SUFFIX)
+
+
+class BuildCache:
+    """Content hashes recorded by the previous incremental build:
+    for each program, its source and the assembly lines of the classes
+    it defines; for each class, its assembly, its object code and the
+    layout of each module it imports.  Nothing recorded by another
+    version of the compiler or assembler is used.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.toolchain = toolchain_digest()
+        self.programs = {}
+        self.classes = {}
+        if path.exists():
+            with open(path, 'r') as f:
+                cached = json.load(f)
+            if cached.get("toolchain") == self.toolchain:
+                self.programs = cached["programs"]
+                self.classes = cached["classes"]
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump({"toolchain": self.toolchain,
+                       "programs": self.programs,
+                       "classes": self.classes}, f, indent=4)
+
+    def cached_program(self, path: Path, source_hash: str) -> dict:
+        """The assembly lines of each class of an unchanged program,
+        or None if the program must be compiled.
+        """
+        entry = self.programs.get(str(path))
+        if entry is None or entry["source"] != source_hash \
+                or not isinstance(entry["classes"], dict):
+            return None
+        classes = entry["classes"]
+        for name, lines in classes.items():
+            if name not in self.classes or \
+                    self.classes[name]["asm"] != lines_digest(lines):
+                return None
+        return classes
+
+    def class_current(self, name: str, asm_hash: str,
+                      binary: bool = False) -> bool:
+        """True if the class's object code is up to date: same assembly,
+        object files untouched, and every import has the same layout.
+        """
+        entry = self.classes.get(name)
+        if entry is None or entry["asm"] != asm_hash:
+            return False
+        if binary and entry.get("binary") is None:
+            return False
+        try:
+            with open(obj_path(name), 'r') as f:
+                if digest(f.read()) != entry["object"]:
+                    return False
+            if binary:
+                with open(binary_path(name), 'rb') as f:
+                    if digest(f.read()) != entry["binary"]:
+                        return False
+            for module, layout in entry["imports"].items():
+                if layout_digest(assemble.import_module(module)) != layout:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def record_program(self, path: Path, source_hash: str, classes: dict):
+        self.programs[str(path)] = {"source": source_hash,
+                                    "classes": classes}
+
+    def record_class(self, name: str, asm_hash: str, struct: dict,
+                     binary: bool = False):
+        imports = {}
+        for module in struct["imports"][1:]:
+            imports[module] = layout_digest(assemble.import_module(module))
+        binary_hash = None
+        if binary:
+            binary_hash = digest(assemble.binary_object(struct))
+        self.classes[name] = {"asm": asm_hash,
+                              "object": digest(object_text(struct)),
+                              "binary": binary_hash,
+                              "imports": imports}
+
+
+def object_text(struct: dict) -> str:
+    return json.dumps(struct, indent=4) + "\n"
+
+
+class StageTimer:
+    """Accumulates wall-clock time per build stage"""
+    def __init__(self):
+        self.seconds = {stage: 0.0 for stage in STAGES}
+        self.started = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def stop(self, stage: str):
+        self.seconds[stage] += time.perf_counter() - self.started
+
+    def report(self, title: str) -> str:
+        parts = [f"{stage} {self.seconds[stage] * 1000:.1f} ms"
+                 for stage in STAGES]
+        total = sum(self.seconds.values()) * 1000
+        return f"{title}: " + ", ".join(parts) + f" (total {total:.1f} ms)"
+
+
+# Operations whose operand names a class: Class:member, or
+# the class itself for new and is_instance
+REFERENCES = {"new", "is_instance", "call", "tail_call",
+              "load_field", "store_field"}
+
+
+def referenced_classes(lines: list) -> set:
+    """The superclass and the classes named by operands"""
+    referenced = set()
+    for line in lines:
+        if line[0] == ".class":
+            referenced.add(line[2])
+        elif line[0] is None or line[0][0] != ".":
+            if line[1] in REFERENCES:
+                referenced.add(re.split("[: ]", line[2])[0])
+    return referenced
+
+
+def dependencies(classes: dict) -> dict:
+    """The earlier classes of the program that each class extends or
+    refers to.  A serial build imports later classes from the library,
+    so references to them are not dependencies here either.
+    """
+    deps = {}
+    order = list(classes)
+    for position, name in enumerate(order):
+        referenced = referenced_classes(classes[name])
+        deps[name] = [other for other in order[:position]
+                      if other in referenced]
+    return deps
+
+
+def dependency_levels(deps: dict) -> list:
+    """Group classes so each level depends only on earlier levels"""
+    level = {}
+    for name, needs in deps.items():
+        level[name] = 1 + max(level[other] for other in needs) if needs else 0
+    levels = [[] for _ in range(1 + max(level.values(), default=-1))]
+    for name in deps:
+        levels[level[name]].append(name)
+    return levels
+
+
+@contextmanager
+def importable(structs: dict):
+    """Make freshly assembled classes importable for the duration"""
+    for module, struct in structs.items():
+        assemble.register_module(module, struct)
+    try:
+        yield
+    finally:
+        for module in structs:
+            assemble.forget_module(module)
+
+
+def assemble_class(name: str, lines: list, deps: dict) -> tuple:
+    """Assemble one class as a serial build would: the classes of the
+    same program it depends on are imported from memory, any other
+    class from the library.  Returns the object code structure and the
+    CPU time it took (wall time would count the time a worker waits for
+    a core), and may run in a worker process.
+    """
+    started = time.process_time()
+    with importable(deps):
+        struct = assemble.translate_lines(lines).struct()
+    return struct, time.process_time() - started
+
+
+def assemble_program(classes: dict, cache: BuildCache = None,
+                     pool: ProcessPoolExecutor = None,
+                     binary: bool = False) -> dict:
+    """Assemble the classes of one program, returning the object code
+    structure of each class assembled.  With a cache, classes that are
+    up to date (including their binary object files, if wanted) are
+    skipped; with a pool, each dependency level is assembled in parallel.
+    """
+    deps = dependencies(classes)
+    objects = {}
+    busy = 0.0
+    started = time.perf_counter()
+
+    def rebuilt_deps(name: str) -> dict:
+        # dependencies that were not rebuilt are up to date on disk
+        return {module: objects[module]
+                for module in deps[name] if module in objects}
+
+    # a class is checked against the classes it depends on as
+    # rebuilt, so they are assembled first even without a pool
+    levels = dependency_levels(deps)
+    for level in levels:
+        todo = []
+        for name in level:
+            if cache:
+                with importable(rebuilt_deps(name)):
+                    if cache.class_current(name, lines_digest(classes[name]),
+                                           binary):
+                        continue
+            todo.append(name)
+        if pool and len(todo) > 1:
+            results = pool.map(assemble_class, todo,
+                               [classes[name] for name in todo],
+                               [rebuilt_deps(name) for name in todo])
+        else:
+            results = (assemble_class(name, classes[name], rebuilt_deps(name))
+                       for name in todo)
+        for name, (struct, seconds) in zip(todo, results):
+            objects[name] = struct
+            busy += seconds
+            if cache:
+                with importable(rebuilt_deps(name)):
+                    cache.record_class(name, lines_digest(classes[name]), struct,
+                                       binary)
+
+    if pool and objects:
+        wall = time.perf_counter() - started
+        print(f"Assembled {len(objects)} classes in {len(levels)} levels: "
+              f"{busy * 1000:.1f} ms of work in {wall * 1000:.1f} ms "
+              f"({busy / wall:.2f} workers busy on average)")
+    return objects
+
+
+def forget_program(classes: dict):
+    # another program may define classes with the same names
+    for name in classes:
+        assemble.forget_module(name)
+
+
+def write_program(classes: dict, objects: dict, binary: bool = False,
+                  asm: bool = False):
+    if asm:
+        for name, lines in classes.items():
+            with open(asm_path(name), 'w') as f:
+                f.write(assembly_text(lines))
+    for name, struct in objects.items():
+        with open(obj_path(name), 'w') as f:
+            f.write(object_text(struct))
+        if binary:
+            with open(binary_path(name), 'wb') as f:
+                f.write(assemble.binary_object(struct))
+        else:
+            # the tiny_vm would load a stale binary in preference
+            binary_path(name).unlink(missing_ok=True)
+
+
+def build_file(path: Path, timer: StageTimer, cache: BuildCache = None,
+               pool: ProcessPoolExecutor = None, binary: bool = False,
+               passes: list = None, opt_report: bool = False,
+               asm: bool = False, type_report: bool = False,
+               time_passes: bool = False, skip: list = (),
+               pass_stats: list = None) -> bool:
+    """Compile, assemble and write one program; the main class is
+    named after the file, as in ./quack.  With a cache, only what
+    changed since the last build is redone.  With a list of passes,
+    methods are compiled through the SSA optimizer.  With asm, the
+    assembly of each class compiled is written too.  With type_report,
+    the work type inference took is printed.  With time_passes, the
+    compiler passes are measured and printed, and with a pass_stats
+    list, their measurements are added to it; the passes named in skip
+    are left out.  Returns False, with the error printed on one line,
+    if the program does not compile or assemble.
+    """
+    clazz = path.stem
+    with open(path, 'r', encoding='utf-8') as f:
+        source = f.read()
+    source_hash = digest(clazz + "\n" + source)
+    if passes is not None:
+        # the same source optimized differently is a different program
+        source_hash = digest(source_hash + "\n" + ",".join(passes))
+    if skip:
+        source_hash = digest(source_hash + "\nskip " + ",".join(skip))
+
+    timer.start()
+    try:
+        classes = None
+        if cache:
+            classes = cache.cached_program(path, source_hash)
+        compiled = classes is None
+        if compiled:
+            try:
+                compilation = Compilation(clazz, passes, skip,
+                                          time_passes or pass_stats is not None)
+                classes = compilation.compile(source)
+            except Exception as e:
+                print(f"Error compiling {path}: {type(e).__name__}: {e}", file=sys.stderr)
+                return False
+            optimizer = compilation.codegen.optimizer
+            if opt_report and optimizer is not None:
+                for line in optimizer.report:
+                    print(f"  {line}")
+            if type_report:
+                print(f"  {compilation.typechecker.report()}")
+            if time_passes:
+                for line in compilation.manager.report():
+                    print(f"  {line}")
+            if pass_stats is not None:
+                pass_stats.append({"program": str(path),
+                                   "passes": compilation.manager.stats})
+            print(f"Compiled {path} -> {', '.join(classes)}")
+    finally:
+        timer.stop("compile")
+
+    timer.start()
+    try:
+        objects = assemble_program(classes, cache, pool, binary)
+    except Exception as e:
+        print(f"Error assembling {path}: {type(e).__name__}: {e}", file=sys.stderr)
+        return False
+    finally:
+        forget_program(classes)
+        timer.stop("assemble")
+    if cache:
+        cache.record_program(path, source_hash, classes)
+
+    if cache and not objects:
+        print(f"{path} is up to date")
+    elif cache:
+        print(f"Assembled {', '.join(objects)} "
+              f"({len(objects)} of {len(classes)} classes)")
+
+    timer.start()
+    if cache:
+        # leave unchanged files alone
+        classes = {name: lines for name, lines in classes.items()
+                   if compiled and name in objects}
+    write_program(classes, objects, binary, asm)
+    timer.stop("write")
+    return True
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser(description=
+                                     'Compile and assemble Quack programs')
+    parser.add_argument("sources", nargs="+",
+                        help="Quack source files, or directories of them")
+    parser.add_argument("--run", action="store_true",
+                        help="Run the (last) program on the tiny_vm")
+    parser.add_argument("--debug", action="store_true",
+                        help="With --run, run the tiny_vm in debug mode")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only rebuild what changed since the last build")
+    parser.add_argument("--cache", default=CACHE_FILE,
+                        help="Content-hash cache file for --incremental")
+    parser.add_argument("--binary", action="store_true",
+                        help="Also write binary object files for the tiny_vm")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Assemble independent classes in this many processes")
+    parser.add_argument("--asm", action="store_true",
+                        help="Also write the assembly of each class to asm/")
+    parser.add_argument("-O", "--optimize", action="store_true",
+                        help="Compile methods through the SSA optimizer with every pass")
+    parser.add_argument("--passes", default=None,
+                        help="Compile methods through the SSA optimizer with only "
+                        "these comma-separated passes")
+    parser.add_argument("--opt-report", action="store_true",
+                        help="Print what the optimizer did to each method")
+    parser.add_argument("--type-report", action="store_true",
+                        help="Print how much work type inference took")
+    parser.add_argument("--time-passes", action="store_true",
+                        help="Print the time, peak memory, AST nodes and "
+                        "instructions of each compiler pass")
+    parser.add_argument("--stats", default=None,
+                        help="Write the measurements of each compiler pass "
+                        "to this JSON file")
+    parser.add_argument("--skip-passes", default="",
+                        help="Leave out these comma-separated compiler passes")
+    return parser.parse_args()
+
+
+def main():
+    args = cli()
+    paths = []
+    for source in args.sources:
+        source = Path(source)
+        if source.is_dir():
+            paths.extend(sorted(source.glob("*.qk")))
+        else:
+            paths.append(source)
+
+    cache = BuildCache(Path(args.cache)) if args.incremental else None
+    pool = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+    passes = optimizer_passes(args.optimize, args.passes)
+    skip = skip_passes(args.skip_passes)
+    pass_stats = [] if args.stats is not None else None
+    totals = StageTimer()
+    failures = 0
+    for path in paths:
+        timer = StageTimer()
+        if not build_file(path, timer, cache, pool, args.binary,
+                          passes, args.opt_report, args.asm,
+                          args.type_report, args.time_passes, skip,
+                          pass_stats):
+            failures += 1
+        print(timer.report(str(path)))
+        for stage in STAGES:
+            totals.seconds[stage] += timer.seconds[stage]
+
+    if cache:
+        cache.save()
+    if pass_stats is not None:
+        write_stats(args.stats, pass_stats)
+    if pool:
+        pool.shutdown()
+
+    if len(paths) > 1:
+        print(totals.report(f"{len(paths)} programs, {failures} failed"))
+
+    if failures:
+        sys.exit(1)
+
+    if args.run:
+        vm = ["bin/tiny_vm", "-L", str(assemble.CONFIG.tvmlib)]
+        if args.debug:
+            vm.append("-D")
+        # the vm writes to the same stdout, so what we printed must go first
+        sys.stdout.flush()
+        subprocess.run(vm + [paths[-1].stem])
+
+
+if __name__ == '__main__':
+    main()
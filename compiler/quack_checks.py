@@ -1,6 +1,5 @@
 import quack_middle as qm
 from quack_visitor import ASTVisitor
-from quack_tables import tables
 
 class QuackInitializationCheck(ASTVisitor):
 
@@ -84,5 +83,3 @@ class QuackInitializationCheck(ASTVisitor):
 
     def VisitBody(self, node: qm.BodyNode, init: set):
         pass
-        
-initialization_check = QuackInitializationCheck()
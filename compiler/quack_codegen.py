@@ -1,6 +1,95 @@
 import quack_middle as qm
+from quack_ir import flatten
+from quack_slots import allocate_slots
 from quack_visitor import ASTVisitor
-from quack_tables import tables
+from quack_tables import Tables
+
+# Operations on Int that have an opcode of their own, used instead
+# of a call to the builtin method when the type checker has proven
+# both operands are Int (which can't be subclassed)
+INT_BINARY_OPS = {'+': "int_add", '-': "int_sub", '*': "int_mul", '/': "int_div"}
+INT_COMPARE_OPS = {"==": "int_eq", "!=": "int_eq", "<": "int_lt",
+                   "<=": "int_le", ">": "int_gt", ">=": "int_ge"}
+
+# the same by builtin method, where the receiver is the left operand
+TYPED_METHODS = {
+    "Int:plus": "int_add", "Int:minus": "int_sub",
+    "Int:times": "int_mul", "Int:divide": "int_div",
+    "Int:negate": "int_neg", "Int:equals": "int_eq",
+    "Int:less": "int_lt", "Int:greater": "int_gt",
+    "Int:less_eq": "int_le", "Int:greater_eq": "int_ge",
+    "Bool:negate": "bool_not",
+}
+
+# Conditional jumps that compare their two operands themselves, for
+# Ints, and for classes whose equals is identity (Obj:equals)
+INT_BRANCH_OPS = {"==": "jump_int_eq", "!=": "jump_int_ne", "<": "jump_int_lt",
+                  "<=": "jump_int_le", ">": "jump_int_gt", ">=": "jump_int_ge"}
+IDENTITY_BRANCH_OPS = {"==": "jump_eq", "!=": "jump_ne"}
+IDENTITY_CLASSES = ["Bool", "Nothing"]
+NEGATED = {"==": "!=", "!=": "==", "<": ">=", ">=": "<", ">": "<=", "<=": ">"}
+
+# a typed comparison and the jump_if on its result, fused
+FUSED_BRANCHES = {"int_eq": "jump_int_eq", "int_lt": "jump_int_lt",
+                  "int_le": "jump_int_le", "int_gt": "jump_int_gt",
+                  "int_ge": "jump_int_ge"}
+NEGATED_BRANCHES = {"jump_if": "jump_ifnot", "jump_ifnot": "jump_if"}
+NEGATED_BRANCHES.update({INT_BRANCH_OPS[op]: INT_BRANCH_OPS[NEGATED[op]]
+                         for op in INT_BRANCH_OPS})
+
+def all_ints(*nodes) -> bool:
+    return all(node.get_type() == "Int" for node in nodes)
+
+def tail_call(locs: list, lines: list) -> tuple:
+    # a call whose result the method returns was generated as a
+    # tail_call, which lets the callee return to our caller instead.
+    # Since a return statement doesn't end the method, it stays one
+    # only in the last statement (or the last statement of a branch
+    # of an if that is), where the return comes next, perhaps by way
+    # of jumps and labels; anywhere else it is a plain call
+    labels = {label: position for position, (label, op, _) in enumerate(lines)
+              if op is None}
+    def returns_after(position):
+        seen = set()
+        while position < len(lines) and position not in seen:
+            seen.add(position)
+            _, op, operand = lines[position]
+            if op == "jump" and operand in labels:
+                position = labels[operand]
+            elif op is None:
+                position += 1
+            else:
+                return op == "return"
+        return False
+
+    lines = [(label, "call", operand)
+             if op == "tail_call" and not returns_after(position + 1)
+             else (label, op, operand)
+             for position, (label, op, operand) in enumerate(lines)]
+    return locs, lines
+
+def assembly_text(lines: list) -> str:
+    # a class's lines (as assemble.py takes them) as assembly source,
+    # directives and labels flush left and operations indented
+    text = []
+    for line in lines:
+        first = line[0]
+        if first is not None and first.startswith("."):
+            if first == ".class":
+                text.append(f".class {line[1]}:{line[2]}")
+            elif first in (".args", ".local"):
+                text.append(f"{first} {','.join(line[1])}")
+            else:
+                text.append(" ".join(line))
+            continue
+        label, op, operand = line
+        if op is None:
+            text.append(f"{label}:")
+            continue
+        prefix = f"{label}: " if label is not None else "    "
+        suffix = f" {operand}" if operand is not None else ""
+        text.append(f"{prefix}{op}{suffix}")
+    return "".join(line + "\n" for line in text)
 
 class QuackCodeGen(ASTVisitor):
     """
@@ -9,14 +98,19 @@ class QuackCodeGen(ASTVisitor):
     may modify this codegen class.
     """
 
-    def __init__(self):
-        # instruction stream that will be dumped at the end
+    def __init__(self, tables: Tables):
+        self.tables = tables
+        # the assembly lines of each class, as tuples that the
+        # assembler takes directly (see assemble.py)
         self.instructions = {}
         self.returnargs = 0
-        self.filename = tables.mainfilename
-        self.settab = False
+        self.filename = self.tables.mainfilename
         self.label = 0
         self.is_construct = False
+        self.formals = []
+        # when set, method bodies go through the IR and its passes
+        # (quack_opt.py) instead of straight from the AST
+        self.optimizer = None
 
     # TODO: Modularize walks for ASTVisitor
     # the codegen class will always generate
@@ -25,23 +119,15 @@ class QuackCodeGen(ASTVisitor):
     def set_filename(self, name):
         self.filename = name
         
-    def add_instruction(self, instruction):
-        # add instruction to proper container based on object
-        if tables.current_object in self.instructions.keys():
-            if self.settab:
-                self.instructions[tables.current_object].append("    ")
-
-            self.instructions[tables.current_object].append(instruction)
-
-        else:
-            if self.settab:
-                self.instructions[tables.current_object] = ["    "]
-                self.instructions[tables.current_object].append(instruction)
+    def add_line(self, line: tuple):
+        # add the line to the class being generated
+        self.instructions.setdefault(self.tables.current_object, []).append(line)
 
-            else:
-                self.instructions[tables.current_object] = [instruction]
+    def add_directive(self, *fields):
+        self.add_line(fields)
 
-        self.instructions[tables.current_object].append("\n")
+    def add_instruction(self, op, operand=None):
+        self.add_line((None, op, operand))
 
     def create_label(self, prefix):
         label = "label" + prefix + str(self.label)
@@ -49,31 +135,114 @@ class QuackCodeGen(ASTVisitor):
         return label
 
     def add_label(self, label):
-        self.settab = False
-        self.add_instruction(f"{label}:")
-        self.settab = True
+        self.add_line((label, None, None))
 
     def add_jump(self, label):
-        self.add_instruction(f"jump {label}")
+        self.add_instruction("jump", label)
         
     def add_jump_if(self, label):
-        self.add_instruction(f"jump_if {label}")
+        self.add_instruction("jump_if", label)
         
     def add_jump_if_not(self, label):
-        self.add_instruction(f"jump_ifnot {label}")
+        self.add_instruction("jump_ifnot", label)
+
+    def add_call(self, method, n_args=0):
+        # the receiver was pushed first, then the arguments
+        if n_args:
+            self.add_instruction("call", f"{method} {n_args}")
+        else:
+            self.add_instruction("call", method)
+
+    def method_locals(self) -> list:
+        args = self.tables.get_arguments()
+        variables = self.tables.get_variables()
+        locs = []
+        for element in variables:
+            if element not in args:
+                locs.append(element)
+        return locs
+
+    def generate_lines(self, block) -> tuple:
+        # the code for a method body straight from the AST, as (locals
+        # it needs, lines) like the optimizer gives. It is generated in
+        # place, then taken back out to share out the frame slots
+        code = self.instructions.setdefault(self.tables.current_object, [])
+        start = len(code)
+        block.generate(self)
+        if self.is_construct:
+            self.add_instruction("load", "$")
+        self.add_instruction("return", str(self.returnargs))
+        lines = code[start:]
+        del code[start:]
+        return allocate_slots(lines, self.method_locals())
+
+    def generate_body(self, name, formals, block):
+        # the local declarations and code for the body of a method,
+        # through the optimizer if there is one and it can take it
+        lowered = None
+        if self.optimizer is not None:
+            result = "$" if self.is_construct else None
+            lowered = self.optimizer.compile_body(
+                f"{self.tables.current_object}.{name}", formals, self.method_locals(),
+                block, result, self.returnargs, self.create_label)
+        if lowered is None:
+            lowered = self.generate_lines(block)
+
+        locs, lines = tail_call(*lowered)
+        if locs != []:
+            self.add_directive(".local", locs)
+
+        # enter the function
+        self.add_instruction("enter")
+        for line in lines:
+            self.add_line(line)
+
+        self.is_construct = False
+        self.returnargs = 0
+
+    def add_compare_jump(self, node, label, negate=False) -> bool:
+        # generate a comparison and a jump to label if it holds (or,
+        # negated, if it doesn't) without making a Bool to test, when
+        # the vm can. False, with nothing generated, if it can't
+        if not isinstance(node, qm.ComparisonNode) or node.op not in NEGATED:
+            return False
+
+        op = NEGATED[node.op] if negate else node.op
+        if all_ints(node.left, node.right):
+            jump = INT_BRANCH_OPS[op]
+        elif op in IDENTITY_BRANCH_OPS and node.left.get_type() in IDENTITY_CLASSES:
+            jump = IDENTITY_BRANCH_OPS[op]
+        elif op in IDENTITY_BRANCH_OPS:
+            # equals still makes a Bool, but '!=' needn't negate it
+            node.left.generate(self)
+            node.right.generate(self)
+            self.add_call(f"{node.left.get_type()}:equals", 1)
+            jump = "jump_if" if op == "==" else "jump_ifnot"
+            self.add_instruction(jump, label)
+            return True
+        else:
+            return False
+
+        node.left.generate(self)
+        node.right.generate(self)
+        self.add_instruction(jump, label)
+        return True
+
+    def get_assembly(self) -> dict:
+        # the assembly text for each object, in the order generated
+        return {obj: assembly_text(self.instructions[obj])
+                for obj in self.instructions}
 
     def print_instructions(self, stream):
         if not stream:
-            for obj in self.instructions:
-                for instruction in self.instructions[obj]:
-                    print(instruction)
+            for text in self.get_assembly().values():
+                print(text, end="")
 
         else:
-            for obj in self.instructions:
+            for obj, text in self.get_assembly().items():
                 filename = "asm/" + obj + ".asm"
                 with open(filename, 'w') as f:
-                    for instruction in self.instructions[obj]:
-                        f.write(instruction)
+                    f.write(text)
 
 
 ### These methods are for recursively generating code
@@ -83,103 +252,70 @@ class QuackCodeGen(ASTVisitor):
         if node.classes != None:
             node.classes.generate(self)
 
-        tables.set_current_object(tables.mainfilename)
+        self.tables.set_current_object(self.tables.mainfilename)
         # create the constructor for our global program
-        self.settab = False
-        self.add_instruction(f".class {tables.mainfilename}:Obj")
-        self.add_instruction(".method $constructor")
-        self.add_instruction(".local {}".format(','.join(tables.get_variables())))
-        self.settab = True
-        self.add_instruction("enter")
+        self.add_directive(".class", self.tables.mainfilename, "Obj")
+        self.add_directive(".method", "$constructor")
+        # which returns its object like any constructor, so that
+        # return has a value to take whatever the last statement was
+        self.is_construct = True
 
         # generate the whole program
-        node.program.generate(self)
-        self.add_instruction("return 0")
+        self.generate_body("$constructor", [], node.program)
 
     def VisitSignature(self, node: qm.SignatureNode):
         # generate class name
-        self.settab = False
-        self.add_instruction(f".class {node.name}:{node.ext}")
+        self.add_directive(".class", node.name, node.ext)
 
         # generate field declarations for the class
-        if tables.get_fields(node.name) != {}:
-            for element in tables.get_fields(node.name):
-                self.add_instruction(f".field {element}")
+        if self.tables.get_fields(node.name) != {}:
+            for element in self.tables.get_fields(node.name):
+                self.add_directive(".field", element)
 
-        self.add_instruction(f".method $constructor")
+        self.add_directive(".method", "$constructor")
         self.is_construct = True
 
         # generate the formal arguments
-        if node.formals != []:
-            x = [form.ident for form in node.formals]
-            self.returnargs = len(x)
-            self.add_instruction(".args {}".format(",".join(x)))
-
-        # generate local variable declarations
-        args = tables.get_arguments()
-        variables = tables.get_variables()
-        locs = []
-        for element in variables:
-            if element not in args:
-                locs.append(element)
+        self.formals = [form.ident for form in node.formals]
+        if self.formals != []:
+            self.returnargs = len(self.formals)
+            self.add_directive(".args", self.formals)
 
-        if locs != []:
-            self.add_instruction(".local {}".format(','.join(locs)))
-            
-        self.settab = True
+        # local variable declarations come with the body
 
     def VisitConstruct(self, node: qm.ConstructNode):
-        self.add_instruction(f"new {node.ident}")
-        self.add_instruction(f"call {node.ident}:$constructor")
+        # the new object is the receiver, so it goes below the arguments
+        self.add_instruction("new", node.ident)
+        args = flatten(node.params) if node.params is not None else []
+        for element in args:
+            element.generate(self)
+        self.add_call(f"{node.ident}:$constructor", len(args))
         
     def VisitField(self, node: qm.FieldNode):
         if node.left == "this":
-            self.add_instruction("load $")
-            self.add_instruction(f"load_field $:{node.ident}")
+            self.add_instruction("load", "$")
+            self.add_instruction("load_field", f"$:{node.ident}")
         else:
-            self.add_instruction(f"load_field {node.left.get_type()}:{node.ident}")
+            self.add_instruction("load_field", f"{node.left.get_type()}:{node.ident}")
 
     def VisitBody(self, node: qm.BodyNode):
-        self.add_instruction("enter")
         # generate constructor program
-        node.program.generate(self)
-        if self.is_construct:
-            self.add_instruction("load $")
-            self.is_construct = False
-        self.add_instruction(f"return {self.returnargs}")
-        self.returnargs = 0
+        self.generate_body("$constructor", self.formals, node.program)
 
         # generate the methods
         node.methods.generate(self)
 
     def VisitMethod(self, node: qm.MethodNode):
         # add the method name
-        self.settab = False
-        self.add_instruction(f".method {node.ident}")
+        self.add_directive(".method", node.ident)
         # add the method args
-        if node.formals != []:
-            x = [form.ident for form in node.formals]
+        x = [form.ident for form in node.formals]
+        if x != []:
             self.returnargs = len(x)
-            self.add_instruction(".args {}".format(",".join(x)))
-
-        args = tables.get_arguments()
-        variables = tables.get_variables()
-        locs = []
-        for element in variables:
-            if element not in args:
-                locs.append(element)
-
-        if locs != []:
-            self.add_instruction(".local {}".format(','.join(locs)))
-            
-        # enter the function
-        self.settab = True
-        self.add_instruction("enter")
+            self.add_directive(".args", x)
 
         # generate the block
-        node.block.generate(self)
-        self.add_instruction(f"return {self.returnargs}")
-        self.returnargs = 0
+        self.generate_body(node.ident, x, node.block)
 
     def VisitIfStmt(self, node: qm.IfStmtNode):
         # first, compare for the if node
@@ -224,62 +360,71 @@ class QuackCodeGen(ASTVisitor):
         self.add_label(end)
         
     def VisitBinary(self, node: qm.BinaryOpNode):
-        if node.op == '-':
-            self.add_instruction(f"roll 1")
-            self.add_instruction(f"call {node.get_type()}:minus")
+        if node.op in INT_BINARY_OPS and all_ints(node.left, node.right):
+            self.add_instruction(INT_BINARY_OPS[node.op])
+        elif node.op == '-':
+            self.add_call(f"{node.get_type()}:minus", 1)
         elif node.op == '/':
-            self.add_instruction(f"roll 1")
-            self.add_instruction(f"call {node.get_type()}:divide")
+            self.add_call(f"{node.get_type()}:divide", 1)
 
         elif node.op == '+':
-            self.add_instruction(f"roll 1")
-            self.add_instruction(f"call {node.get_type()}:plus")
+            self.add_call(f"{node.get_type()}:plus", 1)
 
         elif node.op == '*':
-            self.add_instruction(f"roll 1")
-            self.add_instruction(f"call {node.get_type()}:times")
+            self.add_call(f"{node.get_type()}:times", 1)
 
     def VisitUnary(self, node: qm.UnaryOpNode):
-        if node.op == '-':
-            self.add_instruction(f"call {node.get_type()}:negate")
+        if node.op == '-' and all_ints(node.child):
+            self.add_instruction("int_neg")
+        elif node.op == '-':
+            self.add_call(f"{node.get_type()}:negate")
+        elif node.op == '!':
+            self.add_instruction("bool_not")
 
     def VisitReturn(self, node: qm.ReturnStmtNode):
         node.statement.generate(self)
+        # a call whose value is returned may be a tail call (see tail_call)
+        code = self.instructions[self.tables.current_object]
+        label, op, operand = code[-1]
+        if op == "call":
+            code[-1] = (label, "tail_call", operand)
         
     def VisitAssignment(self, node: qm.AssignmentNode):
         if isinstance(node.left, qm.VariableNode):
-            node.left.generate(self)
             node.right.generate(self)
-            self.add_instruction(f"store {node.left.var}")
+            self.add_instruction("store", node.left.var)
         else:
             node.right.generate(self)
-            self.add_instruction(f"load $")
-            self.add_instruction(f"store_field $:{node.left.ident}")
+            self.add_instruction("load", "$")
+            self.add_instruction("store_field", f"$:{node.left.ident}")
 
     def VisitComparison(self, node: qm.ComparisonNode):
-        if node.op == '==':
-            self.add_instruction(f"call {node.left.get_type()}:equals")
+        if node.op in INT_COMPARE_OPS and all_ints(node.left, node.right):
+            # the operands are in order on the stack, so no inverting
+            self.add_instruction(INT_COMPARE_OPS[node.op])
+            if node.op == '!=':
+                self.add_instruction("bool_not")
+
+        elif node.op == '==':
+            self.add_call(f"{node.left.get_type()}:equals", 1)
 
         elif node.op == '!=':
-            self.add_instruction(f"call {node.left.get_type()}:equals")
-            self.add_instruction(f"call Bool:negate")
-
-        # since the machine is stack-oriented, we can either roll the 2 values
-        # into their proper place for comparison, or we can just invert their
-        # boolean operations. Since 1 > 2 will have 2 as the reciever object
-        # on the stack, it will actually perform 2 > 1 if we do not also
-        # invert the operation
+            self.add_call(f"{node.left.get_type()}:equals", 1)
+            self.add_instruction("bool_not")
+
+        # the left operand was pushed first, so it is the receiver
+        # and 1 > 2 calls 1.greater(2)
         elif node.op == ">":
-            self.add_instruction(f"call {node.left.get_type()}:less")
+            self.add_call(f"{node.left.get_type()}:greater", 1)
 
         elif node.op == ">=":
-            self.add_instruction(f"call {node.left.get_type()}:less_eq")
+            self.add_call(f"{node.left.get_type()}:greater_eq", 1)
             
         elif node.op == "<":
-            self.add_instruction(f"call {node.left.get_type()}:greater")
+            self.add_call(f"{node.left.get_type()}:less", 1)
 
         elif node.op == "<=":
-            self.add_instruction(f"call {node.left.get_type()}:greater_eq")
+            self.add_call(f"{node.left.get_type()}:less_eq", 1)
 
         elif node.op == "||":
             node.c_eval(self)
@@ -288,14 +433,9 @@ class QuackCodeGen(ASTVisitor):
         typ = node.callee.get_type()
         func = node.function
 
-        # check arguments and roll properly so that the object is on the top
-        # of the stack.
-        if tables.get_parameters(typ, func) == []:
-            self.add_instruction(f"call {node.callee.get_type()}:{node.function}")
-
-        else:
-            self.add_instruction(f"roll {len(tables.get_parameters(typ, func))}")
-            self.add_instruction(f"call {node.callee.get_type()}:{node.function}")
+        # the callee was pushed before its arguments, where the
+        # method expects it
+        self.add_call(f"{typ}:{func}", len(self.tables.get_parameters(typ, func)))
 
     def VisitUnused(self, node: qm.UnusedStmtNode):
         # an unused stmt just needs to pop an item off
@@ -305,18 +445,16 @@ class QuackCodeGen(ASTVisitor):
         pass
 
     def VisitVar(self, node: qm.VariableNode):
-        self.add_instruction(f"load {node.var}")
+        self.add_instruction("load", node.var)
 
     def VisitString(self, node: qm.StringLiteralNode):
-        self.add_instruction(f"const {node.val}")
+        self.add_instruction("const", str(node.val))
         
     def VisitInt(self, node: qm.IntLiteralNode):
-        self.add_instruction(f"const {node.val}")
+        self.add_instruction("const", str(node.val))
 
     def VisitBool(self, node: qm.BooleanLiteralNode):
-        self.add_instruction(f"const {node.val}")
+        self.add_instruction("const", str(node.val))
 
     def VisitNothing(self, node: qm.NothingLiteralNode):
-        self.add_instruction(f"const {node.val}")
-
-codegen = QuackCodeGen()
+        self.add_instruction("const", str(node.val))
@@ -0,0 +1,208 @@
+import quack_middle as qm
+from quack_visitor import ASTVisitor
+
+# Ints are C ints in the vm, so we only fold what fits in one
+INT_MIN = -2**31 + 1
+INT_MAX = 2**31 - 1
+
+def int_arith(op: str, left: int, right: int):
+    if op == '+':
+        return left + right
+    elif op == '-':
+        return left - right
+    elif op == '*':
+        return left * right
+    elif op == '/':
+        if right == 0:
+            # leave it for the vm to fail on
+            return None
+        # C division truncates toward zero
+        quotient = abs(left) // abs(right)
+        return quotient if (left < 0) == (right < 0) else -quotient
+    return None
+
+def compare(op: str, left, right):
+    if op == "==":
+        return left == right
+    elif op == "!=":
+        return left != right
+    elif op == "<":
+        return left < right
+    elif op == "<=":
+        return left <= right
+    elif op == ">":
+        return left > right
+    elif op == ">=":
+        return left >= right
+    return None
+
+class QuackConstantFolder(ASTVisitor):
+    """
+    Evaluates the builtin Int, String and Bool operations at compile
+    time when their operands are literals, so that (1 + 2) * 3 becomes
+    const 9 instead of two method calls, and prunes if and while
+    statements whose condition folds to true or false. Each fold
+    method returns the node that should replace the one visited.
+    Runs after type checking, so literals are all it has to go on.
+    """
+
+    def __init__(self):
+        # how much we did, for the curious
+        self.folded = 0
+        self.pruned = 0
+
+    # helpers to read and make literals. A negative Int can't be
+    # an operand of const, so it stays a negated literal
+    def int_value(self, node):
+        if isinstance(node, qm.IntLiteralNode) and str(node.val).isdigit():
+            return int(node.val)
+        if isinstance(node, qm.UnaryOpNode) and node.op == '-':
+            value = self.int_value(node.child)
+            if value is not None:
+                return -value
+        return None
+
+    def int_node(self, value: int):
+        if value >= 0:
+            return qm.IntLiteralNode(str(value))
+        negated = qm.UnaryOpNode('-', qm.IntLiteralNode(str(-value)))
+        negated.typ = "Int"
+        return negated
+
+    def bool_value(self, node):
+        if isinstance(node, qm.BooleanLiteralNode):
+            return node.val == "true"
+        return None
+
+    def bool_node(self, value: bool):
+        self.folded += 1
+        return qm.BooleanLiteralNode("true" if value else "false")
+
+    def string_value(self, node):
+        # the text the vm will see, escapes and all
+        if isinstance(node, qm.StringLiteralNode):
+            return node.val[1:-1].encode("utf-8").decode("unicode_escape")
+        return None
+
+    def is_condition(self, node):
+        # nodes that know how to branch on themselves (c_eval)
+        return isinstance(node, (qm.ComparisonNode, qm.UnaryOpNode,
+                                 qm.BooleanLiteralNode))
+
+### These methods fold the AST nodes bottom-up
+    def VisitProgram(self, node: qm.ProgramNode):
+        node.program = node.program.fold(self)
+        node.final = node.final.fold(self)
+        # drop statements that were pruned away entirely
+        if isinstance(node.program, qm.EmptyStmtNode):
+            return node.final
+        if isinstance(node.final, qm.EmptyStmtNode):
+            return node.program
+        return node
+
+    def VisitUnary(self, node: qm.UnaryOpNode):
+        node.child = node.child.fold(self)
+        if node.op == '!':
+            value = self.bool_value(node.child)
+            if value is not None:
+                return self.bool_node(not value)
+
+        elif node.op == '-':
+            value = self.int_value(node.child)
+            if value is not None and isinstance(node.child, qm.UnaryOpNode):
+                # - - 5
+                self.folded += 1
+                return self.int_node(-value)
+
+        return node
+
+    def VisitBinary(self, node: qm.BinaryOpNode):
+        node.left = node.left.fold(self)
+        node.right = node.right.fold(self)
+        left = self.int_value(node.left)
+        right = self.int_value(node.right)
+        if left is not None and right is not None:
+            value = int_arith(node.op, left, right)
+            if value is not None and INT_MIN <= value <= INT_MAX:
+                self.folded += 1
+                return self.int_node(value)
+
+        elif node.op == '+' and isinstance(node.left, qm.StringLiteralNode) \
+                and isinstance(node.right, qm.StringLiteralNode):
+            # splice the literals, leaving their escapes as they are
+            self.folded += 1
+            return qm.StringLiteralNode(node.left.val[:-1] + node.right.val[1:])
+
+        return node
+
+    def VisitComparison(self, node: qm.ComparisonNode):
+        node.left = node.left.fold(self)
+        node.right = node.right.fold(self)
+        if node.op in ("&&", "||"):
+            return self.fold_logical(node)
+
+        left = self.int_value(node.left)
+        right = self.int_value(node.right)
+        if left is not None and right is not None:
+            return self.bool_node(compare(node.op, left, right))
+
+        # only equality for strings and bools; String:less is
+        # really less-or-equal, and Bool has no order at all
+        if node.op not in ("==", "!="):
+            return node
+        for value_of in (self.string_value, self.bool_value):
+            left = value_of(node.left)
+            right = value_of(node.right)
+            if left is not None and right is not None:
+                return self.bool_node(compare(node.op, left, right))
+
+        return node
+
+    def fold_logical(self, node: qm.ComparisonNode):
+        # 'and' and 'or' short-circuit, so a literal on the left
+        # decides whether the right is evaluated at all, while one
+        # on the right can only be dropped if it doesn't decide
+        deciding = node.op == "||"
+        left = self.bool_value(node.left)
+        right = self.bool_value(node.right)
+        if left is not None:
+            if left == deciding:
+                return self.bool_node(left)
+            if right is not None:
+                return self.bool_node(right)
+            if self.is_condition(node.right):
+                self.folded += 1
+                return node.right
+
+        elif right is not None and right != deciding \
+                and self.is_condition(node.left):
+            self.folded += 1
+            return node.left
+
+        return node
+
+    def VisitIfStmt(self, node: qm.IfStmtNode):
+        node.condition = node.condition.fold(self)
+        node.block = node.block.fold(self)
+        if node.otherwise is not None:
+            node.otherwise = node.otherwise.fold(self)
+
+        value = self.bool_value(node.condition)
+        if value is None:
+            return node
+
+        self.pruned += 1
+        if value:
+            return node.block
+        if node.otherwise is not None:
+            return node.otherwise
+        return qm.EmptyStmtNode()
+
+    def VisitWhile(self, node: qm.WhileNode):
+        node.condition = node.condition.fold(self)
+        node.block = node.block.fold(self)
+        # a loop that never runs; 'while true' stays a loop
+        if self.bool_value(node.condition) is False:
+            self.pruned += 1
+            return qm.EmptyStmtNode()
+        return node
@@ -1,38 +1,163 @@
-from lark import Lark
-from quack_grammar import quack_grammar
-from quack_middle import ASTBuilder, ASTVisitor
-from quack_types import typechecker
-from quack_checks import initialization_check
-from quack_codegen import codegen
-from quack_tables import tables
-
-import argparse
-
-parser = argparse.ArgumentParser(description=
-                                 'Compile quack into assembly')
-
-parser.add_argument('-i', '--input', default=None,
-                    help="Specify input file name, otherwise will take lines from standard input.")
-parser.add_argument('-o', '--output', default=None,
-                    help="Specify output file name, otherwise will print to standard output.")
-parser.add_argument('-c', '--class', default=None,
-                    help="Specify class name. Must match <class>.qk")
-
-args = parser.parse_args()
-
-quack_parser = Lark(quack_grammar, parser='lalr')
+import sys
+import threading
+from quack_lalr import new_parser
+from quack_middle import ASTBuilder, ASTVisitor, count_nodes
+from quack_passes import CompilerPass, PassManager, write_stats
+from quack_resolve import QuackResolver
+from quack_types import QuackTypeChecker
+from quack_checks import QuackInitializationCheck
+from quack_fold import QuackConstantFolder
+from quack_codegen import QuackCodeGen
+from quack_opt import QuackOptimizer, PASSES
+from quack_tables import Tables
+
+# Each thread keeps a parser that builds the AST as it parses, with
+# an ASTBuilder as its inline transformer, so no parse tree is made.
+# Making a parser costs about as much as compiling a small program,
+# so it is kept, and its builder given each compilation's tables
+parsers = threading.local()
+
+def ast_parser() -> tuple:
+    if not hasattr(parsers, "parser"):
+        parsers.builder = ASTBuilder()
+        parsers.parser = new_parser(transformer=parsers.builder)
+    return parsers.builder, parsers.parser
+
+def cli():
+    # argparse is only needed when run from the command line
+    import argparse
+
+    parser = argparse.ArgumentParser(description=
+                                     'Compile quack into assembly')
+
+    parser.add_argument('-i', '--input', default=None,
+                        help="Specify input file name, otherwise will take lines from standard input.")
+    parser.add_argument('-o', '--output', default=None,
+                        help="Specify output file name, otherwise will print to standard output.")
+    parser.add_argument('-c', '--class', default=None,
+                        help="Specify class name. Must match <class>.qk")
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help="Compile methods through the SSA optimizer with every pass")
+    parser.add_argument('--passes', default=None,
+                        help="Compile methods through the SSA optimizer with only these "
+                        f"comma-separated passes ({','.join(PASSES)})")
+    parser.add_argument('--opt-report', action='store_true',
+                        help="Print what the optimizer did to each method on stderr")
+    parser.add_argument('--type-report', action='store_true',
+                        help="Print how much work type inference took on stderr")
+    parser.add_argument('--time-passes', action='store_true',
+                        help="Print the time, peak memory, AST nodes and instructions "
+                        "of each compiler pass on stderr")
+    parser.add_argument('--stats', default=None,
+                        help="Write the measurements of --time-passes to this JSON file")
+    parser.add_argument('--skip-passes', default="",
+                        help="Leave out these comma-separated compiler passes "
+                        f"({','.join(compiler_pass.name for compiler_pass in COMPILER_PASSES)})")
+    return parser.parse_args()
+
+def optimizer_passes(optimize: bool, passes: str):
+    # the passes to run from the -O and --passes options, or None
+    # to generate code straight from the AST
+    if passes is not None:
+        return [name for name in passes.split(",") if name]
+    if optimize:
+        return list(PASSES)
+    return None
+
+class Compilation():
+    '''
+    Everything compiling one program changes: its tables, checkers
+    and code generator. Nothing is shared between compilations (each
+    thread has its own parser), so one process can compile any number
+    of programs, one after another or at once.
+    The passes named in skip are left out, and with stats, the pass
+    manager measures each pass (see quack_passes.py).
+    '''
+    def __init__(self, clazz: str, passes: list = None,
+                 skip: list = (), stats: bool = False):
+        self.tables = Tables()
+        self.tables.set_main(clazz)
+        self.resolver = QuackResolver(self.tables)
+        self.initialization_check = QuackInitializationCheck()
+        self.typechecker = QuackTypeChecker(self.tables)
+        self.constant_folder = QuackConstantFolder()
+        self.codegen = QuackCodeGen(self.tables)
+        # with a list of passes, method bodies are compiled through
+        # the SSA optimizer running those passes (which may be none)
+        if passes is not None:
+            self.codegen.optimizer = QuackOptimizer(passes)
+        self.manager = PassManager(COMPILER_PASSES, skip, stats)
+        self.source = ""
+        self.ast = None
+
+    def compile(self, s: str) -> dict:
+        # compile a whole quack source string and return the assembly
+        # lines for each class (as assemble.translate_lines takes them),
+        # user classes first and the main class last
+        self.source = s
+        self.manager.run(self)
+        return self.codegen.instructions
+
+    def parse(self):
+        builder, parser = ast_parser()
+        builder.tables = self.tables
+        self.ast = parser.parse(self.source)
+
+    def resolve(self):
+        # bind each name to its symbol in the tables, once
+        self.ast.resolve(self.resolver)
+
+    def check_init(self):
+        # check for variable inits before uses
+        self.ast.check_init(self.initialization_check, set())
+
+    def check_types(self):
+        # infer and check types, checking again only the statements
+        # that read a variable whose type changed
+        self.typechecker.check_program(self.ast)
+
+    def fold(self):
+        # evaluate builtin operations on literals and prune
+        # branches whose conditions are then constant
+        self.ast = self.ast.fold(self.constant_folder)
+
+    def generate(self):
+        # Back-end optimizations and godegen
+        self.ast.generate(self.codegen)
+
+    def node_count(self) -> int:
+        return 0 if self.ast is None else count_nodes(self.ast)
+
+    def instruction_count(self) -> int:
+        return sum(len(lines) for lines in self.codegen.instructions.values())
+
+COMPILER_PASSES = [
+    CompilerPass("parse", Compilation.parse),
+    CompilerPass("resolve", Compilation.resolve, ["parse"]),
+    CompilerPass("check_init", Compilation.check_init, ["parse"]),
+    CompilerPass("check_types", Compilation.check_types, ["resolve"]),
+    CompilerPass("fold", Compilation.fold, ["check_types"]),
+    CompilerPass("generate", Compilation.generate, ["check_types"]),
+]
+
+def skip_passes(names: str) -> list:
+    # the compiler passes to leave out, from the --skip-passes option
+    return [name for name in names.split(",") if name]
+
+def compile_program(s: str, clazz: str, passes: list = None) -> dict:
+    # the assembly lines of each class of a program, compiled in a
+    # compilation of its own
+    return Compilation(clazz, passes).compile(s)
 
 def main():
 
     # configure command line args
-    arguments = vars(args)
+    arguments = vars(cli())
     f_input: str = arguments["input"]
     f_output = arguments["output"]
     clazz = arguments["class"]
     s = ""
 
-    tables.set_main(clazz)
-
     # if there exists an inputfilename
     if (f_input):
         with open(f_input, 'r', encoding='utf-8') as f:
@@ -46,29 +171,30 @@ def main():
             except EOFError:
                 break
 
-    quack = quack_parser.parse(s)
-
-    # Middle-end basic optimizations
-    ast = ASTBuilder().transform(quack)
-
-    # check for variable inits before uses
-    ast.check_init(initialization_check, set())
-    
-    # run the typechecker and more middle end optimizations
-    ast.check_type(typechecker)
-    while typechecker.made_changes():
-        typechecker.reset()
-        ast.check_type(typechecker)
-
-    # Back-end optimizations and godegen
-    ast.generate(codegen)
+    measure = arguments["time_passes"] or arguments["stats"] is not None
+    compilation = Compilation(clazz, optimizer_passes(arguments["optimize"],
+                                                      arguments["passes"]),
+                              skip_passes(arguments["skip_passes"]), measure)
+    compilation.compile(s)
+    codegen = compilation.codegen
+    if arguments["opt_report"] and codegen.optimizer is not None:
+        for line in codegen.optimizer.report:
+            print(line, file=sys.stderr)
+    if arguments["type_report"]:
+        print(compilation.typechecker.report(), file=sys.stderr)
+    if arguments["time_passes"]:
+        for line in compilation.manager.report():
+            print(line, file=sys.stderr)
+    if arguments["stats"] is not None:
+        write_stats(arguments["stats"], [{"program": f_input or clazz,
+                                          "passes": compilation.manager.stats}])
 
     # print the code to corresponding output
     codegen.print_instructions(f_output)
-        
+
     # write to temporary file to assemble class files properly
     with open("_QK_TMP_CLASSES_.txt", "w", encoding='utf-8') as f:
-        for element in tables.using_methods:
+        for element in compilation.tables.using_methods:
             f.write(element)
             f.write("\n")
 
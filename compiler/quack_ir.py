@@ -0,0 +1,503 @@
+import quack_middle as qm
+
+###
+# A small three-address IR for the body of one method, so that the
+# optimizer (quack_opt.py) has control flow and def-use chains to
+# work with instead of a tree. Each method becomes a Function: a list
+# of Blocks, each a list of Instrs ending in a jump, branch or return.
+# The IR is built from the AST in ordinary form, over the method's
+# variables and single-use temporaries (%1, %2, ...), then put into
+# SSA form (x.1, x.2, ... for the versions of x). quack_lower.py
+# takes it back out of SSA and down to stack machine instructions.
+###
+
+class Unsupported(Exception):
+    '''
+    Raised for code the IR doesn't model yet; the code generator
+    falls back to generating that method straight from the AST
+    '''
+    pass
+
+class Instr():
+    '''
+    One IR operation. dst is the name it defines, if any, args are
+    the names it uses, and attr is what the operation needs besides:
+
+        const        attr is the literal text, e.g. 42, "hi", true
+        param        attr is the argument name (defines it at entry)
+        copy         dst = args[0]
+        call         attr is Class:method, args are receiver, then arguments
+        new          attr is the class, args are the constructor arguments
+        load_field   attr is $:field, args[0] is the object
+        store_field  attr is $:field, args are value, object
+        phi          attr is the variable, args[i] comes from block.preds[i]
+
+    and the terminators, whose targets are blocks:
+
+        jump         targets[0]
+        branch       args[0] is the condition, targets are true, false
+        return       args[0] is the result
+    '''
+
+    def __init__(self, op: str, dst: str = None, args: list = None,
+                 attr: str = None, targets: list = None):
+        self.op = op
+        self.dst = dst
+        self.args = args or []
+        self.attr = attr
+        self.targets = targets or []
+
+    def __str__(self):
+        text = self.op
+        if self.attr is not None:
+            text += f" {self.attr}"
+        if self.args:
+            text += " " + ", ".join(self.args)
+        if self.targets:
+            text += " -> " + ", ".join(block.name for block in self.targets)
+        if self.dst is not None:
+            text = f"{self.dst} = {text}"
+        return text
+
+class Block():
+    def __init__(self, name: str):
+        self.name = name
+        self.instrs = []
+        self.term = None
+        self.preds = []
+
+    def succs(self):
+        return self.term.targets if self.term is not None else []
+
+    def phis(self):
+        return [instr for instr in self.instrs if instr.op == "phi"]
+
+class Function():
+    def __init__(self, name: str, args: list, local_vars: list):
+        self.name = name
+        self.args = list(args)
+        self.locals = [var for var in local_vars if var not in args]
+        self.variables = set(self.args) | set(self.locals)
+        self.blocks = []
+        self.temps = 0
+        # temporaries that would do best in the local of some variable
+        self.hints = {}
+
+    def new_block(self) -> Block:
+        block = Block(f"b{len(self.blocks)}")
+        self.blocks.append(block)
+        return block
+
+    def new_temp(self) -> str:
+        self.temps += 1
+        return f"%{self.temps}"
+
+    def entry(self) -> Block:
+        return self.blocks[0]
+
+    def instructions(self):
+        # every instruction and terminator, in block order
+        for block in self.blocks:
+            for instr in block.instrs:
+                yield block, instr
+            yield block, block.term
+
+    def __str__(self):
+        lines = [f"function {self.name}"]
+        for block in self.blocks:
+            preds = ", ".join(pred.name for pred in block.preds)
+            lines.append(f"  {block.name}:    # preds {preds}")
+            for instr in block.instrs:
+                lines.append(f"    {instr}")
+            lines.append(f"    {block.term}")
+        return "\n".join(lines)
+
+def origin(name: str):
+    # the variable an SSA name is a version of, None for temporaries
+    if name.startswith("%") or name == "$":
+        return None
+    return name.split(".")[0]
+
+###
+# Building the IR from the AST. The method names for calls come
+# from the node types, exactly as QuackCodeGen picks them, so the
+# lowered code calls the same methods.
+###
+
+# Binary operators and comparisons, as QuackCodeGen.VisitBinary and
+# VisitComparison translate them. A comparison calls the method on
+# the right operand, which is on top of the stack
+ARITH_METHODS = {'+': "plus", '-': "minus", '*': "times", '/': "divide"}
+COMPARE_METHODS = {"==": "equals", "!=": "equals", ">": "greater",
+                   ">=": "greater_eq", "<": "less", "<=": "less_eq"}
+
+def flatten(params) -> list:
+    # actual arguments come out of the parser as nested lists
+    if not isinstance(params, list):
+        return [params]
+    return [param for element in params for param in flatten(element)]
+
+class IRBuilder():
+    def __init__(self, fn: Function):
+        self.fn = fn
+        self.block = fn.new_block()
+        # define every variable at entry, so each use has a reaching
+        # definition: arguments are passed in, locals start as nothing
+        for arg in fn.args:
+            self.emit(Instr("param", arg, attr=arg))
+        for var in fn.locals:
+            self.emit(Instr("const", var, attr="nothing"))
+
+    def emit(self, instr: Instr) -> str:
+        self.block.instrs.append(instr)
+        return instr.dst
+
+    def temp(self, op: str, args: list = None, attr: str = None) -> str:
+        return self.emit(Instr(op, self.fn.new_temp(), args, attr))
+
+    def terminate(self, instr: Instr):
+        self.block.term = instr
+
+    def start(self, block: Block):
+        self.block = block
+
+    def jump(self, target: Block):
+        self.terminate(Instr("jump", targets=[target]))
+
+    def body(self, node, result: str):
+        # the statements of a method, then return. A 'return' must be
+        # the last statement: QuackCodeGen only pushes its value and
+        # carries on, so anywhere else it doesn't mean what it says
+        while isinstance(node, qm.BlockNode):
+            node = node.statements
+        if result == "$":
+            # a constructor always returns the object
+            self.stmt(node)
+            value = "$"
+        elif isinstance(node, qm.ReturnStmtNode):
+            value = self.value(node.statement)
+        elif isinstance(node, qm.ProgramNode) \
+                and isinstance(node.final, qm.ReturnStmtNode):
+            self.stmt(node.program)
+            value = self.value(node.final.statement)
+        else:
+            self.stmt(node)
+            value = self.temp("const", attr="nothing")
+        self.terminate(Instr("return", args=[value]))
+
+    ### statements
+    def stmt(self, node):
+        if isinstance(node, (qm.ProgramNode, qm.MethodsNode)):
+            self.stmt(node.program if isinstance(node, qm.ProgramNode)
+                      else node.methods)
+            self.stmt(node.final)
+        elif isinstance(node, qm.BlockNode):
+            self.stmt(node.statements)
+        elif isinstance(node, qm.EmptyStmtNode):
+            pass
+        elif isinstance(node, qm.AssignmentNode):
+            value = self.value(node.right)
+            if isinstance(node.left, qm.VariableNode):
+                if node.left.var not in self.fn.variables:
+                    raise Unsupported(f"assignment to {node.left.var}")
+                self.emit(Instr("copy", node.left.var, [value]))
+            elif isinstance(node.left, qm.FieldNode) and node.left.left == "this":
+                self.emit(Instr("store_field", args=[value, "$"],
+                                attr=f"$:{node.left.ident}"))
+            else:
+                raise Unsupported("assignment target")
+        elif isinstance(node, qm.UnusedStmtNode):
+            self.value(node.statement)
+        elif isinstance(node, qm.IfStmtNode):
+            then_block = self.fn.new_block()
+            join = self.fn.new_block()
+            else_block = join
+            if node.otherwise is not None:
+                else_block = self.fn.new_block()
+            self.cond(node.condition, then_block, else_block)
+            self.start(then_block)
+            self.stmt(node.block)
+            self.jump(join)
+            if node.otherwise is not None:
+                self.start(else_block)
+                self.stmt(node.otherwise)
+                self.jump(join)
+            self.start(join)
+        elif isinstance(node, qm.WhileNode):
+            header = self.fn.new_block()
+            body = self.fn.new_block()
+            exit = self.fn.new_block()
+            self.jump(header)
+            self.start(header)
+            self.cond(node.condition, body, exit)
+            self.start(body)
+            self.stmt(node.block)
+            self.jump(header)
+            self.start(exit)
+        else:
+            raise Unsupported(type(node).__name__)
+
+    ### conditions, which branch instead of making a Bool
+    def cond(self, node, if_true: Block, if_false: Block):
+        if isinstance(node, qm.ComparisonNode) and node.op in ("&&", "||"):
+            middle = self.fn.new_block()
+            if node.op == "&&":
+                self.cond(node.left, middle, if_false)
+            else:
+                self.cond(node.left, if_true, middle)
+            self.start(middle)
+            self.cond(node.right, if_true, if_false)
+        elif isinstance(node, qm.UnaryOpNode) and node.op == '!':
+            self.cond(node.child, if_false, if_true)
+        elif isinstance(node, qm.BooleanLiteralNode):
+            self.jump(if_true if node.val == "true" else if_false)
+        else:
+            self.terminate(Instr("branch", args=[self.value(node)],
+                                 targets=[if_true, if_false]))
+
+    ### expressions; each returns the name holding its value
+    def value(self, node) -> str:
+        if isinstance(node, (qm.IntLiteralNode, qm.StringLiteralNode,
+                             qm.BooleanLiteralNode, qm.NothingLiteralNode)):
+            return self.temp("const", attr=str(node.val))
+        if isinstance(node, qm.VariableNode):
+            if node.var not in self.fn.variables:
+                raise Unsupported(f"variable {node.var}")
+            return node.var
+        if isinstance(node, qm.FieldNode):
+            if node.left != "this":
+                raise Unsupported("field of another object")
+            return self.temp("load_field", ["$"], f"$:{node.ident}")
+        if isinstance(node, qm.BinaryOpNode):
+            if node.op not in ARITH_METHODS:
+                raise Unsupported(f"operator {node.op}")
+            left = self.value(node.left)
+            right = self.value(node.right)
+            return self.temp("call", [left, right],
+                             f"{node.get_type()}:{ARITH_METHODS[node.op]}")
+        if isinstance(node, qm.UnaryOpNode):
+            if node.op != '-':
+                raise Unsupported("'not' as a value")
+            child = self.value(node.child)
+            return self.temp("call", [child], f"{node.get_type()}:negate")
+        if isinstance(node, qm.ComparisonNode):
+            if node.op not in COMPARE_METHODS:
+                raise Unsupported("'and'/'or' as a value")
+            left = self.value(node.left)
+            right = self.value(node.right)
+            method = f"{node.left.get_type()}:{COMPARE_METHODS[node.op]}"
+            result = self.temp("call", [left, right], method)
+            if node.op == "!=":
+                result = self.temp("call", [result], "Bool:negate")
+            return result
+        if isinstance(node, qm.CallNode):
+            receiver = self.value(node.callee)
+            args = [self.value(param) for param in flatten(node.params)]
+            return self.temp("call", [receiver] + args,
+                             f"{node.callee.get_type()}:{node.function}")
+        if isinstance(node, qm.ConstructNode):
+            if node.params is None:
+                raise Unsupported("constructor without arguments")
+            args = [self.value(param) for param in flatten(node.params)]
+            return self.temp("new", args, node.ident)
+        raise Unsupported(type(node).__name__)
+
+def build(name: str, args: list, local_vars: list, node, result: str) -> Function:
+    '''
+    The IR for a method body; result is "$" for a constructor,
+    which returns the new object, and None otherwise
+    '''
+    fn = Function(name, args, local_vars)
+    IRBuilder(fn).body(node, result)
+    cleanup(fn)
+    return fn
+
+###
+# Control flow graph upkeep
+###
+
+def cleanup(fn: Function):
+    '''
+    Recompute predecessors and drop blocks that can't be reached.
+    A branch to the same block both ways becomes a jump.
+    '''
+    for block in fn.blocks:
+        term = block.term
+        if term.op == "branch" and term.targets[0] is term.targets[1]:
+            block.term = Instr("jump", targets=[term.targets[0]])
+
+    reachable = set()
+    stack = [fn.entry()]
+    while stack:
+        block = stack.pop()
+        if block in reachable:
+            continue
+        reachable.add(block)
+        stack.extend(block.succs())
+
+    old_preds = {block: block.preds for block in fn.blocks}
+    fn.blocks = [block for block in fn.blocks if block in reachable]
+    for block in fn.blocks:
+        block.preds = []
+    for block in fn.blocks:
+        for succ in block.succs():
+            succ.preds.append(block)
+
+    # phis keep the arguments of the predecessors that remain
+    for block in fn.blocks:
+        for phi in block.phis():
+            incoming = dict(zip(old_preds[block], phi.args))
+            phi.args = [incoming[pred] for pred in block.preds]
+
+def reverse_postorder(fn: Function) -> list:
+    order = []
+    visited = set()
+    # iterative depth-first search, so deep nesting can't overflow
+    stack = [(fn.entry(), iter(fn.entry().succs()))]
+    visited.add(fn.entry())
+    while stack:
+        block, succs = stack[-1]
+        for succ in succs:
+            if succ not in visited:
+                visited.add(succ)
+                stack.append((succ, iter(succ.succs())))
+                break
+        else:
+            order.append(block)
+            stack.pop()
+    order.reverse()
+    return order
+
+def dominators(fn: Function) -> dict:
+    '''
+    Immediate dominator of each block (the entry's is itself), by
+    Cooper, Harvey and Kennedy's iterative algorithm
+    '''
+    order = reverse_postorder(fn)
+    index = {block: i for i, block in enumerate(order)}
+    idom = {fn.entry(): fn.entry()}
+
+    def intersect(a, b):
+        while a is not b:
+            while index[a] > index[b]:
+                a = idom[a]
+            while index[b] > index[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for block in order[1:]:
+            preds = [pred for pred in block.preds if pred in idom]
+            new_idom = preds[0]
+            for pred in preds[1:]:
+                new_idom = intersect(pred, new_idom)
+            if idom.get(block) is not new_idom:
+                idom[block] = new_idom
+                changed = True
+    return idom
+
+def dominates(idom: dict, a: Block, b: Block) -> bool:
+    while True:
+        if a is b:
+            return True
+        if idom[b] is b:
+            return False
+        b = idom[b]
+
+def dominance_frontiers(fn: Function, idom: dict) -> dict:
+    frontiers = {block: set() for block in fn.blocks}
+    for block in fn.blocks:
+        if len(block.preds) < 2:
+            continue
+        for pred in block.preds:
+            runner = pred
+            while runner is not idom[block]:
+                frontiers[runner].add(block)
+                runner = idom[runner]
+    return frontiers
+
+###
+# SSA construction (Cytron et al.), with phis only for variables
+# that are live across blocks
+###
+
+def to_ssa(fn: Function):
+    idom = dominators(fn)
+    frontiers = dominance_frontiers(fn, idom)
+
+    # variables used in some block before being defined there
+    crossing = set()
+    def_blocks = {var: set() for var in fn.variables}
+    for block in fn.blocks:
+        defined = set()
+        for instr in block.instrs + [block.term]:
+            for arg in instr.args:
+                if arg in fn.variables and arg not in defined:
+                    crossing.add(arg)
+            if instr.dst in fn.variables:
+                defined.add(instr.dst)
+                def_blocks[instr.dst].add(block)
+
+    for var in sorted(crossing):
+        has_phi = set()
+        work = list(def_blocks[var])
+        while work:
+            block = work.pop()
+            for frontier in frontiers[block]:
+                if frontier in has_phi:
+                    continue
+                has_phi.add(frontier)
+                frontier.instrs.insert(0, Instr("phi", var, [var] * len(frontier.preds),
+                                                attr=var))
+                if frontier not in def_blocks[var]:
+                    work.append(frontier)
+
+    children = {block: [] for block in fn.blocks}
+    for block in fn.blocks:
+        if idom[block] is not block:
+            children[idom[block]].append(block)
+
+    versions = {var: 0 for var in fn.variables}
+    stacks = {var: [] for var in fn.variables}
+
+    def rename_block(block):
+        pushed = []
+        for instr in block.instrs + [block.term]:
+            if instr.op != "phi":
+                instr.args = [stacks[arg][-1] if arg in fn.variables else arg
+                              for arg in instr.args]
+            if instr.dst in fn.variables:
+                var = instr.dst
+                versions[var] += 1
+                instr.dst = f"{var}.{versions[var]}"
+                stacks[var].append(instr.dst)
+                pushed.append(var)
+        for succ in block.succs():
+            position = succ.preds.index(block)
+            for phi in succ.phis():
+                phi.args[position] = stacks[phi.attr][-1]
+        return pushed
+
+    # walk the dominator tree without recursion
+    work = [(fn.entry(), False)]
+    pushed = {}
+    while work:
+        block, done = work.pop()
+        if done:
+            for var in pushed.pop(block):
+                stacks[var].pop()
+            continue
+        pushed[block] = rename_block(block)
+        work.append((block, True))
+        for child in reversed(children[block]):
+            work.append((child, False))
+
+def uses(fn: Function) -> dict:
+    # name -> the instructions that use it
+    users = {}
+    for _, instr in fn.instructions():
+        for arg in instr.args:
+            users.setdefault(arg, []).append(instr)
+    return users
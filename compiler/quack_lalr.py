@@ -0,0 +1,74 @@
+"""The Quack LALR parser, generated ahead of time.
+
+Building the LALR tables from quack_grammar costs more than parsing a
+small program, and so does importing lark.  Instead we generate a
+standalone parser module (quack_standalone.py, next to this file) with
+lark's standalone tool and import that.  The module records a hash of
+the grammar it was built from; when the grammar changes it is rebuilt
+on the next import, which is the only time lark itself is needed.
+
+Run this file directly to regenerate the parser by hand.
+
+The Transformer and v_args exported here come from the standalone
+module, because a lark.Transformer does not recognize the standalone
+module's Tree class.
+"""
+import hashlib
+import importlib
+import os
+import sys
+
+from quack_grammar import quack_grammar
+
+GRAMMAR_HASH = hashlib.sha256(quack_grammar.encode("utf-8")).hexdigest()
+STANDALONE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "quack_standalone.py")
+
+
+def generate(path: str = STANDALONE):
+    # lark is only needed here, so it is imported here
+    import py_compile
+    from lark import Lark
+    from lark.tools.standalone import gen_standalone
+
+    lark_inst = Lark(quack_grammar, parser='lalr')
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        gen_standalone(lark_inst, out=f)
+        f.write(f"\nGRAMMAR_HASH = {GRAMMAR_HASH!r}\n")
+    # replace atomically, in case several compilers start at once
+    os.replace(tmp, path)
+    # byte-compile now; compiling the large tables on every import
+    # would cost most of what we saved
+    py_compile.compile(path)
+
+
+def load():
+    # import the standalone parser, rebuilding it if it is missing
+    # or was generated from a different grammar
+    try:
+        import quack_standalone
+        if getattr(quack_standalone, "GRAMMAR_HASH", None) == GRAMMAR_HASH:
+            return quack_standalone
+    except ImportError:
+        pass
+
+    generate()
+    importlib.invalidate_caches()
+    if "quack_standalone" in sys.modules:
+        return importlib.reload(sys.modules["quack_standalone"])
+    return importlib.import_module("quack_standalone")
+
+
+standalone = load()
+Transformer = standalone.Transformer
+v_args = standalone.v_args
+
+
+def new_parser(**options):
+    return standalone.Lark_StandAlone(**options)
+
+
+if __name__ == '__main__':
+    generate()
+    print(f"Generated {STANDALONE} for grammar {GRAMMAR_HASH[:12]}")
@@ -0,0 +1,266 @@
+from quack_codegen import FUSED_BRANCHES, NEGATED_BRANCHES, TYPED_METHODS
+from quack_ir import Instr, origin, reverse_postorder
+
+###
+# Taking a Function in SSA form back down to the vm's stack code.
+#
+# Phis become copies at the ends of the predecessors, edges that
+# need copies but leave a branch get blocks of their own first, and
+# each phi goes through a fresh temporary so that phis reading each
+# other's results around a loop still see the old values.
+#
+# Then every value needs a place. One used exactly once, later in
+# the block that makes it, just stays on the stack when the order
+# allows; constants are pushed again wherever they're needed; the
+# rest are stored in locals. Values that are never live at the same
+# time share a local, each preferring the variable it came from.
+###
+
+def from_ssa(fn):
+    for block in list(fn.blocks):
+        if not block.phis():
+            continue
+        for position, pred in enumerate(block.preds):
+            if len(pred.succs()) > 1:
+                edge = fn.new_block()
+                edge.term = Instr("jump", targets=[block])
+                edge.preds = [pred]
+                pred.term.targets = [edge if target is block else target
+                                     for target in pred.term.targets]
+                block.preds[position] = edge
+
+    for block in fn.blocks:
+        copies = []
+        for phi in block.phis():
+            temp = fn.new_temp()
+            fn.hints[temp] = origin(phi.dst)
+            for pred, arg in zip(block.preds, phi.args):
+                pred.instrs.append(Instr("copy", temp, [arg]))
+            copies.append(Instr("copy", phi.dst, [temp]))
+        block.instrs = copies + [instr for instr in block.instrs if instr.op != "phi"]
+
+def typed_opcode(instr):
+    # the opcode of its own for a call to a builtin Int or Bool
+    # operation, if it has one. The type checker has made sure the
+    # receiver and argument of an Int method are both Int
+    if instr.op != "call" or instr.attr not in TYPED_METHODS:
+        return None
+    opcode = TYPED_METHODS[instr.attr]
+    arity = 1 if opcode in ("int_neg", "bool_not") else 2
+    return opcode if len(instr.args) == arity else None
+
+def call_operand(method: str, n_args: int) -> str:
+    # as QuackCodeGen.add_call writes it
+    return f"{method} {n_args}" if n_args else method
+
+def interference(fn, ignore) -> dict:
+    '''
+    For each name, the names live where it is defined. A copy's source
+    doesn't count, so the two can share a local.
+    '''
+    use_sets = {}
+    def_sets = {}
+    for block in fn.blocks:
+        used, defined = set(), set()
+        for instr in block.instrs + [block.term]:
+            used |= {arg for arg in instr.args
+                     if arg not in ignore and arg not in defined}
+            if instr.dst is not None:
+                defined.add(instr.dst)
+        use_sets[block], def_sets[block] = used, defined
+
+    live_in = {block: set() for block in fn.blocks}
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(reverse_postorder(fn)):
+            live_out = set().union(*(live_in[succ] for succ in block.succs()))
+            new_in = use_sets[block] | (live_out - def_sets[block])
+            if new_in != live_in[block]:
+                live_in[block] = new_in
+                changed = True
+
+    edges = {}
+    for block in fn.blocks:
+        live = set().union(*(live_in[succ] for succ in block.succs()))
+        for instr in reversed(block.instrs + [block.term]):
+            if instr.dst is not None:
+                for other in live:
+                    if other != instr.dst and not (instr.op == "copy" and other == instr.args[0]):
+                        edges.setdefault(instr.dst, set()).add(other)
+                        edges.setdefault(other, set()).add(instr.dst)
+                live.discard(instr.dst)
+            live |= {arg for arg in instr.args if arg not in ignore}
+    return edges
+
+def fused_branch(lines: list, jump: str, label: str) -> tuple:
+    # a conditional jump, taking in the not or typed comparison
+    # just before it when there is one (dropping it from lines)
+    if lines and lines[-1] == (None, "bool_not", None):
+        lines.pop()
+        jump = NEGATED_BRANCHES[jump]
+    if lines and lines[-1][1] in FUSED_BRANCHES:
+        fused = FUSED_BRANCHES[lines.pop()[1]]
+        jump = fused if jump == "jump_if" else NEGATED_BRANCHES[fused]
+    return None, jump, label
+
+def lower(fn, returnargs: int, new_label):
+    '''
+    The instruction lines for fn, as (locals it needs, lines), with
+    lines as the assembler takes them (label, operation, operand)
+    '''
+    from_ssa(fn)
+    order = reverse_postorder(fn)
+    labels = {block: new_label("bb") for block in order}
+
+    consts = {}
+    params = {}
+    defs = {}
+    use_at = {}
+    for block in order:
+        for index, instr in enumerate(block.instrs + [block.term]):
+            if instr.op == "const":
+                consts[instr.dst] = instr.attr
+            elif instr.op == "param":
+                params[instr.dst] = instr.attr
+            if instr.dst is not None:
+                defs.setdefault(instr.dst, []).append((block, index))
+            for arg in instr.args:
+                use_at.setdefault(arg, []).append((block, index))
+
+    def stays_on_stack(name):
+        if name in consts or name in params or len(defs[name]) != 1:
+            return False
+        uses = use_at.get(name, [])
+        return len(uses) == 1 and uses[0][0] is defs[name][0][0] \
+            and uses[0][1] > defs[name][0][1]
+
+    def push(code, name):
+        if name == "$":
+            code.append(["load", "$"])
+        elif name in consts:
+            code.append(["const", consts[name]])
+        else:
+            code.append(["load", name])
+
+    # first pass: stack code over names, with a placeholder after each
+    # value that might stay on the stack, which becomes a store if it
+    # turns out it can't
+    code = []
+    for block in order:
+        code.append(["label", labels[block]])
+        pending = []
+        placeholder = {}
+        for instr in block.instrs + [block.term]:
+            if instr.op in ("const", "param"):
+                continue
+            # what it needs pushed, bottom to top: a call's receiver
+            # and then its arguments, or a typed operation's operands
+            needed = instr.args
+
+            # the longest run of what's on the stack that this uses in
+            # order; the arguments of a constructor go over the new
+            # object, so none of them can be there already
+            matched = 0
+            if instr.op == "new":
+                code.append(["new", instr.attr])
+            else:
+                for length in range(min(len(pending), len(needed)), 0, -1):
+                    if pending[-length:] == needed[:length]:
+                        matched = length
+                        break
+            if matched:
+                del pending[-matched:]
+            for name in needed[matched:]:
+                if name in pending:
+                    pending.remove(name)
+                    placeholder[name][0] = "store"
+                push(code, name)
+
+            opcode = typed_opcode(instr)
+            if opcode is not None:
+                code.append([opcode, None])
+            elif instr.op == "call":
+                code.append(["call", call_operand(instr.attr, len(needed) - 1)])
+            elif instr.op == "new":
+                code.append(["call", call_operand(f"{instr.attr}:$constructor", len(needed))])
+            elif instr.op in ("load_field", "store_field"):
+                code.append([instr.op, instr.attr])
+            elif instr.op == "jump":
+                code.append(["jump", labels[instr.targets[0]]])
+            elif instr.op == "branch":
+                code.append(["jump_if", labels[instr.targets[0]]])
+                code.append(["jump", labels[instr.targets[1]]])
+            elif instr.op == "return":
+                # a call whose value is returned straight off the
+                # stack may be a tail call (see quack_codegen.tail_call)
+                made = next((entry for entry in reversed(code)
+                             if entry[0] != "pending"), None)
+                if made is not None and made[0] == "call":
+                    made[0] = "tail_call"
+                code.append(["return", str(returnargs)])
+
+            if instr.dst is None:
+                continue
+            if not use_at.get(instr.dst):
+                code.append(["pop", None])
+            elif stays_on_stack(instr.dst):
+                placeholder[instr.dst] = ["pending", instr.dst]
+                code.append(placeholder[instr.dst])
+                pending.append(instr.dst)
+            else:
+                code.append(["store", instr.dst])
+
+    # then give the stored names locals
+    stored = []
+    for op, name in code:
+        if op in ("load", "store") and name != "$" and name not in stored:
+            stored.append(name)
+    edges = interference(fn, set(consts) | {"$"})
+    slot = dict(params)
+    members = {arg: {name for name in params if params[name] == arg} for arg in fn.args}
+    temps = []
+
+    def fits(name, candidate):
+        return not (edges.get(name, set()) & members[candidate])
+
+    for name in stored:
+        if name in slot:
+            continue
+        preferred = origin(name) or fn.hints.get(name)
+        candidates = [preferred] if preferred in fn.variables else []
+        candidates += [var for var in fn.locals + temps
+                       if var in members and var != preferred]
+        for candidate in candidates:
+            members.setdefault(candidate, set())
+            if fits(name, candidate):
+                break
+        else:
+            candidate = f"_t{len(temps)}"
+            while candidate in fn.variables:
+                candidate = "_" + candidate
+            temps.append(candidate)
+            members[candidate] = set()
+        slot[name] = candidate
+        members[candidate].add(name)
+
+    lines = []
+    for op, operand in code:
+        if op == "label":
+            lines.append((operand, None, None))
+        elif op == "pending":
+            continue
+        elif op in ("load", "store") and operand != "$":
+            # a copy between names that share a local is nothing at all
+            if op == "store" and lines and lines[-1] == (None, "load", slot[operand]):
+                lines.pop()
+            else:
+                lines.append((None, op, slot[operand]))
+        elif op in ("jump_if", "jump_ifnot"):
+            lines.append(fused_branch(lines, op, operand))
+        else:
+            lines.append((None, op, operand))
+
+    used = {operand for _, op, operand in lines if op in ("load", "store")}
+    local_slots = [var for var in fn.locals + temps if var in used]
+    return local_slots, lines
@@ -1,11 +1,12 @@
-from lark import Transformer, v_args
+from quack_lalr import Transformer, v_args
 from quack_visitor import ASTVisitor
-from quack_tables import tables
+from quack_tables import Tables
         
 class ASTNode():
     '''
     Base class for all AST nodes
     '''
+    __slots__ = ()
 
     def set_type(self, typ: str):
         raise NotImplementedError()
@@ -15,6 +16,11 @@ class ASTNode():
     
     def check_type(self, visitor: ASTVisitor) -> str:
         raise NotImplementedError()
+
+    def resolve(self, visitor: ASTVisitor):
+        # most nodes just resolve the names in their children
+        for name in self.__slots__:
+            resolve_all(getattr(self, name), visitor)
         
     def check_init(self, visitor: ASTVisitor, init: set):
         raise NotImplementedError()
@@ -22,10 +28,56 @@ class ASTNode():
     def c_eval(self, visitor: ASTVisitor):
         raise NotImplementedError()
 
+    def fold(self, visitor: ASTVisitor):
+        raise NotImplementedError()
+
     def generate(self, visitor: ASTVisitor):
         raise NotImplementedError()
+
+def resolve_all(child, visitor: ASTVisitor):
+    # a child may be a node, a (nested) list of nodes, or a name
+    if isinstance(child, ASTNode):
+        child.resolve(visitor)
+    elif isinstance(child, list):
+        for element in child:
+            resolve_all(element, visitor)
+
+def count_nodes(root) -> int:
+    # the nodes in the tree under root, walked without recursion
+    # since statement lists nest deeply on the left
+    count = 0
+    stack = [root]
+    while stack:
+        child = stack.pop()
+        if isinstance(child, ASTNode):
+            count += 1
+            stack.extend(getattr(child, name) for name in child.__slots__)
+        elif isinstance(child, list):
+            stack.extend(child)
+    return count
+
+class EmptyStmtNode(ASTNode):
+    '''
+    What is left of a statement that constant folding pruned
+    away, such as 'while false { ... }'
+    '''
+    __slots__ = ()
+
+    def check_type(self, visitor: ASTVisitor):
+        pass
+
+    def check_init(self, visitor: ASTVisitor, init: set):
+        pass
+
+    def fold(self, visitor: ASTVisitor):
+        return self
+
+    def generate(self, visitor: ASTVisitor):
+        pass
         
 class StringLiteralNode(ASTNode):
+    __slots__ = ("val",)
+
     def __init__(self, val: str):
         self.val = val
 
@@ -38,10 +90,15 @@ class StringLiteralNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         pass
 
+    def fold(self, visitor: ASTVisitor):
+        return self
+
     def generate(self, visitor: ASTVisitor):
         return visitor.VisitString(self)
 
 class IntLiteralNode(ASTNode):
+    __slots__ = ("val",)
+
     def __init__(self, val: int):
         self.val = val
 
@@ -54,10 +111,15 @@ class IntLiteralNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         pass
 
+    def fold(self, visitor: ASTVisitor):
+        return self
+
     def generate(self, visitor: ASTVisitor):
         return visitor.VisitInt(self)
 
 class NothingLiteralNode(ASTNode):
+    __slots__ = ("val",)
+
     def __init__(self, val = "Nothing"):
         self.val = val
 
@@ -70,10 +132,15 @@ class NothingLiteralNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         pass
 
+    def fold(self, visitor: ASTVisitor):
+        return self
+
     def generate(self, visitor: ASTVisitor):
         return visitor.VisitNothing(self)
 
 class BooleanLiteralNode(ASTNode):
+    __slots__ = ("val",)
+
     def __init__(self, val: str):
         self.val = val
 
@@ -86,66 +153,102 @@ class BooleanLiteralNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         pass
 
+    def c_eval(self, visitor, true_branch, false_branch):
+        # a condition that folded to a literal, as in 'while true'.
+        # false just falls through to the false branch
+        if self.val == "true":
+            visitor.add_jump(true_branch)
+
+    def fold(self, visitor: ASTVisitor):
+        return self
+
     def generate(self, visitor: ASTVisitor):
         return visitor.VisitBool(self)
 
 class VariableNode(ASTNode):
-    def __init__(self, var: str):
+    __slots__ = ("var", "tables", "symbol")
+
+    def __init__(self, var: str, tables: Tables):
         self.var = var
+        self.tables = tables
+        self.symbol = None
+
+    def resolve(self, visitor: ASTVisitor):
+        self.symbol = visitor.VisitVar(self)
         
     def get_type(self):
-        return tables.get_type(self.var)
+        return self.tables.read(self.symbol)
     
     def set_type(self, typ: str):
-        tables.set_type(self.var, typ)
+        self.tables.assign(self.symbol, typ)
 
     def check_type(self, visitor: ASTVisitor):
-        return tables.get_type(self.var)
+        return self.tables.read(self.symbol)
 
     def check_init(self, visitor: ASTVisitor, init: set):
         pass
         
+    def fold(self, visitor: ASTVisitor):
+        return self
+
     def generate(self, visitor: ASTVisitor):
         return visitor.VisitVar(self)
 
 class FieldNode(ASTNode):
-    def __init__(self, left: ASTNode, ident: ASTNode):
+    __slots__ = ("left", "ident", "tables", "symbol")
+
+    def __init__(self, left: ASTNode, ident: ASTNode, tables: Tables):
         self.left = left
         self.ident = ident
+        self.tables = tables
+        # a field of this is bound by resolution; a field of another
+        # object when the type of the object is known, and again if
+        # that type changes
+        self.symbol = None
+
+    def resolve(self, visitor: ASTVisitor):
+        if self.left == "this":
+            self.symbol = visitor.VisitField(self)
+        else:
+            self.left.resolve(visitor)
+
+    def bind(self, owner: str):
+        if self.symbol is None or self.symbol.owner != owner:
+            self.symbol = self.tables.lookup(owner, self.ident)
+        return self.symbol
 
     def check_type(self, visitor: ASTVisitor):
         if self.left == "this":
-            tables.set_field(self.ident)
-            return tables.get_type(self.ident)
+            self.tables.set_field(self.ident)
+            return self.tables.read(self.symbol)
         else:
-            # temporarily change 'current' class so we can look up the field
-            tmp = tables.current_object
-            tables.current_object = self.left.get_type()
-            typ = tables.get_type(self.ident)
-            tables.current_object = tmp
-            return typ
+            owner = self.left.get_type()
+            return self.tables.read(self.bind(owner))
 
     def set_type(self, typ: str):
         if self.left == "this":
-            tables.set_type(self.ident, typ)
+            self.tables.assign(self.symbol, typ)
 
         else:
             raise ValueError("Cannot assign to field that isn't 'this'")
 
     def get_type(self):
-            tmp = tables.current_object
-            tables.current_object = self.left.get_type()
-            typ = tables.get_type(self.ident)
-            tables.current_object = tmp
-            return typ
+        if self.left != "this":
+            self.bind(self.left.get_type())
+        return self.tables.read(self.symbol)
         
     def check_init(self, visitor: ASTVisitor, init: set):
         pass
 
+    def fold(self, visitor: ASTVisitor):
+        return self
+
     def generate(self, visitor: ASTVisitor):
         visitor.VisitField(self)
 
 class UnaryOpNode(ASTNode):
+    __slots__ = ("op", "child", "typ")
+
     def __init__(self, op: str, child: ASTNode):
         self.op = op
         self.child = child
@@ -163,14 +266,21 @@ class UnaryOpNode(ASTNode):
 
     def c_eval(self, visitor, true_branch, false_branch):
         if self.op == '!':
+            if visitor.add_compare_jump(self.child, true_branch, negate=True):
+                return
             self.child.generate(visitor)
             visitor.add_jump_if_not(true_branch)
 
+    def fold(self, visitor: ASTVisitor):
+        return visitor.VisitUnary(self)
+
     def generate(self, visitor: ASTVisitor):
         self.child.generate(visitor)
         return visitor.VisitUnary(self)
         
 class BinaryOpNode(ASTNode):
+    __slots__ = ("op", "left", "right", "typ")
+
     def __init__(self, op: str, left: ASTNode, right: ASTNode):
         self.op = op
         self.left = left
@@ -190,26 +300,37 @@ class BinaryOpNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         return visitor.VisitBinary(self, init)
 
+    def fold(self, visitor: ASTVisitor):
+        return visitor.VisitBinary(self)
+
     def generate(self, visitor: ASTVisitor):
         self.left.generate(visitor)
         self.right.generate(visitor)
         return visitor.VisitBinary(self)
 
 class UnusedStmtNode(ASTNode):
+    __slots__ = ("statement",)
+
     def __init__(self, statement: ASTNode):
         self.statement = statement
     
     def check_type(self, visitor: ASTVisitor):
-        return self.statement.check_type(visitor)
+        return visitor.VisitUnused(self)
 
     def check_init(self, visitor: ASTVisitor, init: set):
         return self.statement.check_init(visitor, init)
 
+    def fold(self, visitor: ASTVisitor):
+        self.statement = self.statement.fold(visitor)
+        return self
+
     def generate(self, visitor: ASTVisitor):
         self.statement.generate(visitor)
         return visitor.VisitUnused(self)
         
 class CallNode(ASTNode):
+    __slots__ = ("callee", "function", "params", "typ")
+
     def __init__(self, callee: ASTNode,
                  function: str, params: list):
 
@@ -237,6 +358,11 @@ class CallNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         return visitor.VisitCall(self, init)
 
+    def fold(self, visitor: ASTVisitor):
+        self.callee = self.callee.fold(visitor)
+        self.params = [element.fold(visitor) for element in self.params]
+        return self
+
     def generate(self, visitor: ASTVisitor):
         self.callee.generate(visitor)
         for element in self.params:
@@ -245,6 +371,8 @@ class CallNode(ASTNode):
         return visitor.VisitCall(self)
         
 class AssignmentNode(ASTNode):
+    __slots__ = ("left", "right", "typ")
+
     def __init__(self, left: ASTNode, right: ASTNode,
                  typ: str = None):
 
@@ -265,12 +393,17 @@ class AssignmentNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         return visitor.VisitAssignment(self, init)
 
+    def fold(self, visitor: ASTVisitor):
+        self.right = self.right.fold(visitor)
+        return self
+
     def generate(self, visitor: ASTVisitor):
-        self.left.generate(visitor)
-        self.right.generate(visitor)
+        # the visitor generates both sides, in the order it needs
         return visitor.VisitAssignment(self)
 
 class ComparisonNode(ASTNode):
+    __slots__ = ("left", "right", "op")
+
     def __init__(self, left: ASTNode, right: ASTNode, op: str):
         self.left = left
         self.right = right
@@ -279,24 +412,29 @@ class ComparisonNode(ASTNode):
     def c_eval(self, visitor, true_branch, false_branch):
         # generate short-circuit 'or' comparison
         if self.op == "||":
-            self.left.generate(visitor)
             # jump to block if first one is true
-            visitor.add_jump_if(true_branch)
-            self.right.generate(visitor)
+            if not visitor.add_compare_jump(self.left, true_branch):
+                self.left.generate(visitor)
+                visitor.add_jump_if(true_branch)
             # jump to block if second one is true
-            visitor.add_jump_if(true_branch)
+            if not visitor.add_compare_jump(self.right, true_branch):
+                self.right.generate(visitor)
+                visitor.add_jump_if(true_branch)
 
         # generate short-circuit 'and' comparison
         elif self.op == "&&":
-            self.left.generate(visitor)
             # jump to end if first one is false
-            visitor.add_jump_if_not(false_branch)
-            self.right.generate(visitor)
+            if not visitor.add_compare_jump(self.left, false_branch, negate=True):
+                self.left.generate(visitor)
+                visitor.add_jump_if_not(false_branch)
             # jump to block if second is true
-            visitor.add_jump_if(true_branch)
+            if not visitor.add_compare_jump(self.right, true_branch):
+                self.right.generate(visitor)
+                visitor.add_jump_if(true_branch)
 
-        # otherwise there's no short-circuiting required
-        else:
+        # otherwise there's no short-circuiting required; compare
+        # and branch in one go where the vm can
+        elif not visitor.add_compare_jump(self, true_branch):
             self.generate(visitor)
             visitor.add_jump_if(true_branch)
     
@@ -309,12 +447,17 @@ class ComparisonNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         return visitor.VisitComparison(self, init)
 
+    def fold(self, visitor: ASTVisitor):
+        return visitor.VisitComparison(self)
+
     def generate(self, visitor: ASTVisitor):
         self.left.generate(visitor)
         self.right.generate(visitor)
         return visitor.VisitComparison(self)
 
 class IfStmtNode(ASTNode):
+    __slots__ = ("condition", "block", "otherwise")
+
     def __init__(self, condition: ASTNode, block: ASTNode,
                  otherwise: ASTNode):
 
@@ -328,10 +471,15 @@ class IfStmtNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         return visitor.VisitIfStmt(self, init)
 
+    def fold(self, visitor: ASTVisitor):
+        return visitor.VisitIfStmt(self)
+
     def generate(self, visitor: ASTVisitor):
         return visitor.VisitIfStmt(self)
     
 class WhileNode(ASTNode):
+    __slots__ = ("condition", "block")
+
     def __init__(self, condition: ASTNode,
                  block: ASTNode):
 
@@ -344,10 +492,15 @@ class WhileNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         return visitor.VisitWhile(self, init)
 
+    def fold(self, visitor: ASTVisitor):
+        return visitor.VisitWhile(self)
+
     def generate(self, visitor: ASTVisitor):
         return visitor.VisitWhile(self)
                  
 class BlockNode(ASTNode):
+    __slots__ = ("statements",)
+
     def __init__(self, statements: ASTNode):
         self.statements = statements
 
@@ -356,11 +509,17 @@ class BlockNode(ASTNode):
 
     def check_init(self, visitor: ASTVisitor, init: set):
         self.statements.check_init(visitor, init)
+
+    def fold(self, visitor: ASTVisitor):
+        self.statements = self.statements.fold(visitor)
+        return self
         
     def generate(self, visitor: ASTVisitor):
         self.statements.generate(visitor)
 
 class ConstructNode(ASTNode):
+    __slots__ = ("ident", "params")
+
     def __init__(self, ident: str, params):
         self.ident = ident
         self.params = params
@@ -371,30 +530,39 @@ class ConstructNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         pass
 
-    def generate(self, visitor: ASTVisitor):
+    def fold(self, visitor: ASTVisitor):
         if isinstance(self.params, list):
-            for element in self.params:
-                element.generate(visitor)
+            self.params = [element.fold(visitor) for element in self.params]
+        elif self.params is not None:
+            self.params = self.params.fold(visitor)
+        return self
 
-        else:
-            self.params.generate(visitor)
-
-        visitor.VisitConstruct(self)
+    def generate(self, visitor: ASTVisitor):
+        # the visitor generates the arguments after the new object
+        return visitor.VisitConstruct(self)
         
 class ReturnStmtNode(ASTNode):
+    __slots__ = ("statement",)
+
     def __init__(self, statement: ASTNode):
         self.statement = statement
 
     def check_type(self, visitor: ASTVisitor):
-        return self.statement.check_type(visitor)
+        return visitor.VisitReturn(self)
 
     def check_init(self, visitor, init):
         pass
 
+    def fold(self, visitor: ASTVisitor):
+        self.statement = self.statement.fold(visitor)
+        return self
+
     def generate(self, visitor: ASTVisitor):
         visitor.VisitReturn(self)
     
 class FormalNode(ASTNode):
+    __slots__ = ("ident", "typ")
+
     def __init__(self, ident: str, typ: str):
         self.ident = ident
         self.typ = typ
@@ -405,14 +573,20 @@ class FormalNode(ASTNode):
     def check_init(self, visitor, init):
         pass
 
+    def fold(self, visitor: ASTVisitor):
+        return self
+
     def generate(self, visitor: ASTVisitor):
         pass
     
 class MethodNode(ASTNode):
+    __slots__ = ("tables", "ident", "typ", "block", "formals", "formal_types")
+
     def __init__(self, ident: str,
                  formals: list, typ: str,
-                 block: ASTNode):
+                 block: ASTNode, tables: Tables):
 
+        self.tables = tables
         self.ident = ident
         self.typ = typ
         self.block = block
@@ -433,12 +607,12 @@ class MethodNode(ASTNode):
 
     def check_type(self, visitor: ASTVisitor):
         # add method to object hierarchy
-        tables.add_method(self.ident, self.formal_types, self.typ)
+        self.tables.add_method(self.ident, self.formal_types, self.typ)
 
         # add the arguments to our table
         for element in self.formals:
-            tables.set_type(element.ident, element.typ)
-            tables.add_argument(element.ident, element.typ)
+            self.tables.set_type(element.ident, element.typ)
+            self.tables.add_argument(element.ident, element.typ)
 
         # check the rest of the method block
         self.block.check_type(visitor)
@@ -448,10 +622,16 @@ class MethodNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         visitor.VisitMethod(self, init)
 
+    def fold(self, visitor: ASTVisitor):
+        self.block = self.block.fold(visitor)
+        return self
+
     def generate(self, visitor: ASTVisitor):
         visitor.VisitMethod(self)
     
 class MethodsNode(ASTNode):
+    __slots__ = ("methods", "final")
+
     def __init__(self, methods: ASTNode, final: ASTNode):
         self.methods = methods
         self.final = final 
@@ -463,12 +643,19 @@ class MethodsNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         self.methods.check_init(visitor, init)
         return self.final.check_init(visitor, init)
+
+    def fold(self, visitor: ASTVisitor):
+        self.methods = self.methods.fold(visitor)
+        self.final = self.final.fold(visitor)
+        return self
         
     def generate(self, visitor: ASTVisitor):
         self.methods.generate(visitor)
         self.final.generate(visitor)
 
 class BodyNode(ASTNode):
+    __slots__ = ("program", "methods")
+
     def __init__(self, program: ASTNode, methods: ASTNode):
         self.program = program
         self.methods = methods
@@ -481,14 +668,22 @@ class BodyNode(ASTNode):
         
     def check_init(self, visitor: ASTVisitor, init: set):
         visitor.VisitBody(self, init)
+
+    def fold(self, visitor: ASTVisitor):
+        self.program = self.program.fold(visitor)
+        self.methods = self.methods.fold(visitor)
+        return self
         
     def generate(self, visitor: ASTVisitor):
         visitor.VisitBody(self)
     
 class SignatureNode(ASTNode):
+    __slots__ = ("tables", "name", "ext", "formals")
+
     def __init__(self, name: str, formals: list,
-                 ext: str):
+                 ext: str, tables: Tables):
 
+        self.tables = tables
         self.name = name
         self.ext = ext
         self.formals = []
@@ -502,22 +697,25 @@ class SignatureNode(ASTNode):
             else:
                 self.formals.append(element)
 
+    def resolve(self, visitor: ASTVisitor):
+        visitor.VisitSignature(self)
+
     def check_type(self, visitor: ASTVisitor):
         # add the class signature information to our
         # class tables
-        tables.add_object(self.name, self.ext)
+        self.tables.add_object(self.name, self.ext)
 
         # we will set the current object in the table
         # singleton so that when we go into type checking
         # the methods, we know what methods go to which
         # class in our tables
-        tables.set_current_object(self.name)
+        self.tables.set_current_object(self.name)
 
         # add each argument into the table that exists
         # for a given signature
         for element in self.formals:
-            tables.set_type(element.ident, element.typ)
-            tables.add_argument(element.ident, element.typ)
+            self.tables.set_type(element.ident, element.typ)
+            self.tables.add_argument(element.ident, element.typ)
 
         # we just return the class name as the type
         return self.name
@@ -525,12 +723,17 @@ class SignatureNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         pass
 
+    def fold(self, visitor: ASTVisitor):
+        return self
+
     def generate(self, visitor: ASTVisitor):
         # update the current node name
-        tables.set_current_object(self.name)
+        self.tables.set_current_object(self.name)
         visitor.VisitSignature(self)
 
 class ClassNode(ASTNode):
+    __slots__ = ("signature", "body", "typ")
+
     def __init__(self, signature: SignatureNode, body: ASTNode):
         self.signature = signature
         self.body = body
@@ -544,12 +747,18 @@ class ClassNode(ASTNode):
     def check_init(self, visitor: ASTVisitor, init: set):
         self.signature.check_init(visitor, init)
         self.body.check_init(visitor, init)
+
+    def fold(self, visitor: ASTVisitor):
+        self.body = self.body.fold(visitor)
+        return self
         
     def generate(self, visitor: ASTVisitor):
         self.signature.generate(visitor)
         self.body.generate(visitor)
     
 class ClassesNode(ASTNode):
+    __slots__ = ("classes", "final")
+
     def __init__(self, classes: ASTNode,
                  final: ASTNode):
         self.classes = classes
@@ -563,11 +772,18 @@ class ClassesNode(ASTNode):
         self.classes.check_init(visitor, init)
         self.final.check_init(visitor, init)
 
+    def fold(self, visitor: ASTVisitor):
+        self.classes = self.classes.fold(visitor)
+        self.final = self.final.fold(visitor)
+        return self
+
     def generate(self, visitor: ASTVisitor):
         self.classes.generate(visitor)
         self.final.generate(visitor)
 
 class ProgramNode(ASTNode):
+    __slots__ = ("program", "final")
+
     def __init__(self, program: ASTNode,
                  final: ASTNode):
 
@@ -582,22 +798,31 @@ class ProgramNode(ASTNode):
         self.program.check_init(visitor, init)
         self.final.check_init(visitor, init)
 
+    def fold(self, visitor: ASTVisitor):
+        return visitor.VisitProgram(self)
+
     def generate(self, visitor: ASTVisitor):
         self.program.generate(visitor)
         self.final.generate(visitor)
 
 class StartNode(ASTNode):
+    __slots__ = ("tables", "classes", "program")
+
     def __init__(self, classes: ASTNode,
-                 program: ASTNode):
+                 program: ASTNode, tables: Tables):
 
+        self.tables = tables
         self.classes = classes 
         self.program = program 
 
+    def resolve(self, visitor: ASTVisitor):
+        visitor.VisitStartNode(self)
+
     def check_type(self, visitor: ASTVisitor):
         if self.classes != None:
             self.classes.check_type(visitor)
 
-        tables.set_current_object(tables.mainfilename)
+        self.tables.set_current_object(self.tables.mainfilename)
         self.program.check_type(visitor)
 
     def check_init(self, visitor: ASTVisitor, init: set):
@@ -605,20 +830,29 @@ class StartNode(ASTNode):
             self.classes.check_init(visitor, init)
         self.program.check_init(visitor, init)
 
+    def fold(self, visitor: ASTVisitor):
+        if self.classes != None:
+            self.classes = self.classes.fold(visitor)
+        self.program = self.program.fold(visitor)
+        return self
+
     def generate(self, visitor: ASTVisitor):
         visitor.VisitStartNode(self)
 
 @v_args(inline=True)    # Affects the signatures of the methods
 class ASTBuilder(Transformer):
 
-    def __init__(self):
-        pass
+    def __init__(self, tables: Tables = None):
+        # the tables of the compilation, for the nodes that look
+        # types up as they are checked and generated. A builder
+        # kept by a parser is given the tables before each parse
+        self.tables = tables
 
     def start_c(self, classes, program):
-        return StartNode(classes, program)
+        return StartNode(classes, program, self.tables)
 
     def start(self, program):
-        return StartNode(None, program)
+        return StartNode(None, program, self.tables)
     
     def prog(self, program, statement):
         return ProgramNode(program, statement)
@@ -630,10 +864,10 @@ class ASTBuilder(Transformer):
         return ClassNode(signature, body)
     
     def signature(self, name, formals):
-        return SignatureNode(name, formals, "Obj")
+        return SignatureNode(name, formals, "Obj", self.tables)
 
     def signature_ext(self, name, formals, ext):
-        return SignatureNode(name, formals, ext)
+        return SignatureNode(name, formals, ext, self.tables)
 
     def formals(self, formals, formal):
         return [formals, formal]
@@ -648,7 +882,7 @@ class ASTBuilder(Transformer):
         return MethodsNode(methods, method)
 
     def method(self, ident, formals, typ, block):
-        return MethodNode(ident, formals, typ, block)
+        return MethodNode(ident, formals, typ, block, self.tables)
     
     def construct(self, ident, params=None):
         return ConstructNode(ident, params)
@@ -723,13 +957,13 @@ class ASTBuilder(Transformer):
         return UnaryOpNode("-", expr)
         
     def var(self, name):
-        return VariableNode(name)
+        return VariableNode(name, self.tables)
 
     def field(self, left, ident):
-        return FieldNode(left, ident)
+        return FieldNode(left, ident, self.tables)
 
     def field_this(self, ident):
-        return FieldNode("this", ident)
+        return FieldNode("this", ident, self.tables)
 
     def number(self, val):
         return IntLiteralNode(val)
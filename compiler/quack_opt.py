@@ -0,0 +1,352 @@
+from quack_fold import int_arith, compare, INT_MIN, INT_MAX
+from quack_ir import (Instr, Unsupported, build, cleanup, dominators,
+                      dominates, origin, reverse_postorder, to_ssa, uses)
+from quack_lower import lower
+
+###
+# Optimization passes over the SSA form of a method (quack_ir.py).
+# Each takes a Function, changes it in place, and returns a short
+# description of what it changed for the report.
+###
+
+# Builtin methods that neither fail nor have side effects, so a call
+# whose result isn't used can go, and one in a loop can be hoisted.
+# Int:divide can fail on zero, so it always stays where it is
+PURE_METHODS = {
+    "Int:plus", "Int:minus", "Int:times", "Int:negate",
+    "Int:equals", "Int:less", "Int:greater", "Int:less_eq", "Int:greater_eq",
+    "String:plus", "String:equals", "String:less",
+    "Bool:negate", "Bool:equals",
+}
+
+# what the builtins compute, in terms of quack_fold's helpers
+ARITH_OPS = {"plus": '+', "minus": '-', "times": '*', "divide": '/'}
+COMPARE_OPS = {"equals": "==", "less": "<", "greater": ">",
+               "less_eq": "<=", "greater_eq": ">="}
+
+###
+# Sparse conditional constant propagation (Wegman and Zadeck). A
+# name's lattice value is missing while nothing is known about it,
+# a (class, value, literal text) triple while it is a constant, and
+# BOTTOM once it can be more than one thing. Only blocks that some
+# executable edge reaches are looked at, so a branch on a constant
+# takes the rest of its dead side with it.
+###
+
+BOTTOM = "bottom"
+
+def literal(text: str):
+    if text.isdigit():
+        return ("Int", int(text), text)
+    if text in ("true", "false"):
+        return ("Bool", text == "true", text)
+    if text.startswith('"'):
+        return ("String", text[1:-1].encode("utf-8").decode("unicode_escape"), text)
+    if text == "nothing":
+        return ("Nothing", None, text)
+    return BOTTOM
+
+def int_constant(value):
+    # negative Ints aren't const operands, so they have no text and
+    # are only ever folded further
+    if value is None or not INT_MIN <= value <= INT_MAX:
+        return BOTTOM
+    return ("Int", value, str(value) if value >= 0 else None)
+
+def bool_constant(value: bool):
+    return ("Bool", value, "true" if value else "false")
+
+def evaluate_call(method: str, operands: list):
+    clazz, name = method.split(":")
+    if method not in PURE_METHODS and method != "Int:divide":
+        return BOTTOM
+    if any(operand[0] != clazz for operand in operands):
+        return BOTTOM
+    values = [operand[1] for operand in operands]
+    if name == "negate":
+        return int_constant(-values[0]) if clazz == "Int" else bool_constant(not values[0])
+    if len(values) != 2:
+        return BOTTOM
+
+    if clazz == "Int":
+        if name in ARITH_OPS:
+            return int_constant(int_arith(ARITH_OPS[name], *values))
+        if name in COMPARE_OPS:
+            return bool_constant(compare(COMPARE_OPS[name], *values))
+    elif clazz == "String":
+        receiver, arg = operands
+        if name == "plus" and receiver[2] and arg[2]:
+            return ("String", values[0] + values[1], receiver[2][:-1] + arg[2][1:])
+        if name == "equals":
+            return bool_constant(values[0] == values[1])
+    elif clazz == "Bool":
+        if name == "equals":
+            return bool_constant(values[0] == values[1])
+    return BOTTOM
+
+def meet(a, b):
+    if a is None:
+        return b
+    if b is None or a == b:
+        return a
+    return BOTTOM
+
+def sccp(fn) -> str:
+    values = {}
+    executable = set()
+    edges = set()
+    users = uses(fn)
+    owner = {instr: block for block, instr in fn.instructions()}
+
+    flow = [(None, fn.entry())]
+    work = []
+
+    def lookup(name):
+        return BOTTOM if name == "$" else values.get(name)
+
+    def update(name, value):
+        if value is not None and values.get(name) != value:
+            values[name] = value
+            work.extend(users.get(name, []))
+
+    def evaluate(block, instr):
+        if instr.op == "phi":
+            value = None
+            for pred, arg in zip(block.preds, instr.args):
+                if (pred, block) in edges:
+                    value = meet(value, lookup(arg))
+            update(instr.dst, value)
+        elif instr.op == "const":
+            update(instr.dst, literal(instr.attr))
+        elif instr.op == "copy":
+            update(instr.dst, lookup(instr.args[0]))
+        elif instr.op == "call":
+            operands = [lookup(arg) for arg in instr.args]
+            if BOTTOM in operands:
+                update(instr.dst, BOTTOM)
+            elif None not in operands:
+                update(instr.dst, evaluate_call(instr.attr, operands))
+        elif instr.op == "jump":
+            flow.append((block, instr.targets[0]))
+        elif instr.op == "branch":
+            cond = lookup(instr.args[0])
+            if cond is None:
+                return
+            if cond != BOTTOM and cond[0] == "Bool":
+                flow.append((block, instr.targets[0 if cond[1] else 1]))
+            else:
+                flow.extend((block, target) for target in instr.targets)
+        elif instr.dst is not None:
+            update(instr.dst, BOTTOM)
+
+    while flow or work:
+        if flow:
+            pred, block = flow.pop()
+            if (pred, block) in edges:
+                continue
+            edges.add((pred, block))
+            for phi in block.phis():
+                evaluate(block, phi)
+            if block not in executable:
+                executable.add(block)
+                for instr in block.instrs + [block.term]:
+                    if instr.op != "phi":
+                        evaluate(block, instr)
+        else:
+            instr = work.pop()
+            if owner[instr] in executable:
+                evaluate(owner[instr], instr)
+
+    folded = branches = 0
+    for block in fn.blocks:
+        if block not in executable:
+            continue
+        for instr in block.instrs:
+            value = values.get(instr.dst)
+            if instr.op != "const" and value not in (None, BOTTOM) and value[2]:
+                instr.op, instr.args, instr.attr = "const", [], value[2]
+                folded += 1
+        term = block.term
+        if term.op == "branch":
+            cond = values.get(term.args[0])
+            if cond not in (None, BOTTOM) and cond[0] == "Bool":
+                block.term = Instr("jump", targets=[term.targets[0 if cond[1] else 1]])
+                branches += 1
+
+    before = len(fn.blocks)
+    cleanup(fn)
+    return f"{folded} constants, {branches} branches, {before - len(fn.blocks)} blocks"
+
+###
+# Copy propagation: uses of a copy read its source instead, and a
+# phi whose arguments are all the same name (or itself) is a copy
+###
+
+def copy_propagation(fn) -> str:
+    replace = {}
+
+    def find(name):
+        while name in replace:
+            name = replace[name]
+        return name
+
+    removed = 0
+    changed = True
+    while changed:
+        changed = False
+        for block in fn.blocks:
+            kept = []
+            for instr in block.instrs:
+                sources = {find(arg) for arg in instr.args} - {instr.dst}
+                if instr.op == "copy" or (instr.op == "phi" and len(sources) == 1):
+                    source = sources.pop()
+                    replace[instr.dst] = source
+                    if origin(source) is None and origin(instr.dst) is not None:
+                        # keep it in the variable's local if it can be
+                        fn.hints.setdefault(source, origin(instr.dst))
+                    removed += 1
+                    changed = True
+                else:
+                    kept.append(instr)
+            block.instrs = kept
+        for _, instr in fn.instructions():
+            instr.args = [find(arg) for arg in instr.args]
+    return f"{removed} copies"
+
+###
+# Dead code elimination. Assignments to locals are copies in the IR,
+# so this is where dead stores go, along with whatever computed
+# only their values
+###
+
+def removable(instr) -> bool:
+    if instr.op == "call":
+        return instr.attr in PURE_METHODS
+    return instr.op in ("const", "copy", "phi", "load_field")
+
+def dead_code(fn) -> str:
+    count = {}
+    for _, instr in fn.instructions():
+        for arg in instr.args:
+            count[arg] = count.get(arg, 0) + 1
+
+    removed = 0
+    changed = True
+    while changed:
+        changed = False
+        for block in fn.blocks:
+            kept = []
+            for instr in block.instrs:
+                if instr.dst is not None and count.get(instr.dst, 0) == 0 \
+                        and removable(instr):
+                    for arg in instr.args:
+                        count[arg] -= 1
+                    removed += 1
+                    changed = True
+                else:
+                    kept.append(instr)
+            block.instrs = kept
+    return f"{removed} dead"
+
+###
+# Loop-invariant code motion. A natural loop is a header and the
+# blocks that reach one of its back edges; pure calls in it whose
+# operands all come from outside the loop are moved to the block
+# that enters it. Inner loops go first, so what they hoist can
+# keep going out of the loops around them.
+###
+
+def natural_loops(fn) -> list:
+    idom = dominators(fn)
+    loops = {}
+    for block in fn.blocks:
+        for header in block.succs():
+            if not dominates(idom, header, block):
+                continue
+            body = loops.setdefault(header, {header})
+            work = [block]
+            while work:
+                member = work.pop()
+                if member not in body:
+                    body.add(member)
+                    work.extend(member.preds)
+    return sorted(loops.items(), key=lambda loop: len(loop[1]))
+
+def hoistable(instr) -> bool:
+    if instr.op == "call":
+        return instr.attr in PURE_METHODS
+    return instr.op == "const"
+
+def licm(fn) -> str:
+    hoisted = 0
+    for header, body in natural_loops(fn):
+        outside = [pred for pred in header.preds if pred not in body]
+        if len(outside) != 1 or len(outside[0].succs()) != 1:
+            continue
+        preheader = outside[0]
+        where = {instr.dst: block for block, instr in fn.instructions()
+                 if instr.dst is not None}
+
+        changed = True
+        while changed:
+            changed = False
+            for block in reverse_postorder(fn):
+                if block not in body:
+                    continue
+                kept = []
+                for instr in block.instrs:
+                    if hoistable(instr) and all(arg == "$" or where[arg] not in body
+                                                for arg in instr.args):
+                        preheader.instrs.append(instr)
+                        where[instr.dst] = preheader
+                        hoisted += instr.op == "call"
+                        changed = True
+                    else:
+                        kept.append(instr)
+                block.instrs = kept
+    return f"{hoisted} hoisted"
+
+# in the order they run
+PASSES = {
+    "sccp": sccp,
+    "copyprop": copy_propagation,
+    "dse": dead_code,
+    "licm": licm,
+}
+
+class QuackOptimizer():
+    '''
+    Compiles method bodies through the IR with the passes asked for,
+    and keeps a line per method saying what each pass did
+    '''
+
+    def __init__(self, passes: list = None):
+        if passes is None:
+            passes = list(PASSES)
+        for name in passes:
+            if name not in PASSES:
+                raise ValueError(f"Unknown optimization pass '{name}' "
+                                 f"(known: {', '.join(PASSES)})")
+        # run them in pipeline order, whatever order they were named in
+        self.passes = [name for name in PASSES if name in passes]
+        self.report = []
+
+    def compile_body(self, name: str, args: list, local_vars: list,
+                     node, result: str, returnargs: int, new_label):
+        '''
+        Lowered code for a method body as (locals, instruction lines),
+        or None if the IR can't represent it
+        '''
+        try:
+            fn = build(name, args, local_vars, node, result)
+        except Unsupported as e:
+            self.report.append(f"{name}: not optimized ({e})")
+            return None
+
+        to_ssa(fn)
+        changes = [f"{pass_name} {PASSES[pass_name](fn)}" for pass_name in self.passes]
+        local_slots, lines = lower(fn, returnargs, new_label)
+        instructions = sum(1 for _, op, _ in lines if op is not None)
+        changes.append(f"{instructions} instructions")
+        self.report.append(f"{name}: " + "; ".join(changes))
+        return local_slots, lines
@@ -1,5 +1,5 @@
 from lark import Lark, Transformer, v_args
-from quack_codegen import codegen
+from quack_codegen import QuackCodeGen
 
 class Tables():
     '''
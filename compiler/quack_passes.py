@@ -0,0 +1,86 @@
+"""The pass manager of the Quack compiler.
+
+A compilation is a list of passes (parse, resolve, check_init,
+check_types, fold, generate; see quack_frontend.COMPILER_PASSES), each
+a method of the compilation that works on its AST in place.  The pass
+manager runs them in order, leaving out any that were skipped, and can
+measure each one: wall time, peak memory allocated while it ran
+(through tracemalloc, which slows the compile down, so only when asked
+for), the AST nodes after it, and the instructions it emitted.
+"""
+import json
+import time
+import tracemalloc
+
+
+class CompilerPass():
+    def __init__(self, name: str, run, requires: list = ()):
+        self.name = name
+        # run(compilation) does the work of the pass
+        self.run = run
+        # passes that must have run first, so can't be skipped
+        self.requires = list(requires)
+
+
+class PassManager():
+    def __init__(self, passes: list, skip: list = (), stats: bool = False):
+        names = [compiler_pass.name for compiler_pass in passes]
+        for name in skip:
+            if name not in names:
+                raise ValueError(f"No compiler pass {name} ({','.join(names)})")
+        self.passes = [compiler_pass for compiler_pass in passes
+                       if compiler_pass.name not in skip]
+        enabled = {compiler_pass.name for compiler_pass in self.passes}
+        for compiler_pass in self.passes:
+            for name in compiler_pass.requires:
+                if name not in enabled:
+                    raise ValueError(f"Compiler pass {compiler_pass.name} "
+                                     f"needs {name}, which is skipped")
+        # one record for each pass run, when measuring
+        self.stats = [] if stats else None
+
+    def run(self, compilation):
+        if self.stats is None:
+            for compiler_pass in self.passes:
+                compiler_pass.run(compilation)
+            return
+
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        try:
+            for compiler_pass in self.passes:
+                instructions = compilation.instruction_count()
+                tracemalloc.reset_peak()
+                started_memory = tracemalloc.get_traced_memory()[0]
+                started = time.perf_counter()
+                compiler_pass.run(compilation)
+                seconds = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1] - started_memory
+                self.stats.append({
+                    "pass": compiler_pass.name,
+                    "seconds": seconds,
+                    "peak_bytes": peak,
+                    "nodes": compilation.node_count(),
+                    "instructions": compilation.instruction_count() - instructions})
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+    def report(self) -> list:
+        # the stats as lines of a table
+        lines = [f"{'pass':12s} {'ms':>9s} {'peak KiB':>9s} {'nodes':>7s} {'instrs':>7s}"]
+        for record in self.stats:
+            lines.append(f"{record['pass']:12s} {record['seconds'] * 1000:9.2f} "
+                         f"{record['peak_bytes'] / 1024:9.1f} "
+                         f"{record['nodes']:7d} {record['instructions']:7d}")
+        total = sum(record["seconds"] for record in self.stats)
+        lines.append(f"{'total':12s} {total * 1000:9.2f}")
+        return lines
+
+
+def write_stats(path: str, programs: list):
+    # programs is a list of {"program": name, "passes": stats}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(programs, f, indent=2)
+        f.write("\n")
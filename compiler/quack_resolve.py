@@ -0,0 +1,35 @@
+import quack_middle as qm
+from quack_visitor import ASTVisitor
+from quack_tables import Tables, Symbol
+
+class QuackResolver(ASTVisitor):
+    '''
+    Binds each variable, argument and field of 'this' named in the
+    program to its symbol in the tables, once, right after the AST is
+    built. Type checking and codegen then read and set the type in the
+    symbol instead of looking the name up in the current class. A field
+    of another object is bound when the type checker knows its class.
+    '''
+    def __init__(self, tables: Tables):
+        self.tables = tables
+        # how many names were bound, for the curious
+        self.bound = 0
+
+    def VisitStartNode(self, node: qm.StartNode):
+        if node.classes != None:
+            node.classes.resolve(self)
+
+        self.tables.set_current_object(self.tables.mainfilename)
+        node.program.resolve(self)
+
+    def VisitSignature(self, node: qm.SignatureNode):
+        # the names in the class body belong to this class
+        self.tables.set_current_object(node.name)
+
+    def VisitVar(self, node: qm.VariableNode) -> Symbol:
+        self.bound += 1
+        return self.tables.symbol(node.var)
+
+    def VisitField(self, node: qm.FieldNode) -> Symbol:
+        self.bound += 1
+        return self.tables.symbol(node.ident)
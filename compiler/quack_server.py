@@ -0,0 +1,184 @@
+"""A long-running compile server for Quack.
+
+Starting the compiler costs more than compiling a small program:
+importing lark, building the LALR tables and the builtin class map.
+The server pays that once.  It listens on a Unix socket and hands
+each request to a process pool whose workers keep the parser and
+tables warm, so one slow program does not hold up the others.
+
+The protocol is one JSON object per line in each direction:
+
+    request:  {"source": "...", "class": "Main", "output": "asm"}
+    response: {"ok": true, "classes": {"Main": "..."}}
+              {"ok": false, "error": "TypeError: ..."}
+
+With "output": "object" the classes are assembled as well, and each
+entry is the object code structure that assemble.py would write.  A
+request that is not such an object, or is longer than REQUEST_LIMIT,
+gets an error response too.
+Like ./quack, run it from the repository root so the assembler can
+find opdefs.txt, asm.conf and the OBJ library.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import assemble
+from quack_build import assemble_program, forget_program
+from quack_codegen import assembly_text
+from quack_frontend import compile_program
+
+DEFAULT_SOCKET = "/tmp/quack.sock"
+# the longest request line read, source and all
+REQUEST_LIMIT = 64 * 2**20
+
+
+def compile_job(source: str, clazz: str, output: str) -> dict:
+    # runs in a pool worker; errors are returned, not raised, so
+    # the client sees the same message the command line would print
+    try:
+        classes = compile_program(source, clazz)
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    if output == "object":
+        try:
+            objects = assemble_program(classes)
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            forget_program(classes)
+        return {"ok": True, "classes": objects}
+
+    return {"ok": True, "classes": {name: assembly_text(lines)
+                                    for name, lines in classes.items()}}
+
+
+def parse_request(line: bytes) -> tuple:
+    # the job a request line asks for, or ValueError saying what is wrong
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"not JSON: {e}")
+    if not isinstance(request, dict):
+        raise ValueError("not a JSON object")
+    job = (request.get("source"), request.get("class"),
+           request.get("output", "asm"))
+    if not isinstance(job[0], str) or not isinstance(job[1], str):
+        raise ValueError("source and class must be strings")
+    if job[2] not in ("asm", "object"):
+        raise ValueError("output must be asm or object")
+    return job
+
+
+async def read_request(reader) -> bytes:
+    # the next request line, b"" at the end, or None for a line
+    # longer than REQUEST_LIMIT, which is read past and dropped
+    skipped = False
+    while True:
+        try:
+            line = await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            line = e.partial
+        except asyncio.LimitOverrunError as e:
+            skipped = True
+            await reader.readexactly(e.consumed)
+            continue
+        return None if skipped else line
+
+
+async def handle_client(pool, reader, writer):
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await read_request(reader)
+        if line == b"":
+            break
+        try:
+            if line is None:
+                raise ValueError(f"longer than {REQUEST_LIMIT} bytes")
+            job = parse_request(line)
+        except ValueError as e:
+            result = {"ok": False, "error": f"Bad request: {e}"}
+        else:
+            result = await loop.run_in_executor(pool, compile_job, *job)
+        writer.write(json.dumps(result).encode("utf-8") + b"\n")
+        await writer.drain()
+    writer.close()
+
+
+async def serve(path: str, workers: int):
+    if os.path.exists(path):
+        os.unlink(path)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        server = await asyncio.start_unix_server(
+            lambda r, w: handle_client(pool, r, w), path=path,
+            limit=REQUEST_LIMIT)
+        print(f"Quack compile server listening on {path}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+
+def request(path: str, source: str, clazz: str, output: str) -> dict:
+    # a blocking client, enough for scripts and the command line
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        message = {"source": source, "class": clazz, "output": output}
+        sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reply:
+            return json.loads(reply.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=
+                                     'Quack compile server and client')
+    parser.add_argument('-s', '--socket', default=DEFAULT_SOCKET,
+                        help="Unix socket path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_cmd = sub.add_parser("serve", help="Run the compile server")
+    serve_cmd.add_argument('-w', '--workers', type=int, default=None,
+                           help="Number of worker processes")
+
+    compile_cmd = sub.add_parser("compile", help="Compile through the server")
+    compile_cmd.add_argument('-i', '--input', required=True,
+                             help="Quack source file")
+    compile_cmd.add_argument('-c', '--class', default=None,
+                             help="Main class name, defaults to the file name")
+    compile_cmd.add_argument('--object', action="store_true",
+                             help="Also assemble, writing OBJ/<class>.json")
+
+    args = vars(parser.parse_args())
+    if args["command"] == "serve":
+        asyncio.run(serve(args["socket"], args["workers"]))
+        return
+
+    clazz = args["class"] or Path(args["input"]).stem
+    with open(args["input"], 'r', encoding='utf-8') as f:
+        source = f.read()
+    output = "object" if args["object"] else "asm"
+    result = request(args["socket"], source, clazz, output)
+    if not result["ok"]:
+        print(result["error"], file=sys.stderr)
+        sys.exit(1)
+
+    for name, code in result["classes"].items():
+        if output == "object":
+            target = assemble.CONFIG.tvmlib.joinpath(name).with_suffix(".json")
+            text = json.dumps(code, indent=4) + "\n"
+        else:
+            target = Path("asm").joinpath(name).with_suffix(".asm")
+            text = code
+        with open(target, 'w') as f:
+            f.write(text)
+        print(f"Compiled {args['input']} -> {target}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+###
+# Frame slots for the local variables of a method generated straight
+# from the AST. Every variable the type checker saw would otherwise
+# get a slot of its own, pushed as nothing by alloc on every call.
+#
+# A liveness analysis over the stack code finds where each variable
+# holds a value that a later load can see. Variables that are never
+# live at the same time share a slot, named for the first of them,
+# and a variable that is never loaded gets no slot at all: its
+# stores just pop the value.
+###
+
+def successors(lines: list, labels: dict) -> list:
+    # for each line, the lines control can go to next
+    succs = []
+    for position, (_, op, operand) in enumerate(lines):
+        after = [position + 1] if position + 1 < len(lines) else []
+        if op == "jump":
+            succs.append([labels[operand]])
+        elif op is not None and op.startswith("jump_"):
+            succs.append(after + [labels[operand]])
+        elif op == "return":
+            succs.append([])
+        else:
+            succs.append(after)
+    return succs
+
+def liveness(lines: list, variables: set) -> list:
+    '''
+    For each line, the variables live just after it, from the loads
+    and stores in lines
+    '''
+    labels = {label: position for position, (label, op, _) in enumerate(lines)
+              if op is None}
+    succs = successors(lines, labels)
+    live_in = [set() for _ in lines]
+    live_out = [set() for _ in lines]
+    changed = True
+    while changed:
+        changed = False
+        for position in reversed(range(len(lines))):
+            out = set().union(*(live_in[succ] for succ in succs[position]))
+            _, op, operand = lines[position]
+            new_in = set(out)
+            if operand in variables:
+                if op == "store":
+                    new_in.discard(operand)
+                elif op == "load":
+                    new_in.add(operand)
+            live_out[position] = out
+            if new_in != live_in[position]:
+                live_in[position] = new_in
+                changed = True
+    return live_out
+
+def interference(lines: list, variables: set) -> dict:
+    '''
+    For each variable, the variables live where it is stored. A load
+    just before the store doesn't count, so the two can share a slot.
+    '''
+    edges = {var: set() for var in variables}
+    for position, live in enumerate(liveness(lines, variables)):
+        _, op, operand = lines[position]
+        if op != "store" or operand not in variables:
+            continue
+        copied = lines[position - 1][2] \
+            if position and lines[position - 1][1] == "load" else None
+        for other in live - {operand, copied}:
+            edges[operand].add(other)
+            edges[other].add(operand)
+    return edges
+
+def allocate_slots(lines: list, variables: list):
+    '''
+    The slots for variables (as .local names) and the lines using them
+    '''
+    loaded = {operand for _, op, operand in lines if op == "load"}
+    live_vars = [var for var in variables if var in loaded]
+    edges = interference(lines, set(live_vars))
+
+    slot = {}
+    members = {}
+    for var in live_vars:
+        for candidate in members:
+            if not edges[var] & members[candidate]:
+                break
+        else:
+            candidate = var
+            members[candidate] = set()
+        slot[var] = candidate
+        members[candidate].add(var)
+
+    allocated = []
+    for label, op, operand in lines:
+        if op == "store" and operand in variables and operand not in slot:
+            allocated.append((label, "pop", None))
+        elif op in ("load", "store") and operand in slot:
+            # a copy between variables that share a slot is nothing at all
+            if op == "store" and allocated and allocated[-1] == (None, "load", slot[operand]):
+                allocated.pop()
+            else:
+                allocated.append((label, op, slot[operand]))
+        else:
+            allocated.append((label, op, operand))
+    return list(members), allocated
@@ -1,16 +1,41 @@
 from class_map import default_class_map
 
+class Symbol():
+    '''
+    A variable of a class (arguments and fields share the namespace),
+    bound once to every node naming it, so the passes after resolution
+    read and set its type here instead of looking its name up.
+    The type is None until the type checker assigns one.
+    '''
+    __slots__ = ("owner", "name", "typ")
+
+    def __init__(self, owner: str, name: str):
+        self.owner = owner
+        self.name = name
+        self.typ = None
+
 class Tables():
     '''
     Keep track of all the default types, classes, and methods.
     Also update data as tree traversals occur.
     '''
     def __init__(self):
-        # dictionary for variable types
+        # the symbols of each class that have a type so far, in the
+        # order they got one, and every symbol a node is bound to
         self.variables = {}
+        self.symbols = {}
         self.arguments = {}
-        # dictionary for objects and their methods
-        self.objects = default_class_map
+        # dictionary for objects and their methods. Each class has
+        # every method it understands, inherited ones included, in
+        # tables shared with the class they came from (the builtin
+        # class map or a superclass) until a method is added to it
+        self.objects = {name: dict(entry) for name, entry in default_class_map.items()}
+        self.shared_methods = set(self.objects)
+        # the ancestors of each class, Obj first and the class itself
+        # last, for finding common superclasses without walking chains
+        self.lineage = {}
+        for name in self.objects:
+            self.index_class(name)
         self.using_methods = []
         # current object for type checking and updating
         # the class hierarchy information for user-added
@@ -19,6 +44,12 @@ class Tables():
 
         self.mainfilename = ""
 
+        # the type checker collects the symbols read while it checks
+        # a statement here, and every symbol whose type is changed, so
+        # it knows which statements to check again
+        self.reads = None
+        self.changed = []
+
     def set_main(self, name):
         self.mainfilename = name
         self.variables[self.mainfilename] = {}
@@ -32,15 +63,42 @@ class Tables():
         if name not in self.arguments.keys():
             self.arguments[name] = {}
 
-    def set_type(self, item, typ):
-        self.variables[self.current_object][item] = typ
-        
-    def get_type(self, item):
+    def symbol(self, item, owner: str = None) -> Symbol:
+        # the symbol for item in owner (the current class by default),
+        # made the first time it is asked for
+        owner = owner or self.current_object
+        symbols = self.symbols.setdefault(owner, {})
+        if item not in symbols:
+            symbols[item] = Symbol(owner, item)
+        return symbols[item]
+
+    def lookup(self, owner: str, item) -> Symbol:
+        # the symbol for item in owner, which must have a type already
         try:
-            return self.variables[self.current_object][item]
+            return self.variables[owner][item]
 
         except:
-            raise NameError(f"In class \"{self.current_object}\": Variable \"{item}\" not found in table.")
+            raise NameError(f"In class \"{owner}\": Variable \"{item}\" not found in table.")
+
+    def read(self, symbol: Symbol):
+        if self.reads is not None:
+            self.reads.add(symbol)
+        if symbol.typ is None:
+            raise NameError(f"In class \"{symbol.owner}\": Variable \"{symbol.name}\" not found in table.")
+        return symbol.typ
+
+    def assign(self, symbol: Symbol, typ):
+        if symbol.typ not in (None, typ):
+            # a new variable can't have been read yet; a changed one may
+            self.changed.append(symbol)
+        symbol.typ = typ
+        self.variables[symbol.owner].setdefault(symbol.name, symbol)
+
+    def set_type(self, item, typ):
+        self.assign(self.symbol(item), typ)
+        
+    def get_type(self, item):
+        return self.read(self.lookup(self.current_object, item))
 
     def get_variables(self):
         return self.variables[self.current_object].keys()
@@ -67,17 +125,37 @@ class Tables():
 
         self.objects[name] = {
             "superclass": ext,
-            "field_list": set(self.objects[ext]["field_list"]),
+            # a dict rather than a set, so fields keep the order
+            # they are first assigned and the output is repeatable
+            "field_list": dict(self.objects[ext]["field_list"]),
             "method_returns": self.objects[ext]["method_returns"],
             "method_args": self.objects[ext]["method_args"]}
+        self.shared_methods.add(name)
+        self.index_class(name)
 
         # also add this class to the variable namespace
         # dictionary
         self.variables[name] = {}
 
+    def index_class(self, name: str):
+        superclass = self.objects[name]["superclass"]
+        if superclass == name:
+            # Obj is its own superclass
+            self.lineage[name] = [name]
+        else:
+            if superclass not in self.lineage:
+                self.index_class(superclass)
+            self.lineage[name] = self.lineage[superclass] + [name]
+
     def add_method(self, name: str, formals: list, typ: str):
-        self.objects[self.current_object]["method_returns"][name] = typ
-        self.objects[self.current_object]["method_args"][name] = formals
+        entry = self.objects[self.current_object]
+        if self.current_object in self.shared_methods:
+            # copy on write, so the method stays out of the superclass
+            entry["method_returns"] = dict(entry["method_returns"])
+            entry["method_args"] = dict(entry["method_args"])
+            self.shared_methods.discard(self.current_object)
+        entry["method_returns"][name] = typ
+        entry["method_args"][name] = formals
 
     def get_signature(self, typ, func):
         try:
@@ -105,7 +183,7 @@ class Tables():
         return self.objects[clas]["method_args"][func]
 
     def set_field(self, field):
-        self.objects[self.current_object]["field_list"].add(field)
+        self.objects[self.current_object]["field_list"][field] = None
 
     def get_fields(self, clas):
         return self.objects[clas]["field_list"]
@@ -147,25 +225,15 @@ class Tables():
         return self.objects
         
     def get_common_class(self, first, second):
-        f = first
-        s = second
-        while f != s:
-            # get the ancestor class for each
-            f_anc = self.objects[f]["superclass"]
-            s_anc = self.objects[s]["superclass"]
-            if f_anc == s:
-                return s
-            elif s_anc == f:
-                return f
-            f = f_anc
-            s = s_anc
-
-            # i don't think this is needed, but just in case
-            if f == "Obj":
-                return f
-            if s == "Obj":
-                return s
-
-        return f
-            
-tables = Tables()
+        f = self.lineage[first]
+        s = self.lineage[second]
+        # the lineages agree from Obj down to the most specific common
+        # class and differ after it, so search for where they part
+        low, high = 0, min(len(f), len(s)) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if f[middle] == s[middle]:
+                low = middle
+            else:
+                high = middle - 1
+        return f[low]
@@ -1,36 +1,91 @@
 import quack_middle as qm
 from quack_visitor import ASTVisitor
-from quack_tables import tables
+from quack_tables import Tables
 
 class QuackTypeChecker(ASTVisitor):
-
-    def __init__(self):
-        self.modified: set = set({})
-        self.previous: set = set({})
-
-    def reset(self):
-        self.previous = self.modified.copy()
-        self.modified.clear()
-
-    def did_modify(self, modified):
-        self.modified.add(modified) 
-
-    def made_changes(self):
-        return self.modified != self.previous
-        
-    def VisitWhile(self, node: qm.WhileNode):
-        condition_type = node.condition.check_type(self)
+    '''
+    Infers variable types by widening them to a common class until
+    nothing changes. One walk of the AST checks every statement (and
+    every condition) once, noting the variables each one reads. After
+    that, only the statements reading a variable whose type changed are
+    checked again, round by round, until no type changes.
+    '''
+    def __init__(self, tables: Tables):
+        self.tables = tables
+        # statement -> (class it is checked in, how to check it, order)
+        self.statements: dict = {}
+        # symbol -> the statements that read it
+        self.dependents: dict = {}
+        self.pending: set = set()
+        # rounds of checking, including the walk of the AST, and how
+        # many statements and visitor calls they took, for the report
+        self.rounds = 0
+        self.checked = 0
+        self.visits = 0
+
+    def check_program(self, ast: qm.ASTNode):
+        ast.check_type(self)
+        self.changes()
+        self.rounds = 1
+        current = self.tables.current_object
+        order = lambda node: self.statements[node][2]
+        while self.pending:
+            self.rounds += 1
+            wave, self.pending = sorted(self.pending, key=order), set()
+            for node in wave:
+                self.tables.current_object, check, _ = self.statements[node]
+                self.check_statement(node, check)
+        self.tables.current_object = current
+
+    def check_statement(self, node: qm.ASTNode, check):
+        # check one statement or condition, remembering what it reads,
+        # and queue the statements that read a type it changed
+        if node not in self.statements:
+            self.statements[node] = (self.tables.current_object, check, len(self.statements))
+        self.checked += 1
+        self.tables.reads = set()
+        try:
+            typ = check()
+            for name in self.tables.reads:
+                self.dependents.setdefault(name, set()).add(node)
+        finally:
+            self.tables.reads = None
+        self.changes()
+        return typ
+
+    def changes(self):
+        for name in self.tables.changed:
+            self.pending.update(self.dependents.get(name, ()))
+        self.tables.changed.clear()
+
+    def report(self) -> str:
+        return (f"type checker: {self.checked} statements checked "
+                f"({self.visits} visits) in {self.rounds} rounds")
+
+    def check_expression(self, expression: qm.ASTNode) -> str:
+        self.visits += 1
+        return expression.check_type(self)
+
+    def check_condition(self, condition: qm.ASTNode) -> str:
+        self.visits += 1
+        condition_type = condition.check_type(self)
         if condition_type != "Bool":
             raise TypeError(f"{condition_type} is not 'Bool'")
+        return condition_type
+
+    def VisitWhile(self, node: qm.WhileNode):
+        self.visits += 1
+        self.check_statement(node.condition,
+                             lambda: self.check_condition(node.condition))
 
         node.block.check_type(self)
 
         return "Obj"
 
     def VisitIfStmt(self, node: qm.IfStmtNode):
-        condition_type = node.condition.check_type(self)
-        if condition_type != "Bool":
-            raise TypeError(f"{condition_type} is not 'Bool'")
+        self.visits += 1
+        self.check_statement(node.condition,
+                             lambda: self.check_condition(node.condition))
 
         if node.otherwise is not None:
             node.otherwise.check_type(self)
@@ -39,7 +94,14 @@ class QuackTypeChecker(ASTVisitor):
         
         return "Obj"
 
+    def VisitUnused(self, node: qm.UnusedStmtNode):
+        return self.check_statement(node, lambda: self.check_expression(node.statement))
+
+    def VisitReturn(self, node: qm.ReturnStmtNode):
+        return self.check_statement(node, lambda: self.check_expression(node.statement))
+
     def VisitComparison(self, node: qm.ComparisonNode):
+        self.visits += 1
         l_type = node.left.check_type(self)
         r_type = node.right.check_type(self)
         if node.op == "||":
@@ -55,11 +117,15 @@ class QuackTypeChecker(ASTVisitor):
                 raise TypeError(f"{r_type} is not 'Bool'")
 
         else:
-            tables.check_binop(l_type, r_type, node.op)
+            self.tables.check_binop(l_type, r_type, node.op)
             
         return "Bool"
 
     def VisitAssignment(self, node: qm.AssignmentNode):
+        return self.check_statement(node, lambda: self.assign(node))
+
+    def assign(self, node: qm.AssignmentNode):
+        self.visits += 1
         try:
             l_type = node.left.check_type(self)
         except NameError:
@@ -71,7 +137,6 @@ class QuackTypeChecker(ASTVisitor):
         # if l_type is none, the variable hasn't been
         # assigned a type yet. Let's do that here
         if l_type == None:
-            self.did_modify(l_type)
             node.left.set_type(r_type)
             node.set_type(r_type)
 
@@ -79,14 +144,14 @@ class QuackTypeChecker(ASTVisitor):
         # are different types, we find the most
         # specific common class
         elif l_type != r_type:
-            self.did_modify(l_type)
-            new_type = tables.get_common_class(l_type, r_type)
+            new_type = self.tables.get_common_class(l_type, r_type)
             node.left.set_type(new_type)
             return new_type
             
         return l_type
 
     def VisitCall(self, node: qm.CallNode):
+        self.visits += 1
         # We do various checks in the VisitCall method,
         # such as making sure the parameters are correct
         # but we will return the funtion signature
@@ -96,28 +161,30 @@ class QuackTypeChecker(ASTVisitor):
         # This returns function signature, but will throw error
         # if the function doesn't exist for this class
         callee_type = node.callee.check_type(self)
-        func_signature = tables.get_signature(callee_type, node.function)
+        func_signature = self.tables.get_signature(callee_type, node.function)
 
         # then check parameter types are correct
         param_types = []
         for element in node.params:
             param_types.append(element.get_type())
-            # param_types.append(tables.get_type(element))
+            # param_types.append(self.tables.get_type(element))
 
-        tables.check_parameters(callee_type, param_types, node.function)
+        self.tables.check_parameters(callee_type, param_types, node.function)
         
         return func_signature
     
     def VisitBinary(self, node: qm.BinaryOpNode):
+        self.visits += 1
         l_type = node.left.check_type(self)
         r_type = node.right.check_type(self)
         # TODO: type checking here to traverse type tree
-        tables.check_binop(l_type, r_type, node.op)
+        self.tables.check_binop(l_type, r_type, node.op)
 
         node.typ = l_type
         return l_type
 
     def VisitUnary(self, node: qm.UnaryOpNode):
+        self.visits += 1
         child_type = node.child.check_type(self)
         if node.op == "!":
             if child_type != "Bool":
@@ -125,6 +192,3 @@ class QuackTypeChecker(ASTVisitor):
 
         node.typ = child_type
         return child_type
-
-typechecker = QuackTypeChecker()
-
@@ -15,12 +15,19 @@ int main(int argc, char *argv[]) {
     char load_path[PATHBUFSIZE];
     int ok = 1;
     char *load_library = "./OBJ";
-    while ((opt = getopt(argc, argv, ":DL:")) != -1) {
+    while ((opt = getopt(argc, argv, ":DL:T:")) != -1) {
         switch (opt) {
             case 'L':
                 load_library = optarg;
                 fprintf(stderr, "Look in '%s' for object modules\n", optarg);
                 break;
+            case 'T':
+                vm_trace = fopen(optarg, "w");
+                if (! vm_trace) {
+                    perror(optarg);
+                    ok = 0;
+                }
+                break;
             case 'D':
                 fprintf(stderr, "Noisy debugging selected with -%c\n", opt);
                 set_log_level(DEBUG);
@@ -54,5 +61,8 @@ int main(int argc, char *argv[]) {
     } else {
         fprintf(stderr, "Errors, will not run\n");
     }
+    if (vm_trace) {
+        fclose(vm_trace);
+    }
     return 0;
 }
@@ -0,0 +1,79 @@
+"""Test script for Quack programs, compiled and run end to end.
+
+Each program listed in qk/TESTS.csv is built and run with
+quack_build.py --run, once as is and once with -O, and what it
+prints must match expect/Program_stdout.txt both times.  Run it
+from this directory, like tester.py.
+"""
+import subprocess
+import pathlib
+import csv
+
+import logging
+import sys
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+PY = "python3"
+ROOT = pathlib.Path("..")
+BUILD = "compiler/quack_build.py"
+OBJ = ROOT / "OBJ"
+MODES = {"": [], "_O": ["-O"]}
+
+
+def build_and_run(source: pathlib.Path, flags: list[str]) -> str:
+    """Build and run a program, returning what the program printed.
+    The build report comes first on stdout, and ends with the
+    timing line for the source.
+    """
+    before = set(OBJ.iterdir())
+    try:
+        proc = subprocess.run([PY, BUILD, *flags, "--run", str(source)],
+                              cwd=ROOT, text=True, capture_output=True)
+        proc.check_returncode()  # May throw CalledProcessError
+    finally:
+        for path in set(OBJ.iterdir()) - before:
+            path.unlink()
+    _, _, output = proc.stdout.partition(f"\n{source}: ")
+    return output.partition("\n")[2]
+
+
+def test_program(source: str) -> bool:
+    """Build, run and check one program, with and without -O"""
+    ok = True
+    program = pathlib.Path(source).stem
+    expected = pathlib.Path("expect/" + program + "_stdout.txt").read_text()
+    for suffix, flags in MODES.items():
+        observed_stdout = pathlib.Path("out/" + program + suffix + "_stdout.txt")
+        try:
+            output = build_and_run(pathlib.Path("tests") / source, flags)
+        except subprocess.CalledProcessError as e:
+            log.warning(f"Crashed: {e.cmd}\n{e.stdout}{e.stderr}")
+            ok = False
+            continue
+        observed_stdout.write_text(output)
+        if output == expected:
+            log.info(f"OK: {program} {' '.join(flags)} produced expected output")
+        else:
+            log.info(f"{program} {' '.join(flags)} output did not match expectation")
+            ok = False
+    return ok
+
+
+def main():
+    failed = False
+    with open("qk/TESTS.csv") as cases:
+        for case in csv.DictReader(cases):
+            source = case["Source"]
+            if not test_program(source):
+                print(f"*** Failed test case: {source}", file=sys.stderr)
+                failed = True
+    print("Testing complete")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
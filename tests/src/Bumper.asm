@@ -23,9 +23,9 @@
     const "\n===Pair 7,11 should appear above===\n"
     call String:print
     pop
-    const 10
     load pair
-    call Pair:bumpy
+    const 10
+    call Pair:bumpy 1
     pop
     load pair
     call Pair:print
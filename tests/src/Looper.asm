@@ -3,18 +3,18 @@
 .method $constructor
 .local  n
     enter
-    const 1
     new Counter
-    call Counter:$constructor
+    const 1
+    call Counter:$constructor 1
     store n
 
 loop:
     const "\nHead of loop\n"
     call String:print
     pop
-    const 10
     load n
-    call Counter:check
+    const 10
+    call Counter:check 1
     jump_if  done
 
     const "Body of loop\n"
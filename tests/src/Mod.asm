@@ -19,26 +19,26 @@
     store y
     jump whilecond_1
 whileloop_1:
-    load y
     load x
-    call Int:minus
+    load y
+    call Int:minus 1
     store x
 whilecond_1:
-    load y
     load x
-    call Int:atleast
+    load y
+    call Int:atleast 1
     jump_if whileloop_1
 whileend_1:
     jump whilecond_2
 whileloop_2:
-    load y
     load x
-    call Int:plus
+    load y
+    call Int:plus 1
     store x
 whilecond_2:
-    const 0
     load x
-    call Int:less
+    const 0
+    call Int:less 1
     jump_if whileloop_2
 whileend_2:
     load x
@@ -4,17 +4,17 @@
     enter
     const 7
     store m
-    load m
     new Mod
-    call Mod:$constructor
+    load m
+    call Mod:$constructor 1
     store modObj
     const 1
     store i
     jump whilecond_3
 whileloop_3:
-    load i
     load modObj
-    call Mod:mod
+    load i
+    call Mod:mod 1
     store x
     load i
     call Int:print
@@ -34,14 +34,14 @@ whileloop_3:
     const "\n"
     call String:print
     pop
-    const 1
     load i
-    call Int:plus
+    const 1
+    call Int:plus 1
     store i
 whilecond_3:
-    const 14
     load i
-    call Int:less
+    const 14
+    call Int:less 1
     jump_if whileloop_3
 whileend_3:
     load $
@@ -14,7 +14,7 @@
     store y
     load x
     load y
-    call Int:equals
+    call Int:equals 1
     jump_if same
     const "Five is not six.\n"
     call String:print
@@ -34,7 +34,7 @@ out:
     enter
     const 42
     const 42
-    call Int:equals
+    call Int:equals 1
     jump_if  same2
     const "42 is not 42, that is weird\n"
     call String:print
@@ -53,7 +53,7 @@ out2:
     # Reuse some labels here ... ok?
        const 84
        const 84
-       call Int:equals
+       call Int:equals 1
        jump_if  same2
        const "84 is not 84, that is weird\n"
        call String:print
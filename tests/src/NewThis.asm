@@ -23,10 +23,10 @@
 
 .method next
     enter
-    const 1
+    new $
     load $
     load_field $:x
-    call Int:plus
-    new $
-    call $:$constructor
+    const 1
+    call Int:plus 1
+    call $:$constructor 1
     return 0
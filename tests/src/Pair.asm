@@ -47,10 +47,10 @@
 
 .method bumpy   # Add an Int to the y field
 .args    increment
-    load increment
     load $
     load_field    $:y
-    call Int:plus
+    load increment
+    call Int:plus 1
     load $
     store_field  $:y
     const nothing
@@ -0,0 +1,35 @@
+# A tail-recursive method, called far deeper than the
+# frame stack could hold frames: tail_call reuses the frame
+#
+.class TailLoop:Obj
+.method sum forward
+
+.method $constructor
+    enter
+    load $
+    const 5000
+    const 0
+    call $:sum 2
+    call Int:print
+    pop
+    const "\n"
+    call String:print
+    return 0
+
+.method sum   # acc + n + (n - 1) + ... + 1
+.args n,acc
+    enter
+    load n
+    const 0
+    jump_int_eq done
+    load $
+    load n
+    const 1
+    int_sub
+    load acc
+    load n
+    int_add
+    tail_call $:sum 2
+done:
+    load acc
+    return 2
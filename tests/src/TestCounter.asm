@@ -4,9 +4,9 @@
 .method $constructor
 .local counter
     enter
-    const 5
     new Counter
-    call Counter:$constructor
+    const 5
+    call Counter:$constructor 1
     store counter
 
     const "Expecting '5' on next line\n"
@@ -29,18 +29,18 @@
     const "Counter is seven?\n"
     call String:print
     pop
-    const 7
     load counter
-    call Counter:check
+    const 7
+    call Counter:check 1
     call Obj:print
     pop
 
     const "\nCounter is six?\n"
     call String:print
     pop
-    const 6
     load counter
-    call Counter:check
+    const 6
+    call Counter:check 1
     call Obj:print
     pop
 
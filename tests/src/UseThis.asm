@@ -5,9 +5,9 @@
     const "\n*** Use This ***\n"
     call String:print
     pop
-    const 42
     new NewThis
-    call NewThis:$constructor
+    const 42
+    call NewThis:$constructor 1
     call NewThis:next
     load_field NewThis:x
     call Int:print
@@ -0,0 +1,105 @@
+"""Check that an incremental build reassembles the subclasses
+of a class whose layout changed.
+
+Builds a program with --incremental, adds a method to its superclass
+and builds it again, without a pool of workers and with one, and runs
+it each time.  Run it from this directory, like tester.py.
+"""
+import subprocess
+import tempfile
+import pathlib
+
+import logging
+import sys
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+PY = "python3"
+ROOT = pathlib.Path("..")
+BUILD = "compiler/quack_build.py"
+PROGRAM = "ParentChange"
+CLASSES = ["Parent", "Child", PROGRAM]
+
+BASE = """class Parent(k: Int) {
+  m = k;
+  def first(n: Int) : Int {
+    return n;
+  }
+}
+"""
+
+# the same class with a method more, which moves the methods of
+# Child along its vtable: in a stale Child, second is where first
+# now is, and p.first(z) prints 9
+CHANGED_BASE = """class Parent(k: Int) {
+  m = k;
+  def zeroth(n: Int) : Int {
+    return n.times(100);
+  }
+  def first(n: Int) : Int {
+    return n;
+  }
+}
+"""
+
+DERIVED = """class Child(j: Int) extends Parent {
+  m = j;
+  def first(n: Int) : Int {
+    return n.plus(1);
+  }
+  def second(n: Int) : Int {
+    return n.times(3);
+  }
+}
+p: Parent = Child(2);
+"""
+
+# the main program before and after, using the new method
+MAIN = "p.first(20).print();\n"
+CHANGED_MAIN = "z = p.zeroth(2);\np.first(z).print();\n"
+
+
+def build(source: pathlib.Path, cache: pathlib.Path, jobs: int) -> str:
+    """Build and run the program incrementally, returning what it printed"""
+    proc = subprocess.run([PY, BUILD, "--incremental", "--cache", str(cache),
+                           "-j", str(jobs), "--run", str(source)],
+                          cwd=ROOT, text=True, capture_output=True)
+    proc.check_returncode()  # May throw CalledProcessError
+    return proc.stdout
+
+
+def check_changed_superclass(jobs: int) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        source = pathlib.Path(tmp).resolve() / f"{PROGRAM}.qk"
+        cache = pathlib.Path(tmp).resolve() / "cache.json"
+        try:
+            source.write_text(BASE + DERIVED + MAIN)
+            build(source, cache, jobs)
+            source.write_text(CHANGED_BASE + DERIVED + CHANGED_MAIN)
+            output = build(source, cache, jobs)
+        except subprocess.CalledProcessError as e:
+            log.warning(f"Crashed: {e.cmd}\n{e.stderr}")
+            return False
+        finally:
+            for name in CLASSES:
+                (ROOT / "OBJ" / f"{name}.json").unlink(missing_ok=True)
+    if not output.rstrip().endswith("201"):
+        log.info(f"-j {jobs}: expected 201 after changing the superclass, got\n{output}")
+        return False
+    log.info(f"OK: -j {jobs} rebuilt the subclass")
+    return True
+
+
+def main():
+    failed = [jobs for jobs in (1, 2) if not check_changed_superclass(jobs)]
+    for jobs in failed:
+        print(f"*** Failed test case: incremental -j {jobs}", file=sys.stderr)
+    print("Testing complete")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Throughput of the assembler's line tokenizer.
+
+Generates a large assembly file (100k lines by default) and assembles
+it with assemble.translate and with the regex cascade it replaced,
+which tried each directive pattern and then the instruction pattern on
+every line.  Both must produce the same object code; the benchmark
+reports lines per second for each and the gain.
+
+    python3 tools/bench_assembler.py [--lines 100000] [--runs 3]
+
+Run it from the repository root, like the assembler.
+"""
+import argparse
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import assemble
+from assemble import (ARGS_DECL_PAT, CLASS_DECL_PAT, FIELD_DECL_PAT,
+                      INSTRS, LOCALS_DECL_PAT, METHOD_DECL_PAT,
+                      METHOD_DEF_PAT, Instruction, ObjectCode,
+                      strip_comments)
+
+# The patterns of the old cascade that translate no longer uses
+INSTR_PAT = re.compile(r"""
+    ((?P<label> \w+) [:] )?   # Optional label
+    \s*
+    (?P<opname> [a-zA-Z_]+)      # Operation name is required
+    (\s+ (?P<operand>     # Operands are integers, quoted strings, or names
+             [0-9]+           # Integers are strings of digits
+           |
+             ["](             # String begins and ends with quote
+               ([\\].)  |           # Anything escaped
+               [^"\\]               # Anything but a quote or escape
+             )*["]
+           |
+             (\w|[:$])+         # name, which may be part:part or $:part
+             )
+    )?                # Operand is optional
+   \s*
+    """, re.VERBOSE)
+
+LABEL_PAT = re.compile(r"""
+    ((?P<label> \w+):)   # Nothing but the label
+   \s*
+    """, re.VERBOSE)
+
+
+def cascade_translate(lines: list) -> ObjectCode:
+    """translate() as it was: every pattern in turn on every line"""
+    code = ObjectCode()
+    for line in lines:
+        line = strip_comments(line)
+        if not line:
+            continue
+        match = CLASS_DECL_PAT.match(line)
+        if match:
+            code.declare_class(match["class_name"], match["super_name"])
+            continue
+        match = METHOD_DECL_PAT.match(line)
+        if match:
+            code.declare_method(match["method_name"])
+            continue
+        match = METHOD_DEF_PAT.match(line)
+        if match:
+            code.begin_method(match["method_name"])
+            continue
+        match = FIELD_DECL_PAT.match(line)
+        if match:
+            code.declare_field(match["field_name"])
+            continue
+        match = LOCALS_DECL_PAT.match(line)
+        if match:
+            method_locals = match["local_var_name"].split(",")
+            code.add_instruction(Instruction(None, INSTRS["alloc"],
+                                             len(method_locals)))
+            code.declare_locals(method_locals)
+            continue
+        match = ARGS_DECL_PAT.match(line)
+        if match:
+            code.declare_args(match["arg_var_name"].split(","))
+            continue
+        match = INSTR_PAT.fullmatch(line)
+        if match:
+            code.add_instruction(Instruction(match["label"],
+                                             INSTRS[match["opname"]],
+                                             match["operand"]))
+            continue
+        match = LABEL_PAT.match(line)
+        if not match:
+            assemble.log.error(f"NO MATCH on '{line}'")
+            continue
+        code.add_label(match["label"])
+    code.end_method()
+    return code
+
+
+def generate(n_lines: int) -> list:
+    """One class whose methods look like compiler output: locals,
+    constants, calls to builtins, fields, and a loop with labels.
+    """
+    lines = [".class Bench:Obj", ".field count", ".field name"]
+    method = 0
+    while len(lines) < n_lines:
+        lines += [
+            f".method m{method}",
+            ".args x,y",
+            ".local i,s,t   # loop counter and accumulators",
+            "    enter",
+            "    const 0",
+            "    store i",
+            '    const "row\\t"',
+            "    store s",
+            f"    jump cmp{method}",
+            f"body{method}:",
+            "    load i",
+            "    const 1",
+            "    call Int:plus",
+            "    store i",
+            "    load s",
+            "    load $",
+            "    load_field $:name",
+            "    call String:plus",
+            "    store s",
+            f"cmp{method}: load i",
+            "    load x",
+            "    call Int:less",
+            f"    jump_if body{method}",
+            "    load s",
+            "    call String:print",
+            "    load $",
+            "    load_field $:count",
+            "    load y",
+            "    call Int:plus",
+            "    load $",
+            "    store_field $:count",
+            "    const nothing",
+            "    return 2",
+        ]
+        method += 1
+    return lines
+
+
+def best_time(translate, lines: list, runs: int) -> float:
+    best = None
+    for _ in range(runs):
+        assemble.forget_module("Obj")
+        started = time.perf_counter()
+        translate(lines)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser(description="Benchmark the assembler's tokenizer")
+    parser.add_argument("--lines", type=int, default=100000,
+                        help="Size of the generated assembly file")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="Take the best of this many runs")
+    return parser.parse_args()
+
+
+def main():
+    args = cli()
+    # jump resolution logs every jump at debug level
+    assemble.log.setLevel(logging.INFO)
+    lines = generate(args.lines)
+
+    if assemble.translate(lines).json() != cascade_translate(lines).json():
+        print("Object code differs from the regex cascade", file=sys.stderr)
+        sys.exit(1)
+
+    old = best_time(cascade_translate, lines, args.runs)
+    new = best_time(assemble.translate, lines, args.runs)
+    for name, seconds in [("cascade", old), ("tokenizer", new)]:
+        print(f"{name:10s} {seconds * 1000:8.1f} ms  "
+              f"{len(lines) / seconds:10.0f} lines/s")
+    print(f"{len(lines)} lines, {old / new:.2f}x throughput")
+
+
+if __name__ == "__main__":
+    main()
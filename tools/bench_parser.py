@@ -0,0 +1,113 @@
+"""Time and memory of building the AST from Quack source.
+
+Generates a large Quack program (several thousand lines by default)
+and builds its AST two ways: by parsing into a parse tree and then
+transforming the tree with ASTBuilder, as the front end used to, and
+with ASTBuilder as the parser's inline transformer, as it does now.
+The benchmark reports the time of each, the peak memory allocated
+while building, and the memory the finished AST keeps.
+
+    python3 tools/bench_parser.py [--classes 300] [--runs 3]
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "compiler"))
+
+from quack_lalr import new_parser
+from quack_middle import ASTBuilder
+from quack_tables import Tables
+
+
+def generate(n_classes: int) -> str:
+    """Classes with fields, loops, conditions and arithmetic, and a
+    main program that makes and calls each of them.
+    """
+    lines = []
+    for i in range(n_classes):
+        lines += [
+            f"class C{i}(x: Int) {{",
+            "  this.x = x;",
+            "  def step(n: Int) : Int {",
+            "    total = 0;",
+            "    i = 0;",
+            "    while i < n {",
+            f"      if i == {i % 7} {{",
+            "        total = total + this.x * 2;",
+            "      } else {",
+            "        total = total - (i + 1) / 2;",
+            "      }",
+            "      i = i + 1;",
+            "    }",
+            "    return total;",
+            "  }",
+            "}",
+        ]
+    for i in range(n_classes):
+        lines += [f"c{i} = C{i}({i});",
+                  f"c{i}.step({i % 10}).print();"]
+    return "\n".join(lines) + "\n"
+
+
+def measure(build, runs: int) -> tuple:
+    """Best time, and the peak and retained allocations of one run"""
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        build()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    ast = build()
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ast
+    return best, peak, kept
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser(description="Benchmark building the Quack AST")
+    parser.add_argument("--classes", type=int, default=300,
+                        help="Classes in the generated program, 16 lines each")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="Take the best time of this many runs")
+    return parser.parse_args()
+
+
+def main():
+    args = cli()
+    # statement lists nest on the left, so the parse tree of a long
+    # program is deep, and transforming it recurses all the way down
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * args.classes))
+    source = generate(args.classes)
+    n_lines = source.count("\n")
+
+    tree_parser = new_parser()
+    builder = ASTBuilder()
+    inline_parser = new_parser(transformer=builder)
+
+    def two_trees():
+        return ASTBuilder(Tables()).transform(tree_parser.parse(source))
+
+    def inline():
+        builder.tables = Tables()
+        return inline_parser.parse(source)
+
+    results = {}
+    for name, build in [("two trees", two_trees), ("inline", inline)]:
+        results[name] = measure(build, args.runs)
+        seconds, peak, kept = results[name]
+        print(f"{name:10s} {seconds * 1000:8.1f} ms  "
+              f"peak {peak / 2**20:6.1f} MiB  AST {kept / 2**20:6.1f} MiB")
+
+    old, new = results["two trees"], results["inline"]
+    print(f"{n_lines} lines, {old[0] / new[0]:.2f}x faster, "
+          f"{old[1] / new[1]:.2f}x less peak memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Startup-time budget for the compiler and assembler.
+
+Compiles and assembles a hello-world program in fresh interpreters,
+as ./quack does, and fails if the wall-clock time goes over budget.
+Each stage runs under -X importtime so that a regression can be
+traced to the module that caused it.
+
+    python3 tools/bench_startup.py [--budget 0.4] [--runs 3]
+"""
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PY = sys.executable
+BUILTINS = ["Bool.json", "Int.json", "Nothing.json", "Obj.json", "String.json"]
+ASMREQS = ["asm.conf", "opdefs.txt"]
+HELLO = '"Hello world\\n".print();\n'
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser(description="Check compiler and assembler startup time")
+    parser.add_argument("--budget", type=float, default=0.4,
+                        help="Seconds allowed for compile plus assemble")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="Take the best of this many runs")
+    parser.add_argument("--top", type=int, default=5,
+                        help="Number of slowest imports to list per stage")
+    return parser.parse_args()
+
+
+def setup(workdir: Path):
+    """The compiler and assembler expect to run from a directory
+    with asm/ and OBJ/ and the assembler configuration.
+    """
+    workdir.joinpath("asm").mkdir()
+    workdir.joinpath("OBJ").mkdir()
+    for objfile in BUILTINS:
+        shutil.copyfile(ROOT.joinpath("OBJ", objfile),
+                        workdir.joinpath("OBJ", objfile))
+    for asmreq in ASMREQS:
+        shutil.copyfile(ROOT.joinpath(asmreq), workdir.joinpath(asmreq))
+    workdir.joinpath("hello.qk").write_text(HELLO)
+
+
+def run_stage(cmd: list, workdir: Path) -> tuple:
+    """Run one stage; return elapsed seconds and its
+    -X importtime records as (cumulative us, module).
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([PY, "-X", "importtime"] + cmd, cwd=workdir,
+                          text=True, capture_output=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        print(proc.stderr, file=sys.stderr)
+        raise RuntimeError(f"Stage failed: {' '.join(cmd)}")
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        # Only top-level imports; nested ones are counted in them
+        if not module.startswith("  "):
+            imports.append((int(cumulative), module.strip()))
+    return elapsed, sorted(imports, reverse=True)
+
+
+def main():
+    args = cli()
+    stages = [
+        ("compile", [str(ROOT.joinpath("compiler", "quack_frontend.py")),
+                     "-i", "hello.qk", "-o", "asm/hello.asm", "-c", "hello"]),
+        ("assemble", [str(ROOT.joinpath("assemble.py")),
+                      "asm/hello.asm", "OBJ/hello.json"]),
+    ]
+    best = {name: None for name, _ in stages}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        setup(workdir)
+        # One untimed run, so a stale parser module is
+        # regenerated before we start measuring
+        for name, cmd in stages:
+            run_stage(cmd, workdir)
+        for _ in range(args.runs):
+            for name, cmd in stages:
+                result = run_stage(cmd, workdir)
+                if best[name] is None or result[0] < best[name][0]:
+                    best[name] = result
+
+    total = 0.0
+    for name, (elapsed, imports) in best.items():
+        total += elapsed
+        print(f"{name:10s} {elapsed * 1000:8.1f} ms")
+        for cumulative, module in imports[:args.top]:
+            print(f"    {cumulative / 1000:8.1f} ms  import {module}")
+    print(f"{'total':10s} {total * 1000:8.1f} ms  (budget {args.budget * 1000:.0f} ms)")
+    if total > args.budget:
+        print("Startup budget exceeded", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""Mine superinstructions from traces of real programs.
+
+Every operation the tiny_vm executes costs a dispatch (fetch the
+instruction, call through its function pointer, check the builtins),
+however little the operation itself does, and compiled Quack is mostly
+short runs such as "load; const; call".  A superinstruction
+does the work of such a run in one dispatch.
+
+    python3 tools/superinstructions.py mine [--top 8] [--write]
+    python3 tools/superinstructions.py report
+
+"mine" compiles and runs a corpus (src/fib_20.qk and the runnable
+programs of tests/src, by default) on bin/tiny_vm -T, which writes
+the address and name of each operation it dispatches, and counts the
+sequences of operations in those traces.  It picks the sequence that saves the most
+dispatches, replaces it in the traces, and repeats, so a later pick may
+extend an earlier one.  With --write it puts the superinstructions in
+opdefs.txt (and the copy in tests/), where build_bytecode_table.py and
+the assembler find them, and writes their implementations in vm_ops.c
+and vm_ops.h.  Rebuild the VM afterward.
+
+A sequence never continues past a jump, call or return, since the next
+operation executed is not the next one in the code, and it never
+includes operations that only the builtins use.  Nor does it continue
+into an operation that the program ever lands on from a jump: that is
+a label in the assembly, and the assembler leaves runs across labels
+alone.  "report" runs the corpus with and without superinstructions,
+checks that the output is the same, and compares the number of
+dispatches.
+
+Run it from the repository root, after building the VM.
+"""
+import argparse
+import csv
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PY = sys.executable
+VM = ROOT.joinpath("bin", "tiny_vm")
+BUILTINS = ["Bool.json", "Int.json", "Nothing.json", "Obj.json", "String.json"]
+PROGRAMS = [ROOT.joinpath("src", "fib_20.qk")]
+TESTS = ROOT.joinpath("tests", "src")
+
+# The next operation executed does not follow these in the code
+TRANSFERS = {"call", "tail_call", "jump", "jump_if", "jump_ifnot", "return", "halt",
+             "jump_int_eq", "jump_int_ne", "jump_int_lt", "jump_int_le",
+             "jump_int_gt", "jump_int_ge", "jump_eq", "jump_ne"}
+# Only the builtins' code uses these, or the assembler removes them
+UNFUSED = {"enter", "call_native", "halt"}
+
+BEGIN = "Superinstructions, generated by tools/superinstructions.py"
+END = "End of superinstructions"
+OPDEFS = [ROOT.joinpath("opdefs.txt"), ROOT.joinpath("tests", "opdefs.txt")]
+VM_OPS_C = ROOT.joinpath("vm_ops.c")
+VM_OPS_H = ROOT.joinpath("vm_ops.h")
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser(description="Mine superinstructions from VM traces")
+    sub = parser.add_subparsers(dest="command", required=True)
+    mine = sub.add_parser("mine", help="Find the most profitable sequences")
+    mine.add_argument("--top", type=int, default=8,
+                      help="Number of superinstructions to make")
+    mine.add_argument("--max-length", type=int, default=4,
+                      help="Most operations in one superinstruction")
+    mine.add_argument("--write", action="store_true",
+                      help="Write them to opdefs.txt and vm_ops.c")
+    sub.add_parser("report", help="Dispatches with and without superinstructions")
+    return parser.parse_args()
+
+
+# ----------------
+#  Running the corpus
+# ----------------
+
+def read_opdefs(path: Path) -> list:
+    """(name, vm function, operand count, parts) for each operation"""
+    ops = []
+    for line in path.read_text().splitlines():
+        line = line.split("#")[0].strip()
+        if not line:
+            continue
+        fields = line.split(",")
+        parts = fields[3].split() if len(fields) == 4 else []
+        ops.append((fields[0], fields[1], int(fields[2]), parts))
+    return ops
+
+
+def base_opdefs() -> str:
+    """opdefs.txt without its superinstructions, so that the
+    assembler uses none, but with the same opcodes for the rest
+    """
+    lines = []
+    for line in ROOT.joinpath("opdefs.txt").read_text().splitlines():
+        if len(line.split("#")[0].split(",")) < 4:
+            lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def setup(workdir: Path, fused: bool):
+    """A directory to build and run in, as for ./quack"""
+    workdir.joinpath("asm").mkdir()
+    workdir.joinpath("OBJ").mkdir()
+    for objfile in BUILTINS:
+        shutil.copyfile(ROOT.joinpath("OBJ", objfile),
+                        workdir.joinpath("OBJ", objfile))
+    shutil.copyfile(ROOT.joinpath("asm.conf"), workdir.joinpath("asm.conf"))
+    opdefs = workdir.joinpath("opdefs.txt")
+    if fused:
+        shutil.copyfile(ROOT.joinpath("opdefs.txt"), opdefs)
+    else:
+        opdefs.write_text(base_opdefs())
+
+
+def run(cmd: list, workdir: Path) -> str:
+    proc = subprocess.run(cmd, cwd=workdir, text=True, capture_output=True)
+    if proc.returncode != 0:
+        print(proc.stderr, file=sys.stderr)
+        raise RuntimeError(f"Failed: {' '.join(str(c) for c in cmd)}")
+    return proc.stdout
+
+
+def trace(main_class: str, workdir: Path) -> tuple:
+    """Program output and the (address, name) of each operation it
+    dispatched
+    """
+    trace_path = workdir.joinpath(f"{main_class}.trace")
+    output = run([VM, "-L", "OBJ", "-T", trace_path, main_class], workdir)
+    steps = [line.split() for line in trace_path.read_text().splitlines()]
+    return output, [(int(address), name) for address, name in steps]
+
+
+def run_corpus(fused: bool) -> dict:
+    """program -> (output, trace), for each program in the corpus"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        setup(workdir, fused)
+        for program in PROGRAMS:
+            run([PY, ROOT.joinpath("compiler", "quack_build.py"), program], workdir)
+            results[program.name] = trace(program.stem, workdir)
+        with open(TESTS.joinpath("TESTS.csv"), newline="") as f:
+            tests = list(csv.DictReader(f))
+        for test in tests:
+            name = test["Class"]
+            run([PY, ROOT.joinpath("assemble.py"), TESTS.joinpath(f"{name}.asm"),
+                 workdir.joinpath("OBJ", f"{name}.json")], workdir)
+        for test in tests:
+            if test["Action"] == "run":
+                results[f"tests/{test['Class']}"] = trace(test["Class"], workdir)
+    return results
+
+
+# ----------------
+#  Mining
+# ----------------
+
+def segments(trace: list) -> list:
+    """Runs of operations that could be fused, each a list of tokens.
+    A token is a tuple of operation names, one name to begin with.
+    """
+    # where control arrives other than by falling through
+    targets = {address for (_, before), (address, _) in zip(trace, trace[1:])
+               if before in TRANSFERS}
+    runs = []
+    ops = []
+    for address, name in trace:
+        if address in targets and ops:
+            runs.append(ops)
+            ops = []
+        if name in UNFUSED:
+            if ops:
+                runs.append(ops)
+            ops = []
+            continue
+        ops.append((name,))
+        if name in TRANSFERS:
+            runs.append(ops)
+            ops = []
+    if ops:
+        runs.append(ops)
+    return runs
+
+
+def count_sequences(runs: list, max_length: int) -> Counter:
+    """Occurrences of each sequence of two or more tokens whose
+    operations number at most max_length.  A transfer can only
+    end a run, so it can only end a sequence.
+    """
+    counts = Counter()
+    for ops in runs:
+        for i in range(len(ops)):
+            parts = ops[i]
+            for j in range(i + 1, len(ops)):
+                parts = parts + ops[j]
+                if len(parts) > max_length:
+                    break
+                counts[j - i + 1, parts] += 1
+    return counts
+
+
+def replace(runs: list, parts: tuple) -> int:
+    """Replace occurrences of the tokens that make up parts by one
+    token, left to right; return the number of dispatches saved.
+    """
+    saved = 0
+    for ops in runs:
+        i = 0
+        while i < len(ops):
+            j, joined = i, ()
+            while j < len(ops) and len(joined) < len(parts):
+                joined += ops[j]
+                j += 1
+            if joined == parts:
+                ops[i:j] = [parts]
+                saved += j - i - 1
+            i += 1
+    return saved
+
+
+def mine(traces: list, top: int, max_length: int) -> list:
+    """(parts, dispatches saved) for each superinstruction, best first"""
+    runs = [run for trace in traces for run in segments(trace)]
+    chosen = []
+    while len(chosen) < top:
+        counts = count_sequences(runs, max_length)
+        if not counts:
+            break
+        (n_tokens, parts), count = max(counts.items(),
+                                       key=lambda item: item[1] * (item[0][0] - 1))
+        if count < 2:
+            break
+        chosen.append((parts, replace(runs, parts)))
+    return chosen
+
+
+# ----------------
+#  Writing the superinstructions
+# ----------------
+
+def op_name(parts: tuple) -> str:
+    return "_".join(parts)
+
+
+def replace_section(text: str, section: str, begin: str, end: str) -> str:
+    """Put section between the begin and end marker lines,
+    replacing what is there, or at the end of the text
+    """
+    pattern = re.compile(re.escape(begin) + r".*?" + re.escape(end) + r"[^\n]*\n",
+                         re.DOTALL)
+    if pattern.search(text):
+        return pattern.sub(lambda _: section, text)
+    return text.rstrip("\n") + "\n\n" + section
+
+
+def opdefs_section(chosen: list, ops: dict) -> str:
+    lines = [f"# {BEGIN} from",
+             "# traces of the corpus it runs.  Rerun it rather than edit them.",
+             "# name,vm function,operands,the operations it combines"]
+    for parts, saved in chosen:
+        name = op_name(parts)
+        n_operands = sum(ops[part][1] for part in parts)
+        lines.append(f"{name},vm_op_{name},{n_operands},{' '.join(parts)}"
+                     f"  # {saved} dispatches saved")
+    lines.append(f"# {END}")
+    return "\n".join(lines) + "\n"
+
+
+def c_section(chosen: list, ops: dict) -> str:
+    lines = [f"/* {BEGIN}.",
+             " * Each does the work of its parts in one dispatch; the parts",
+             " * fetch their own operands, in order, as they would have.",
+             " */"]
+    for parts, _ in chosen:
+        lines.append(f"extern void vm_op_{op_name(parts)}() {{")
+        for part in parts:
+            lines.append(f"    {ops[part][0]}();")
+        lines.append("}")
+        lines.append("")
+    lines.append(f"/* {END} */")
+    return "\n".join(lines) + "\n"
+
+
+def h_section(chosen: list) -> str:
+    lines = [f"/* {BEGIN} */"]
+    for parts, _ in chosen:
+        lines.append(f"extern void vm_op_{op_name(parts)}();  // {' '.join(parts)}")
+    lines.append(f"/* {END} */")
+    return "\n".join(lines) + "\n"
+
+
+def write(chosen: list):
+    ops = {name: (func, n_operands)
+           for name, func, n_operands, parts in read_opdefs(ROOT.joinpath("opdefs.txt"))
+           if not parts}
+    section = opdefs_section(chosen, ops)
+    for path in OPDEFS:
+        path.write_text(replace_section(base_opdefs(), section, f"# {BEGIN}", f"# {END}"))
+    VM_OPS_C.write_text(replace_section(VM_OPS_C.read_text(), c_section(chosen, ops),
+                                        f"/* {BEGIN}", f"/* {END}"))
+    header = VM_OPS_H.read_text()
+    endif = header.rindex("#endif")
+    body = replace_section(header[:endif], h_section(chosen),
+                           f"/* {BEGIN}", f"/* {END}")
+    VM_OPS_H.write_text(body + "\n" + header[endif:])
+
+
+# ----------------
+#  Main
+# ----------------
+
+def report():
+    before = run_corpus(fused=False)
+    after = run_corpus(fused=True)
+    fused_names = {name for name, _, _, parts in read_opdefs(ROOT.joinpath("opdefs.txt"))
+                   if parts}
+    print(f"{'program':32s} {'before':>8s} {'after':>8s} {'saved':>7s}")
+    total_before = total_after = 0
+    used = Counter()
+    for program, (output, trace) in before.items():
+        fused_output, fused_trace = after[program]
+        if fused_output != output:
+            print(f"Output of {program} differs with superinstructions", file=sys.stderr)
+            sys.exit(1)
+        total_before += len(trace)
+        total_after += len(fused_trace)
+        used.update(name for _, name in fused_trace if name in fused_names)
+        saved = 1 - len(fused_trace) / len(trace)
+        print(f"{program:32s} {len(trace):8d} {len(fused_trace):8d} {saved:7.1%}")
+    saved = 1 - total_after / total_before
+    print(f"{'total':32s} {total_before:8d} {total_after:8d} {saved:7.1%}")
+    for name, count in used.most_common():
+        print(f"    {count:8d}  {name}")
+
+
+def main():
+    args = cli()
+    if args.command == "report":
+        report()
+        return
+    results = run_corpus(fused=False)
+    total = sum(len(trace) for _, trace in results.values())
+    chosen = mine([trace for _, trace in results.values()], args.top, args.max_length)
+    print(f"{total} dispatches in {len(results)} programs")
+    for parts, saved in chosen:
+        print(f"{saved:8d} saved  {' '.join(parts)}")
+    if args.write:
+        write(chosen)
+        print("Wrote opdefs.txt and vm_ops.c; rebuild the VM")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,10 +14,10 @@
 
 .method inc
     enter
-    const 1
     load $
     load_field $:i
-    call Int:plus
+    const 1
+    call Int:plus 1
     load $
     store_field $:i
     const nothing
@@ -26,10 +26,10 @@
 # check if counter has reached value; return Boolean
 .method check
 .args value
-    load value
     load $
     load_field $:i
-    call Int:equals
+    load value
+    call Int:equals 1
     return 1
 
 .method print
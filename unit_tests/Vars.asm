@@ -6,7 +6,7 @@ const 3
 store x
 load x
 load x
-call Int:times
+call Int:times 1
 store x
 pop
 return 0
@@ -1,13 +1,13 @@
 .class Sample:Obj
 
 .method $constructor
-const  10
+const  2
 const  5
-call Int:minus
+const  10
+call Int:minus 1
 const  6
-call Int:times
-const  2
-call Int:divide
+call Int:times 1
+call Int:divide 1
 call String:print
 pop
 return 0
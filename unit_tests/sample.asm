@@ -13,7 +13,7 @@
     pop
      const 418
      const 383
-    call Int:plus
+    call Int:plus 1
      call Int:print
      pop
     const "\n"
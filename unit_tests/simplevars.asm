@@ -16,7 +16,7 @@
 
 	load x
 	load x
-	call Int:times
+	call Int:times 1
 	store y
 	const "expect y = 9: "
 	call String:print
@@ -53,9 +53,9 @@
     call String:print
     pop
 
-    const 20
     load pair2
-    call  Pair:bumpy
+    const 20
+    call  Pair:bumpy 1
     pop
     load pair2
     call Pair:print
@@ -3,6 +3,12 @@
  * names and implementing functions.  The table contents in
  * vm_code_table.c are generated automatically from opdefs.txt,
  * and that file should not be edited manually.
+ *
+ * A superinstruction does the work of a sequence of operations
+ * in one dispatch.  Its parts are the names of those operations,
+ * separated by spaces (NULL for an ordinary operation), and its
+ * operands are theirs, in the same order.  The loader translates
+ * each operand as the part it belongs to would.
  */
 
 #ifndef TINY_VM_VM_CODE_TABLE_H
@@ -15,6 +21,7 @@ typedef struct {
     char *name;
     vm_Instr instr;
     int n_operands;
+    char *parts;
 } op_tbl_entry;
 
 extern op_tbl_entry vm_op_bytecodes[];
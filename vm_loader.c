@@ -10,6 +10,11 @@
 #include <stdlib.h>
 #include <string.h>
 #include <assert.h>
+#include <stdint.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 
 
 // Set load library path before loading each class by name.
@@ -68,7 +73,8 @@ void vm_loader_init(char *load_path_prefix) {
     vm_code_block[1] = (vm_Word) {.intval = no_main};
     vm_code_block[2] = (vm_Word) {.instr = vm_op_methodcall};
     vm_code_block[3] = (vm_Word) {.intval = 2}; // "print" method
-    vm_code_block[4] = (vm_Word) {.instr = vm_op_halt};
+    vm_code_block[4] = (vm_Word) {.intval = 0}; // with no arguments
+    vm_code_block[5] = (vm_Word) {.instr = vm_op_halt};
     //
     // The named constant literals
     create_const_value("$nothing", nothing);
@@ -87,8 +93,9 @@ void vm_loader_set_main(char *main_class_name) {
     vm_code_block[1] = (vm_Word) {.clazz = main_class};
     vm_code_block[2] = (vm_Word) {.instr = vm_op_methodcall};
     vm_code_block[3] = (vm_Word) {.intval = 0}; // Constructor method slot
-    vm_code_block[4] = (vm_Word) {.instr = vm_op_pop};
-    vm_code_block[5] = (vm_Word) {.instr = vm_op_halt};
+    vm_code_block[4] = (vm_Word) {.intval = 0}; // with no arguments
+    vm_code_block[5] = (vm_Word) {.instr = vm_op_pop};
+    vm_code_block[6] = (vm_Word) {.instr = vm_op_halt};
 }
 
 
@@ -118,34 +125,34 @@ class_ref ensure_loaded(char *class_name) {
 
 
 
-// Capacity limit:  For simplicity we read into a
-// buffer of 20k bytes.
-//
-#define FILE_BUFFER_CAPACITY (1024 * 100 * sizeof(char))
-
-
-/* read_file_fd
- * returns 0 (failure) or 1 (success)
+/* Read a whole file into a malloc'd, NUL-terminated buffer,
+ * or return 0 on failure.  The caller frees the buffer.
  */
-int read_file_fd(FILE *fd, char *file_buffer) {
-    int pos = 0;
-    char ch;
-    /* Simple, not efficient. */
-    while (1) {
-        ch = fgetc(fd);
-        if (feof(fd)) {
-            break;
-        } else if (ferror(fd)) {
-            perror("Error reading file");
-            break;
-        }
-        file_buffer[pos++] = ch;
+static char *read_file(char *path) {
+    FILE *fd = fopen(path, "r");
+    if (! fd) {
+        perror("Failed to open file");
+        return 0;
     }
-    // Do we need to add the null byte?  Maybe.
-    file_buffer[pos] = 0;
-    return 1;
+    fseek(fd, 0, SEEK_END);
+    long size = ftell(fd);
+    rewind(fd);
+    char *file_buffer = malloc(size + 1);
+    size_t n_read = fread(file_buffer, 1, size, fd);
+    if (ferror(fd)) {
+        perror("Error reading file");
+    }
+    file_buffer[n_read] = 0;
+    fclose(fd);
+    return file_buffer;
 }
 
+static vm_Word translate_operand(int opcode, int operand,
+                                 int const_map[], class_ref class_map[]);
+
+#define MAX_OPERANDS 8   // Of a superinstruction
+static int operand_owners(int opcode, int owners[]);
+
 vm_Word *translate_method_code(cJSON *ops, int const_map[], class_ref class_map[]);
 
 /*
@@ -158,6 +165,18 @@ vm_Word *translate_method_code(cJSON *ops, int const_map[], class_ref class_map[
  * (Java, in contrast, maintains a separate constant pool for each
  * class at run-time.)
  */
+static int remap_constant(char *kind, char *literal) {
+    int internal = 0;
+    if (kind[0] == 'i') {
+        internal = int_literal_const(literal);
+    } else if (kind[0] == 's') {
+        internal = str_literal_const(strdup(literal));
+    } else {
+        perror("Constant of unknown type");
+    }
+    return internal;
+}
+
 static int remap_constants(int map[], cJSON *tree, int capacity) {
     cJSON *constants = cJSON_GetObjectItemCaseSensitive(tree,
                                            "constants");
@@ -172,14 +191,7 @@ static int remap_constants(int map[], cJSON *tree, int capacity) {
         cJSON *value_el = cJSON_GetObjectItemCaseSensitive(el, "value");
         char *kind = kind_el->valuestring;
         char *literal = value_el->valuestring;
-        int internal;
-        if (kind[0] == 'i') {
-            internal = int_literal_const(literal);
-        } else if (kind[0] == 's') {
-            internal = str_literal_const(strdup(literal));
-        } else {
-            perror("Constant of unknown type");
-        }
+        int internal = remap_constant(kind, literal);
         map[literal_count] = internal;
         log_debug("Literal %s internal %d remapped to %d",
                   literal, literal_count, internal);
@@ -215,36 +227,13 @@ static int map_classes(class_ref class_map[], cJSON *tree, int capacity) {
     return class_count; // Actually it's the count - 1
 }
 
-
-static int load_json(char buf[]) {
-    cJSON *tree = NULL; // Tree as a whole
-    cJSON *val = NULL;  // Named value in tree
-    cJSON *el = NULL;   // Element of value
-    tree = cJSON_Parse(buf);  // Must free at end
-    if (tree == NULL) {
-        perror("load_json in vm_loader.c: Failed to parse buffer. ");
-        assert(tree);  // Will definitely abort
-    }
-
-    /* module constant index -> global constant index */
-    int constant_renumber_map[30];
-    int n_consts = remap_constants(constant_renumber_map, tree, 30);
-
-    // Mapping imported classes was here; moving AFTER we
-    // create and index this class so that it can reference itself
-
-    // Create and initialize a class object
-    // push_log_level(DEBUG);
-    char *class_name = cJSON_GetStringValue(
-            cJSON_GetObjectItemCaseSensitive(tree, "class_name"));
-    char *super_name = cJSON_GetStringValue(
-            cJSON_GetObjectItemCaseSensitive(tree, "super"));
+/* Create and initialize a class object, with the methods it
+ * inherits, and add it to the loaded classes.  Both object file
+ * formats come through here.
+ */
+static class_ref create_class(char *class_name, char *super_name,
+                              int n_fields, int n_methods, int n_inherited) {
     log_info("Class %s extends %s", class_name, super_name);
-    // Counts of methods and fields; I'm letting the assembler do the work here.
-    int n_fields = (int) cJSON_GetNumberValue(
-            cJSON_GetObjectItemCaseSensitive(tree, "n_fields"));
-    int n_methods = (int) cJSON_GetNumberValue(
-            cJSON_GetObjectItemCaseSensitive(tree, "n_methods"));
     log_info("Class %s has %d methods and %d fields",
              class_name, n_methods, n_fields);
     size_t class_obj_size =
@@ -268,16 +257,46 @@ static int load_json(char buf[]) {
     log_debug("Size of object header alone is %d bytes\n",
              sizeof(struct obj_header_struct));
     // Copy inherited method pointers into vtable
-    int n_inherited = (int) cJSON_GetNumberValue(
-            cJSON_GetObjectItemCaseSensitive(tree, "n_inherited"));
     for (int i = 0; i < n_inherited; ++i) {
         the_class->vtable[i] = the_super->vtable[i];
     }
-    //pop_log_level();
 
     set_loaded(the_class);
     // We want the class in the "loaded classes" table before loading
     // methods, because the methods might have references to the current class.
+    return the_class;
+}
+
+
+static int load_json(cJSON *tree) {
+    cJSON *el = NULL;   // Element of value
+
+    /* module constant index -> global constant index.
+     * The assembler interns literals, so a module has no more
+     * constants than fit in the global pool.
+     */
+    int constant_renumber_map[CONST_POOL_CAPACITY];
+    int n_consts = remap_constants(constant_renumber_map, tree,
+                                   CONST_POOL_CAPACITY);
+
+    // Mapping imported classes was here; moving AFTER we
+    // create and index this class so that it can reference itself
+
+    // push_log_level(DEBUG);
+    char *class_name = cJSON_GetStringValue(
+            cJSON_GetObjectItemCaseSensitive(tree, "class_name"));
+    char *super_name = cJSON_GetStringValue(
+            cJSON_GetObjectItemCaseSensitive(tree, "super"));
+    // Counts of methods and fields; I'm letting the assembler do the work here.
+    int n_fields = (int) cJSON_GetNumberValue(
+            cJSON_GetObjectItemCaseSensitive(tree, "n_fields"));
+    int n_methods = (int) cJSON_GetNumberValue(
+            cJSON_GetObjectItemCaseSensitive(tree, "n_methods"));
+    int n_inherited = (int) cJSON_GetNumberValue(
+            cJSON_GetObjectItemCaseSensitive(tree, "n_inherited"));
+    class_ref the_class = create_class(class_name, super_name,
+                                       n_fields, n_methods, n_inherited);
+    //pop_log_level();
 
     /* module class index -> class reference,
     * with potential side effect of loading more class files.
@@ -299,7 +318,6 @@ static int load_json(char buf[]) {
                 translate_method_code(ops, constant_renumber_map, class_map);
         the_class->vtable[method_slot] = method_start_addr;
     }
-    cJSON_Delete(tree);
     return 1;
 }
 
@@ -318,76 +336,359 @@ vm_Word *translate_method_code(cJSON *ops, int const_map[], class_ref class_map[
         vm_code_block[vm_code_index++] = (vm_Word)
                 {.instr = vm_op_bytecodes[opcode].instr};
 
-        if (vm_op_bytecodes[opcode].n_operands) {
-            // Max is 1 operand!
+        int owners[MAX_OPERANDS];
+        int n_operands = operand_owners(opcode, owners);
+        for (int k = 0; k < n_operands; ++k) {
             el = el->next;
             int operand = el->valueint;
-            log_debug("[%d] Operand: %d",
-                      vm_current_address() - vm_code_block,
-                      operand);
-            if (vm_op_bytecodes[opcode].instr == vm_op_const) {
-                int const_index;
-                if (operand == CODE_FALSE) {
-                    const_index = lookup_const_index("$false");
-                } else if (operand == CODE_TRUE) {
-                    const_index = lookup_const_index("$true");
-                } else if (operand == CODE_NOTHING) {
-                    const_index = lookup_const_index("$nothing");
-                } else {
-                    assert(operand >= 0);
-                    const_index = const_map[operand];
-                }
-                assert(const_index);
-                check_health_object(get_const_value(const_index));
-                vm_code_block[vm_code_index++] = (vm_Word)
-                        {.intval=  const_index};
-            } else if(vm_op_bytecodes[opcode].instr == vm_op_new
-                      || vm_op_bytecodes[opcode].instr == vm_op_is_instance) {
-                class_ref clazz = class_map[operand];
-                log_debug("Translating allocation of new '%s'",
-                          clazz->header.class_name);
-                vm_code_block[vm_code_index++] = (vm_Word)
-                        {.clazz = clazz};
-            } else {
-                vm_code_block[vm_code_index++] = (vm_Word)
-                        {.intval = operand};
-            }
+            vm_code_block[vm_code_index++] =
+                    translate_operand(owners[k], operand, const_map, class_map);
         }
         el = el->next;
     }
     return method_start_address;
 }
 
+/* Opcode of the operation named by the first len characters of name */
+static int lookup_opcode(const char *name, size_t len) {
+    for (int i=0; vm_op_bytecodes[i].name; ++i) {
+        if (strlen(vm_op_bytecodes[i].name) == len
+            && strncmp(vm_op_bytecodes[i].name, name, len) == 0) {
+            return i;
+        }
+    }
+    return -1;
+}
+
+/* An operand is translated according to the operation it belongs to.
+ * Each operand of an ordinary operation belongs to that operation;
+ * those of a superinstruction belong to its parts, in order.
+ * Fills owners with the opcode for each operand, returns their number.
+ */
+static int operand_owners(int opcode, int owners[]) {
+    op_tbl_entry *entry = &vm_op_bytecodes[opcode];
+    if (! entry->parts) {
+        for (int k = 0; k < entry->n_operands; ++k) {
+            owners[k] = opcode;
+        }
+        return entry->n_operands;
+    }
+    int n_operands = 0;
+    const char *part = entry->parts;
+    while (*part) {
+        size_t len = strcspn(part, " ");
+        int owner = lookup_opcode(part, len);
+        assert(owner >= 0);
+        for (int k = 0; k < vm_op_bytecodes[owner].n_operands; ++k) {
+            assert(n_operands < MAX_OPERANDS);
+            owners[n_operands++] = owner;
+        }
+        part += len;
+        part += strspn(part, " ");
+    }
+    assert(n_operands == entry->n_operands);
+    return n_operands;
+}
+
+/* The loaded form of an operand: constants are renumbered to
+ * the global constant pool, and class indexes become class
+ * references.  Other operands are used as they are.
+ */
+static vm_Word translate_operand(int opcode, int operand,
+                                 int const_map[], class_ref class_map[]) {
+    log_debug("[%d] Operand: %d",
+              vm_current_address() - vm_code_block,
+              operand);
+    if (vm_op_bytecodes[opcode].instr == vm_op_const) {
+        int const_index;
+        if (operand == CODE_FALSE) {
+            const_index = lookup_const_index("$false");
+        } else if (operand == CODE_TRUE) {
+            const_index = lookup_const_index("$true");
+        } else if (operand == CODE_NOTHING) {
+            const_index = lookup_const_index("$nothing");
+        } else {
+            assert(operand >= 0);
+            const_index = const_map[operand];
+        }
+        assert(const_index);
+        check_health_object(get_const_value(const_index));
+        return (vm_Word) {.intval=  const_index};
+    }
+    if(vm_op_bytecodes[opcode].instr == vm_op_new
+              || vm_op_bytecodes[opcode].instr == vm_op_is_instance) {
+        class_ref clazz = class_map[operand];
+        log_debug("Translating allocation of new '%s'",
+                  clazz->header.class_name);
+        return (vm_Word) {.clazz = clazz};
+    }
+    return (vm_Word) {.intval = operand};
+}
+
+
+/* Binary object files (.tvm) carry the same information as
+ * the .json files, as 32-bit little-endian words, so we can map
+ * the file into memory and translate it in place without building
+ * a parse tree.  The layout is written by binary_object in
+ * assemble.py, which documents it; the two MUST agree.
+ */
+#define BINARY_MAGIC 0x4F4D5654   // "TVMO"
+#define BINARY_VERSION 1
+
+enum binary_header_field {
+    BIN_MAGIC, BIN_VERSION, BIN_CLASS_NAME, BIN_SUPER,
+    BIN_N_FIELDS, BIN_N_METHODS, BIN_N_INHERITED,
+    BIN_N_STRINGS, BIN_STRING_BYTES, BIN_N_IMPORTS,
+    BIN_N_CONSTANTS, BIN_N_CODE, BIN_N_CODE_WORDS,
+    BIN_HEADER_WORDS
+};
+
+static vm_Word *translate_binary_code(const int32_t *ops, int n_words,
+                                      int const_map[], class_ref class_map[]) {
+    vm_Word *method_start_address = vm_current_address();
+    for (int i = 0; i < n_words; ++i) {
+        int opcode = ops[i];
+        log_debug("[%d] Op: %d (%s)",
+                  vm_current_address() - vm_code_block,
+                  opcode, vm_op_bytecodes[opcode].name);
+        vm_code_block[vm_code_index++] = (vm_Word)
+                {.instr = vm_op_bytecodes[opcode].instr};
+        int owners[MAX_OPERANDS];
+        int n_operands = operand_owners(opcode, owners);
+        for (int k = 0; k < n_operands; ++k) {
+            int operand = ops[++i];
+            vm_code_block[vm_code_index++] =
+                    translate_operand(owners[k], operand, const_map, class_map);
+        }
+    }
+    return method_start_address;
+}
+
+/* Number of operations in vm_op_bytecodes */
+static int count_opcodes(void) {
+    int n = 0;
+    while (vm_op_bytecodes[n].name) {
+        ++n;
+    }
+    return n;
+}
+
+static int valid_index(int32_t index, int32_t n) {
+    return index >= 0 && index < n;
+}
+
+/* The operations of one method, each with all its operands, and
+ * each operand within the section it indexes.
+ */
+static int valid_binary_code(const int32_t *ops, int n_words,
+                             int n_constants, int n_imports) {
+    int n_ops = count_opcodes();
+    for (int i = 0; i < n_words; ++i) {
+        if (! valid_index(ops[i], n_ops)) {
+            return 0;
+        }
+        int owners[MAX_OPERANDS];
+        int n_operands = operand_owners(ops[i], owners);
+        if (n_operands > n_words - 1 - i) {
+            return 0;
+        }
+        for (int k = 0; k < n_operands; ++k) {
+            int operand = ops[++i];
+            vm_Instr instr = vm_op_bytecodes[owners[k]].instr;
+            if (instr == vm_op_const && operand != CODE_FALSE
+                && operand != CODE_TRUE && operand != CODE_NOTHING
+                && ! valid_index(operand, n_constants)) {
+                return 0;
+            }
+            if ((instr == vm_op_new || instr == vm_op_is_instance)
+                && ! valid_index(operand, n_imports)) {
+                return 0;
+            }
+        }
+    }
+    return 1;
+}
+
+static int load_binary(const int32_t *words, size_t size) {
+    if (size < BIN_HEADER_WORDS * sizeof(int32_t)
+        || words[BIN_MAGIC] != BINARY_MAGIC) {
+        fprintf(stderr, "Not a tiny vm binary object file\n");
+        return 0;
+    }
+    if (words[BIN_VERSION] != BINARY_VERSION) {
+        fprintf(stderr, "Binary object file version %d, expected %d\n",
+                words[BIN_VERSION], BINARY_VERSION);
+        return 0;
+    }
+    int n_strings = words[BIN_N_STRINGS];
+    int string_bytes = words[BIN_STRING_BYTES];
+    int n_imports = words[BIN_N_IMPORTS];
+    int n_constants = words[BIN_N_CONSTANTS];
+    int n_methods = words[BIN_N_METHODS];
+    int n_fields = words[BIN_N_FIELDS];
+    int n_code = words[BIN_N_CODE];
+    int n_code_words = words[BIN_N_CODE_WORDS];
+    // Every count must be sane before the sections can be found,
+    // and every index within its section before anything is loaded
+    int ok = n_strings >= 0 && string_bytes >= 0
+             && string_bytes % sizeof(int32_t) == 0
+             && valid_index(n_imports, 30)
+             && valid_index(n_constants, CONST_POOL_CAPACITY)
+             && n_methods >= 0 && n_fields >= 0 && n_code >= 0
+             && n_code_words >= 0
+             && valid_index(words[BIN_N_INHERITED], n_methods + 1);
+    int64_t n_words = (int64_t) BIN_HEADER_WORDS + n_strings
+                      + string_bytes / sizeof(int32_t) + n_imports
+                      + 2 * (int64_t) n_constants + n_methods + n_fields
+                      + 4 * (int64_t) n_code + n_code_words;
+    if (! ok || n_words * sizeof(int32_t) != size) {
+        fprintf(stderr, "Binary object file is truncated or corrupt\n");
+        return 0;
+    }
+    // Sections follow the header in order
+    const int32_t *offsets = words + BIN_HEADER_WORDS;
+    const char *strings = (const char *) (offsets + n_strings);
+    const int32_t *imports = offsets + n_strings
+                             + string_bytes / sizeof(int32_t);
+    const int32_t *constants = imports + n_imports;
+    const int32_t *method_names = constants + 2 * n_constants;
+    const int32_t *field_names = method_names + n_methods;
+    const int32_t *code_table = field_names + n_fields;
+    const int32_t *code = code_table + 4 * n_code;
+
+    // each string ends within the section, at its last NUL at worst
+    ok = n_strings == 0
+         || (string_bytes > 0 && strings[string_bytes - 1] == '\0');
+    for (int i = 0; ok && i < n_strings; ++i) {
+        ok = valid_index(offsets[i], string_bytes);
+    }
+    ok = ok && valid_index(words[BIN_CLASS_NAME], n_strings)
+         && valid_index(words[BIN_SUPER], n_strings)
+         // a class that extends itself would load itself forever
+         && strcmp(strings + offsets[words[BIN_CLASS_NAME]],
+                   strings + offsets[words[BIN_SUPER]]) != 0;
+    for (int i = 0; ok && i < 2 * n_constants; ++i) {
+        ok = valid_index(constants[i], n_strings);
+    }
+    for (int i = 0; ok && i < n_imports; ++i) {
+        ok = valid_index(imports[i], n_strings);
+    }
+    for (int i = 0; ok && i < n_methods; ++i) {
+        ok = valid_index(method_names[i], n_strings);
+    }
+    for (int i = 0; ok && i < n_fields; ++i) {
+        ok = valid_index(field_names[i], n_strings);
+    }
+    // name, slot, first code word, number of words
+    int64_t code_needed = 0;
+    for (int i = 0; ok && i < n_code; ++i) {
+        const int32_t *method = code_table + 4 * i;
+        ok = valid_index(method[0], n_strings)
+             && valid_index(method[1], n_methods)
+             && method[2] >= 0 && method[3] >= 0
+             && method[2] <= n_code_words - method[3]
+             && valid_binary_code(code + method[2], method[3],
+                                  n_constants, n_imports);
+        code_needed += method[3];
+    }
+    if (! ok || code_needed > CODE_CAPACITY - vm_code_index) {
+        fprintf(stderr, "Binary object file is truncated or corrupt\n");
+        return 0;
+    }
+    // Strings are only read, but the loader's interfaces take char *
+#define STRING(i) ((char *) strings + offsets[i])
+
+    int constant_renumber_map[CONST_POOL_CAPACITY];
+    for (int i = 0; i < n_constants; ++i) {
+        char *literal = STRING(constants[2 * i + 1]);
+        constant_renumber_map[i] = remap_constant(STRING(constants[2 * i]),
+                                                  literal);
+        log_debug("Literal %s internal %d remapped to %d",
+                  literal, i, constant_renumber_map[i]);
+    }
+
+    class_ref the_class = create_class(STRING(words[BIN_CLASS_NAME]),
+                                       STRING(words[BIN_SUPER]),
+                                       n_fields, n_methods,
+                                       words[BIN_N_INHERITED]);
+
+    class_ref class_map[30];
+    for (int i = 0; i < n_imports; ++i) {
+        class_map[i] = ensure_loaded(STRING(imports[i]));
+    }
+
+    for (int i = 0; i < n_code; ++i) {
+        const int32_t *method = code_table + 4 * i;
+        the_class->vtable[method[1]] =
+                translate_binary_code(code + method[2], method[3],
+                                      constant_renumber_map, class_map);
+    }
+#undef STRING
+    return 1;
+}
+
+int vm_load_binary(char *path) {
+    int fd = open(path, O_RDONLY);
+    if (fd < 0) {
+        perror("Failed to open file");
+        return 0;
+    }
+    struct stat st;
+    if (fstat(fd, &st) != 0 || st.st_size == 0) {
+        perror("Failed to stat file");
+        close(fd);
+        return 0;
+    }
+    void *image = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (image == MAP_FAILED) {
+        perror("Failed to map file");
+        return 0;
+    }
+    int ok = load_binary((const int32_t *) image, st.st_size);
+    munmap(image, st.st_size);
+    return ok;
+}
+
 
 
-/* Load an "object" file (json format) from
- * a class name.
+/* Load an "object" file from a class name: the binary
+ * object file if there is one at least as new as the .json
+ * file, else the .json file.  Tools that write only the .json
+ * (assemble.py without --binary, the compile server) leave an
+ * older binary behind, which must not shadow it.
  */
 #define PATHBUFSIZE 4096
 extern int vm_load_class(char *classname) {
-    char load_path[PATHBUFSIZE];
+    char binary_path[PATHBUFSIZE];
+    char json_path[PATHBUFSIZE];
     // Use printf for multi-concat
-    snprintf(load_path, PATHBUFSIZE, "%s/%s.json", PATH_PREFIX, classname);
-    log_info("Loading %s", load_path);
-    return vm_load_from_path(load_path);
+    snprintf(binary_path, PATHBUFSIZE, "%s/%s.tvm", PATH_PREFIX, classname);
+    snprintf(json_path, PATHBUFSIZE, "%s/%s.json", PATH_PREFIX, classname);
+    struct stat binary_st, json_st;
+    if (stat(binary_path, &binary_st) == 0 && access(binary_path, R_OK) == 0
+        && (stat(json_path, &json_st) != 0
+            || json_st.st_mtime <= binary_st.st_mtime)) {
+        log_info("Loading %s", binary_path);
+        return vm_load_binary(binary_path);
+    }
+    log_info("Loading %s", json_path);
+    return vm_load_from_path(json_path);
 }
 
 
 int vm_load_from_path(char *path) {
-    char file_buffer[FILE_BUFFER_CAPACITY];
-    FILE *fd = fopen(path, "r");
-    if (! fd) {
-        perror("Failed to open file");
+    char *file_buffer = read_file(path);
+    if (! file_buffer) {
         return 0;
     }
-    int ok;
-    ok = read_file_fd(fd, file_buffer);
-    if (ok) {
-        cJSON *jobj = cJSON_Parse(file_buffer);
-        ok = (jobj != NULL);
+    cJSON *tree = cJSON_Parse(file_buffer);  // Must free at end
+    free(file_buffer);
+    if (tree == NULL) {
+        perror("load_json in vm_loader.c: Failed to parse buffer. ");
+        assert(tree);  // Will definitely abort
     }
-    assert(ok);
-    ok = load_json(file_buffer);
-    fclose(fd);
+    int ok = load_json(tree);
+    cJSON_Delete(tree);
     return ok;
 }
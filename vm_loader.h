@@ -24,8 +24,8 @@ void vm_loader_set_main(char *main_class_name);
  */
 extern class_ref find_loaded(char *name);
 
-/* Load an "object" file (json format) from
- * a class name.
+/* Load an "object" file from a class name, preferring
+ * a binary object file (.tvm) to the json format.
  */
 extern int vm_load_class(char *classname);
 
@@ -34,6 +34,11 @@ extern int vm_load_class(char *classname);
  */
 extern int vm_load_from_path(char *path);
 
+/* Load a binary object file (.tvm), as written by
+ * assemble.py --binary.  Return 1 = success, 0 = failure.
+ */
+extern int vm_load_binary(char *path);
+
 /* Constants in method bytecode will be small non-negative
  * integers corresponding to the "constants" list in the
  * object code json, or chosen from this fixed set of
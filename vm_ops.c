@@ -63,15 +63,27 @@ extern void vm_op_jump_ifnot() {
 
 /* ========  Linkage instructions =========== */
 
-/* Call a method on an object; the object
- * should be on the eval stack, and the
- * next word in the instruction stream should
- * be the index of the native_method in the vtable.
+/* Call a method on an object.  The receiver object
+ * is pushed first, then the arguments; the next two
+ * words in the instruction stream are the index of the
+ * method in the vtable and the number of arguments.
+ *
+ * The frame of the called method is
+ *   fp+0        receiver ("this")
+ *   fp+1..n     arguments, in order
+ *   fp+n+1      return address
+ *   fp+n+2      caller's frame pointer
+ *   fp+n+3...   local variables, then the evaluation stack
+ * so the arguments are already in place, and nothing has
+ * to be moved to make the call.
+ *
+ * vm_op_methodcall(index, n): [obj arg1 ... argn] -> [result]
  */
 extern void vm_op_methodcall(void) {
     int method_index = vm_fetch_next().intval;
-    // New "this" will be receiver object
-    vm_addr new_fp = vm_sp;
+    int n_args = vm_fetch_next().intval;
+    // New "this" will be receiver object, below its arguments
+    vm_addr new_fp = vm_sp - n_args;
     // Save program counter for return
     vm_frame_push_word((vm_Word) {.code_addr = vm_pc});
     // Save caller's frame pointer
@@ -123,20 +135,54 @@ extern void vm_op_enter() {
 
 
 extern void vm_op_return() {
-    // Needs arity to reclaim arguments correctly
+    // Needs arity to find the saved words and reclaim arguments
     int arity = vm_fetch_next().intval;
     assert(0 <= arity);   // Sanity check -- arity is non-negative
     assert(10 >= arity);  // Sanity check --- arity at most 10
     vm_Word return_value = vm_frame_pop_word();
     check_health_object(return_value.obj);
-    vm_sp = vm_fp + 2;
+    vm_sp = vm_fp + arity + 2;
     vm_fp = vm_frame_pop_word().frame_addr;
     vm_pc = vm_frame_pop_word().code_addr;
+    // The result replaces the receiver
     vm_sp -= arity;
     *vm_sp = return_value;
     return;
 }
 
+/* Call a method in place of the one executing, whose
+ * result would just be returned.  The receiver and arguments
+ * are on the stack as for call; the next three words are the
+ * index of the method in the vtable, the number of arguments,
+ * and the arity of the method making the call.  They are moved
+ * down over the current frame, with its return address and
+ * saved frame pointer above them, so the callee returns
+ * directly to our caller and the frame stack does not grow.
+ *
+ * vm_op_tail_call(index, n, arity): [obj arg1 ... argn] -> (no return)
+ */
+extern void vm_op_tail_call(void) {
+    int method_index = vm_fetch_next().intval;
+    int n_args = vm_fetch_next().intval;
+    int arity = vm_fetch_next().intval;
+    vm_Word return_addr = vm_fp[arity + 1];
+    vm_Word saved_fp = vm_fp[arity + 2];
+    // The receiver and arguments are above the frame header,
+    // so copying upward never overwrites one not yet moved
+    vm_addr receiver_at = vm_sp - n_args;
+    for (int i = 0; i <= n_args; ++i) {
+        vm_fp[i] = receiver_at[i];
+    }
+    vm_fp[n_args + 1] = return_addr;
+    vm_fp[n_args + 2] = saved_fp;
+    vm_sp = vm_fp + n_args + 2;
+    obj_ref receiver = (*vm_fp).obj;
+    check_health_object(receiver);
+    class_ref clazz = receiver->header.clazz;
+    check_health_class(clazz);
+    vm_pc = clazz->vtable[method_index];
+}
+
 /* The object allocator should be called just before
  * a call to the constructor. It creates an object with the
  * class pointer, but without initializing fields.  The
@@ -222,8 +268,8 @@ extern void vm_op_pop(void) {
 /* Roll the stack:
  * roll 2: [ob x y] -> [x y ob]
  * roll 1: [ob x] -> [x ob]
- * (used to put the receiver object at the
- * stack pointer in preparation for method call)
+ * (method calls take the receiver below the
+ * arguments, so only hand-written code uses this)
  */
 void vm_op_roll(void) {
     int k = vm_fetch_next().intval;
@@ -307,3 +353,216 @@ extern void vm_op_store_field() {
     target_obj->fields[field_slot] = value;
     // pop_log_level();
 }
+
+/* ========  Typed operations  =========== */
+
+/* Arithmetic and comparison on Int operands, and negation of
+ * a Bool, without a method call.  The compiler emits these only
+ * where the type checker has proven the operand types, so unlike
+ * the native methods in builtins.c they don't check them.
+ * [a b] -> [a op b]
+ */
+static inline int pop_int(void) {
+    obj_Int value = (obj_Int) vm_eval_pop();
+    return value->value;
+}
+
+static inline void push_bool(int cond) {
+    vm_eval_push(cond ? lit_true : lit_false);
+}
+
+extern void vm_op_int_add() {
+    int right = pop_int();
+    int left = pop_int();
+    vm_eval_push(new_int(left + right));
+}
+
+extern void vm_op_int_sub() {
+    int right = pop_int();
+    int left = pop_int();
+    vm_eval_push(new_int(left - right));
+}
+
+extern void vm_op_int_mul() {
+    int right = pop_int();
+    int left = pop_int();
+    vm_eval_push(new_int(left * right));
+}
+
+extern void vm_op_int_div() {
+    int right = pop_int();
+    int left = pop_int();
+    vm_eval_push(new_int(left / right));
+}
+
+/* [a] -> [-a] */
+extern void vm_op_int_neg() {
+    vm_eval_push(new_int(-pop_int()));
+}
+
+extern void vm_op_int_eq() {
+    int right = pop_int();
+    int left = pop_int();
+    push_bool(left == right);
+}
+
+extern void vm_op_int_lt() {
+    int right = pop_int();
+    int left = pop_int();
+    push_bool(left < right);
+}
+
+extern void vm_op_int_le() {
+    int right = pop_int();
+    int left = pop_int();
+    push_bool(left <= right);
+}
+
+extern void vm_op_int_gt() {
+    int right = pop_int();
+    int left = pop_int();
+    push_bool(left > right);
+}
+
+extern void vm_op_int_ge() {
+    int right = pop_int();
+    int left = pop_int();
+    push_bool(left >= right);
+}
+
+/* [b] -> [not b] */
+extern void vm_op_bool_not() {
+    obj_ref cond = vm_eval_pop();
+    push_bool(cond == lit_false);
+}
+
+/* Compare and branch, for conditions: the jump_if that would follow
+ * the comparison, without making the Bool it would test.
+ * [a b] -> []
+ */
+extern void vm_op_jump_int_eq() {
+    int span = vm_fetch_next().intval;
+    int right = pop_int();
+    int left = pop_int();
+    if (left == right) {
+        vm_relative_jump(span);
+    }
+}
+
+extern void vm_op_jump_int_ne() {
+    int span = vm_fetch_next().intval;
+    int right = pop_int();
+    int left = pop_int();
+    if (left != right) {
+        vm_relative_jump(span);
+    }
+}
+
+extern void vm_op_jump_int_lt() {
+    int span = vm_fetch_next().intval;
+    int right = pop_int();
+    int left = pop_int();
+    if (left < right) {
+        vm_relative_jump(span);
+    }
+}
+
+extern void vm_op_jump_int_le() {
+    int span = vm_fetch_next().intval;
+    int right = pop_int();
+    int left = pop_int();
+    if (left <= right) {
+        vm_relative_jump(span);
+    }
+}
+
+extern void vm_op_jump_int_gt() {
+    int span = vm_fetch_next().intval;
+    int right = pop_int();
+    int left = pop_int();
+    if (left > right) {
+        vm_relative_jump(span);
+    }
+}
+
+extern void vm_op_jump_int_ge() {
+    int span = vm_fetch_next().intval;
+    int right = pop_int();
+    int left = pop_int();
+    if (left >= right) {
+        vm_relative_jump(span);
+    }
+}
+
+/* Objects of classes that inherit Obj:equals (Bool, Nothing) */
+extern void vm_op_jump_eq() {
+    int span = vm_fetch_next().intval;
+    obj_ref right = vm_eval_pop();
+    obj_ref left = vm_eval_pop();
+    if (left == right) {
+        vm_relative_jump(span);
+    }
+}
+
+extern void vm_op_jump_ne() {
+    int span = vm_fetch_next().intval;
+    obj_ref right = vm_eval_pop();
+    obj_ref left = vm_eval_pop();
+    if (left != right) {
+        vm_relative_jump(span);
+    }
+}
+
+/* Superinstructions, generated by tools/superinstructions.py.
+ * Each does the work of its parts in one dispatch; the parts
+ * fetch their own operands, in order, as they would have.
+ */
+extern void vm_op_const_call() {
+    vm_op_const();
+    vm_op_methodcall();
+}
+
+extern void vm_op_load_call() {
+    vm_op_load();
+    vm_op_methodcall();
+}
+
+extern void vm_op_load_store_load() {
+    vm_op_load();
+    vm_op_store();
+    vm_op_load();
+}
+
+extern void vm_op_load_load_int_add_store() {
+    vm_op_load();
+    vm_op_load();
+    vm_op_int_add();
+    vm_op_store();
+}
+
+extern void vm_op_store_load_const_int_add() {
+    vm_op_store();
+    vm_op_load();
+    vm_op_const();
+    vm_op_int_add();
+}
+
+extern void vm_op_load_const_jump_int_lt() {
+    vm_op_load();
+    vm_op_const();
+    vm_op_jump_int_lt();
+}
+
+extern void vm_op_load_load_field() {
+    vm_op_load();
+    vm_op_load_field();
+}
+
+extern void vm_op_load_store_field_const_return() {
+    vm_op_load();
+    vm_op_store_field();
+    vm_op_const();
+    vm_op_return();
+}
+
+/* End of superinstructions */
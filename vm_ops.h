@@ -19,9 +19,9 @@ extern void vm_op_halt(void);
 
 /* Call a method (virtual function) indirectly
  * through the vtable of an object's class.
- * Next word should be method index.
+ * Next words should be method index and number of arguments.
  *
- * vm_op_methodcall(m_index): [arg, arg, ...,  receiver] -> [result]
+ * vm_op_methodcall(m_index, n): [receiver, arg, ..., arg] -> [result]
  */
 extern void vm_op_methodcall(void);
 
@@ -90,6 +90,7 @@ extern void vm_op_call_native(void);
 extern void vm_op_call();   // Args and receiver are on stack; method index follows
 extern void vm_op_enter();  // Currently a no-op
 extern void vm_op_return(); // Expects arity next in code, to pop args
+extern void vm_op_tail_call(); // Like call, reusing the caller's frame
 
 /*
  * Stack  manipulation
@@ -107,5 +108,47 @@ extern void vm_op_load_field();  // Load from field of object
 // store_field n: [value target] -> [], target.fields[n] = value
 extern void vm_op_store_field(); // Store into field of object
 
+/* Typed operations on Int and Bool: [a b] -> [a op b].
+ * The compiler emits them only where the type checker has
+ * proven the operands are Int (or Bool), so they don't check.
+ */
+extern void vm_op_int_add();  // [a b] -> [a + b]
+extern void vm_op_int_sub();  // [a b] -> [a - b]
+extern void vm_op_int_mul();  // [a b] -> [a * b]
+extern void vm_op_int_div();  // [a b] -> [a / b]
+extern void vm_op_int_neg();  // [a] -> [-a]
+extern void vm_op_int_eq();  // [a b] -> [a == b]
+extern void vm_op_int_lt();  // [a b] -> [a < b]
+extern void vm_op_int_le();  // [a b] -> [a <= b]
+extern void vm_op_int_gt();  // [a b] -> [a > b]
+extern void vm_op_int_ge();  // [a b] -> [a >= b]
+extern void vm_op_bool_not();  // [b] -> [not b]
+
+/* Compare and branch: [a b] -> [], and a relative jump if the
+ * comparison holds.  Int operands, as for the typed operations,
+ * except jump_eq and jump_ne, which compare object identity.
+ */
+extern void vm_op_jump_int_eq();  // jump if a == b
+extern void vm_op_jump_int_ne();  // jump if a != b
+extern void vm_op_jump_int_lt();  // jump if a < b
+extern void vm_op_jump_int_le();  // jump if a <= b
+extern void vm_op_jump_int_gt();  // jump if a > b
+extern void vm_op_jump_int_ge();  // jump if a >= b
+extern void vm_op_jump_eq();  // jump if the same object
+extern void vm_op_jump_ne();  // jump if different objects
+
+/* Superinstructions, generated by tools/superinstructions.py */
+extern void vm_op_const_call();  // const call
+extern void vm_op_load_call();  // load call
+extern void vm_op_load_store_load();  // load store load
+extern void vm_op_load_load_int_add_store();  // load load int_add store
+extern void vm_op_store_load_const_int_add();  // store load const int_add
+extern void vm_op_load_const_jump_int_lt();  // load const jump_int_lt
+extern void vm_op_load_load_field();  // load load_field
+extern void vm_op_load_store_field_const_return();  // load store_field const return
+/* End of superinstructions */
+
+
+
 
 #endif //TINY_VM_VM_OPS_H
@@ -17,6 +17,7 @@ vm_Word vm_code_block[CODE_CAPACITY];
 vm_addr vm_pc =   &vm_code_block[0];
 int vm_run_state = VM_RUNNING;
 enum LOG_LEVEL vm_logging = INFO;
+FILE *vm_trace = NULL;
 
 char *guess_description(vm_Word w);
 
@@ -101,8 +102,8 @@ obj_ref vm_eval_pop() {
 /* Roll the stack:
  * roll 2: [ob x y] -> [x y ob]
  * roll 1: [ob x] -> [x ob]
- * (used to put the receiver object at the
- * stack pointer in preparation for method call)
+ * (method calls take the receiver below the
+ * arguments, so only hand-written code uses this)
  */
 void vm_roll(int n) {
     vm_Word ob = *(vm_sp - n);
@@ -282,9 +283,13 @@ void stack_dump(int n_words) {
 
 /* One execution step, at current PC */
 void vm_step() {
+    long word_number = vm_pc - vm_code_block;
     vm_Instr instr = vm_fetch_next().instr;
     char *name = guess_description((vm_Word) instr);
     log_debug("Step:  %s",name );
+    if (vm_trace) {
+        fprintf(vm_trace, "%ld %s\n", word_number, name);
+    }
     (*instr)();
     health_check_builtins();
     stack_dump(8);
@@ -17,6 +17,8 @@
 #define FRAME_CAPACITY   1024    // Procedure call stack words
 #define CONST_POOL_CAPACITY 128  // Constant objects, created during loading
 
+#include <stdio.h>
+
 /* Core definitions shared with
  * builtins.h
  */
@@ -57,6 +59,13 @@ extern void vm_relative_jump(int n);
 extern int vm_run_state;
 extern  enum LOG_LEVEL vm_logging;
 
+/* When not NULL, the name of each operation is written here
+ * as it is dispatched, one per line (tiny_vm -T).  The
+ * superinstruction miner (tools/superinstructions.py) counts
+ * opcode sequences in this trace.
+ */
+extern FILE *vm_trace;
+
 /* Evaluation stack, separate from activation record
  * stack.  For now we just keep integers as values.
  */